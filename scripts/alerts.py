@@ -0,0 +1,473 @@
+import argparse
+import datetime
+import json
+import os
+import smtplib
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from email import encoders
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from metrics import ALERT_DELIVERIES, ALERT_LATENCY, ALERT_SEND_SECONDS
+
+# Base directories
+BASE_DIR = os.path.join(os.path.expanduser("~/Desktop"), "IDS")
+ALERT_QUEUE_DIR = os.path.join(BASE_DIR, "logs", "alert_queue")
+
+# Email Configuration
+EMAIL_SENDER = os.getenv("EMAIL_SENDER", "")  # Replace for testing
+EMAIL_RECEIVER = os.getenv("EMAIL_RECEIVER", "")  # Replace for testing
+EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD", "")  # Replace for testing
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
+
+# Twilio WhatsApp Configuration
+ACCOUNT_SID = ""  # Replace with your Twilio Account SID
+AUTH_TOKEN = ""    # Replace with your Twilio Auth Token
+TWILIO_WHATSAPP_NUMBER = "whatsapp:+14155238886"  # Twilio's Sandbox Number
+RECIPIENT_WHATSAPP_NUMBER = "whatsapp:+91"  # Replace with your number
+IMAGE_HOST_URL = "https://your_public_hosting_url.com/"  # Public image URL prefix
+
+# Dispatcher configuration
+ALERT_BATCH_WINDOW = 5     # Seconds to collect alerts into one message
+ALERT_WORKERS = 2          # Threads delivering alert batches
+ALERT_RETRY_INTERVAL = 30  # Base seconds between retries of failed alerts
+ALERT_MAX_RETRY_DELAY = 3600
+ALERT_MAX_ATTEMPTS = 10
+
+CHANNELS = ("email", "whatsapp")
+
+# Persistent SMTP session
+class SMTPTransport:
+    """
+    Keeps one authenticated SMTP session open and reuses it across alerts,
+    reconnecting only when the server drops the connection. A message the
+    server rejects is not resent here; the error goes to the caller.
+    """
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, sender=EMAIL_SENDER,
+                 password=EMAIL_PASSWORD, starttls=SMTP_STARTTLS, timeout=30):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.connections = 0
+        self._server = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            server.starttls()
+        if self.password:
+            server.login(self.sender, self.password)
+        self.connections += 1
+        return server
+
+    def _close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+    def send(self, msg):
+        """
+        Sends a message over the shared session, reconnecting once if it
+        has gone stale. SMTP errors other than a disconnect (a refused
+        recipient, a rejected message) are raised as they are, since
+        resending could deliver the message twice.
+        """
+        with self._lock:
+            if self._server is None:
+                self._server = self._connect()
+            try:
+                self._server.send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                self._reconnect_and_send(msg)
+            except smtplib.SMTPException:
+                raise
+            except OSError:  # Connection reset, broken pipe or timeout
+                self._reconnect_and_send(msg)
+
+    def _reconnect_and_send(self, msg):
+        self._close()
+        self._server = self._connect()
+        self._server.send_message(msg)
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+# Shared Twilio client
+class WhatsAppTransport:
+    """
+    Sends WhatsApp messages through one Twilio client created on first use.
+    """
+    def __init__(self, account_sid=ACCOUNT_SID, auth_token=AUTH_TOKEN,
+                 sender=TWILIO_WHATSAPP_NUMBER, recipient=RECIPIENT_WHATSAPP_NUMBER):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.sender = sender
+        self.recipient = recipient
+        self._client = None
+        self._lock = threading.Lock()
+
+    def send(self, body, media_url=None):
+        with self._lock:
+            if self._client is None:
+                from twilio.rest import Client
+                self._client = Client(self.account_sid, self.auth_token)
+        kwargs = {"media_url": [media_url]} if media_url else {}
+        message = self._client.messages.create(
+            body=body,
+            from_=self.sender,
+            to=self.recipient,
+            **kwargs
+        )
+        print(f"WhatsApp message sent: {message.sid}")
+
+    def close(self):
+        pass
+
+# Stand-in transport for testing without Twilio
+class FakeWhatsAppTransport:
+    """
+    Records WhatsApp messages instead of sending them.
+    """
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.sent = []
+
+    def send(self, body, media_url=None):
+        if self.fail:
+            raise ConnectionError("Fake WhatsApp transport configured to fail")
+        self.sent.append((body, media_url))
+        print(f"[fake WhatsApp] {body} {media_url or ''}")
+
+    def close(self):
+        pass
+
+# Function to build the email for a batch of alerts
+def build_email(alerts):
+    """
+    Builds one email covering every alert in the batch, with each intruder
+    image attached.
+    """
+    msg = MIMEMultipart()
+    msg["From"] = EMAIL_SENDER
+    msg["To"] = EMAIL_RECEIVER
+    if len(alerts) == 1:
+        msg["Subject"] = alerts[0]["subject"]
+    else:
+        msg["Subject"] = f"Intruder Alert: {len(alerts)} detections"
+    lines = [f"{alert['time']}  {alert['body']}" for alert in alerts]
+    msg.attach(MIMEText("\n".join(lines), "plain"))
+
+    for alert in alerts:
+        attachment_path = alert.get("image_path")
+        if not attachment_path or not os.path.exists(attachment_path):
+            continue
+        with open(attachment_path, "rb") as attachment:
+            part = MIMEBase("application", "octet-stream")
+            part.set_payload(attachment.read())
+        encoders.encode_base64(part)
+        part.add_header(
+            "Content-Disposition",
+            f"attachment; filename={os.path.basename(attachment_path)}"
+        )
+        msg.attach(part)
+    return msg
+
+# Function to build the WhatsApp text for a batch of alerts
+def build_whatsapp(alerts):
+    """
+    Returns the message body and the media URL of the latest image.
+    """
+    if len(alerts) == 1:
+        body = "Alert! An intruder has been detected. See the attached image."
+    else:
+        body = f"Alert! {len(alerts)} intruder detections in the last few seconds. Latest image attached."
+    image_paths = [alert["image_path"] for alert in alerts if alert.get("image_path")]
+    media_url = IMAGE_HOST_URL + os.path.basename(image_paths[-1]) if image_paths else None
+    return body, media_url
+
+class AlertDispatcher:
+    """
+    Delivers intruder alerts on a worker pool without blocking the caller.
+    Alerts raised within the batch window are merged into one message per
+    channel. Deliveries that fail are written to an on-disk queue and
+    retried with exponential backoff, including across restarts.
+    """
+    def __init__(self, email_transport=None, whatsapp_transport=None,
+                 queue_dir=ALERT_QUEUE_DIR, batch_window=ALERT_BATCH_WINDOW,
+                 workers=ALERT_WORKERS, retry_interval=ALERT_RETRY_INTERVAL):
+        self.email_transport = email_transport or SMTPTransport()
+        self.whatsapp_transport = whatsapp_transport or WhatsAppTransport()
+        self.queue_dir = queue_dir
+        self.batch_window = batch_window
+        self.workers = workers
+        self.retry_interval = retry_interval
+        self.executor = None
+        self.stop_event = threading.Event()
+        self._pending = []
+        self._cond = threading.Condition()
+        self._spool_lock = threading.Lock()
+        self._in_flight = set()  # Spool entries being delivered, guarded by _spool_lock
+        self._threads = []
+        self._stats_lock = threading.Lock()  # Counters are updated from every worker thread
+        self.sent = 0
+        self.failed = 0
+        self.batches = 0
+        os.makedirs(self.queue_dir, exist_ok=True)
+
+    def start(self):
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="alert")
+        for target, name in ((self._batch_loop, "alert-batcher"), (self._retry_loop, "alert-retry")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def submit(self, subject, body, image_path=None):
+        """
+        Queues an alert for delivery and returns immediately.
+        """
+        alert = {
+            "subject": subject,
+            "body": body,
+            "image_path": image_path,
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+            "raised": time.time(),
+        }
+        with self._cond:
+            self._pending.append(alert)
+            self._cond.notify()
+
+    def _batch_loop(self):
+        while not self.stop_event.is_set():
+            with self._cond:
+                while not self._pending and not self.stop_event.is_set():
+                    self._cond.wait(0.5)
+                if not self._pending:
+                    continue
+            # Collect anything else that arrives within the window
+            self.stop_event.wait(self.batch_window)
+            self._flush()
+
+    def _flush(self):
+        with self._cond:
+            batch, self._pending = self._pending, []
+        if batch:
+            with self._stats_lock:
+                self.batches += 1
+            self.executor.submit(self._deliver, batch, CHANNELS, 0, None)
+
+    def _deliver(self, alerts, channels, attempts, spool_path):
+        try:
+            self._attempt(alerts, channels, attempts, spool_path)
+        finally:
+            if spool_path:
+                with self._spool_lock:
+                    self._in_flight.discard(spool_path)
+
+    def _attempt(self, alerts, channels, attempts, spool_path):
+        failed_channels = []
+        for channel in channels:
+            start = time.perf_counter()
+            try:
+                if channel == "email":
+                    self.email_transport.send(build_email(alerts))
+                    print("Email sent successfully.")
+                else:
+                    body, media_url = build_whatsapp(alerts)
+                    self.whatsapp_transport.send(body, media_url)
+                with self._stats_lock:
+                    self.sent += 1
+                ALERT_SEND_SECONDS.labels(channel).observe(time.perf_counter() - start)
+                ALERT_DELIVERIES.labels(channel, "sent").inc()
+                delivered = time.time()
+                for alert in alerts:
+                    if "raised" in alert:  # Absent from entries spooled by older versions
+                        ALERT_LATENCY.labels(channel).observe(delivered - alert["raised"])
+            except Exception as e:
+                with self._stats_lock:
+                    self.failed += 1
+                ALERT_DELIVERIES.labels(channel, "failed").inc()
+                print(f"Failed to send {channel} alert: {e}")
+                failed_channels.append(channel)
+
+        if not failed_channels:
+            if spool_path:
+                os.remove(spool_path)
+        elif attempts + 1 >= ALERT_MAX_ATTEMPTS:
+            print(f"Giving up on {len(alerts)} alert(s) via {', '.join(failed_channels)} after {attempts + 1} attempts.")
+            if spool_path:
+                os.remove(spool_path)
+        else:
+            self._spool(alerts, failed_channels, attempts + 1, spool_path)
+
+    def _spool(self, alerts, channels, attempts, spool_path=None):
+        """
+        Writes a failed batch to the retry queue atomically.
+        """
+        delay = min(self.retry_interval * 2 ** (attempts - 1), ALERT_MAX_RETRY_DELAY)
+        record = {
+            "alerts": alerts,
+            "channels": channels,
+            "attempts": attempts,
+            "next_attempt": time.time() + delay,
+        }
+        if spool_path is None:
+            spool_path = os.path.join(self.queue_dir, f"{time.time_ns()}_{uuid.uuid4().hex[:8]}.json")
+        tmp_path = spool_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(record, file)
+        os.replace(tmp_path, spool_path)
+
+    def _retry_loop(self):
+        while not self.stop_event.is_set():
+            self.retry_due()
+            self.stop_event.wait(min(self.retry_interval, 5))
+
+    def retry_due(self):
+        """
+        Resubmits every queued batch whose backoff has expired. Batches
+        still being delivered are skipped, however long delivery takes.
+        """
+        with self._spool_lock:
+            now = time.time()
+            for filename in sorted(os.listdir(self.queue_dir)):
+                if not filename.endswith(".json"):
+                    continue
+                spool_path = os.path.join(self.queue_dir, filename)
+                if spool_path in self._in_flight:
+                    continue
+                try:
+                    with open(spool_path, "r") as file:
+                        record = json.load(file)
+                except (OSError, ValueError) as e:
+                    print(f"Skipping unreadable alert queue entry {filename}: {e}")
+                    continue
+                if record["next_attempt"] > now:
+                    continue
+                # Push the deadline out so the entry is not picked up twice
+                record["next_attempt"] = now + self.retry_interval
+                with open(spool_path + ".tmp", "w") as file:
+                    json.dump(record, file)
+                os.replace(spool_path + ".tmp", spool_path)
+                self._in_flight.add(spool_path)
+                self.executor.submit(self._deliver, record["alerts"], record["channels"],
+                                     record["attempts"], spool_path)
+
+    def send_test(self, channels=CHANNELS):
+        """
+        Sends a test message on each channel right away, bypassing batching
+        and retries. Returns {channel: None if sent, else the error}.
+        """
+        alert = {
+            "subject": "Test Alert from IDS",
+            "body": "This is a test alert from the Intruder Detection System.",
+            "image_path": None,
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        }
+        results = {}
+        for channel in channels:
+            try:
+                if channel == "email":
+                    self.email_transport.send(build_email([alert]))
+                else:
+                    body, _ = build_whatsapp([alert])
+                    self.whatsapp_transport.send(body)
+                results[channel] = None
+            except Exception as e:
+                results[channel] = str(e)
+        return results
+
+    def queued(self):
+        return len([f for f in os.listdir(self.queue_dir) if f.endswith(".json")])
+
+    def stats(self):
+        with self._cond:
+            pending = len(self._pending)
+        with self._stats_lock:
+            batches, sent, failed = self.batches, self.sent, self.failed
+        return {
+            "pending": pending,
+            "batches": batches,
+            "sent": sent,
+            "failed": failed,
+            "queued_for_retry": self.queued(),
+            "smtp_connections": getattr(self.email_transport, "connections", None),
+        }
+
+    def stop(self):
+        """
+        Flushes pending alerts, waits for deliveries and closes transports.
+        """
+        self.stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        if self.executor is not None:
+            self._flush()
+            self.executor.shutdown(wait=True)
+        self.email_transport.close()
+        self.whatsapp_transport.close()
+
+# Process-wide dispatcher
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher():
+    """
+    Returns the shared dispatcher, starting it on first use.
+    """
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = AlertDispatcher().start()
+        return _dispatcher
+
+def shutdown_dispatcher():
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is not None:
+            _dispatcher.stop()
+            _dispatcher = None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send test alerts through the alert dispatcher.")
+    parser.add_argument("--count", type=int, default=1, help="Number of alerts to raise")
+    parser.add_argument("--image", help="Image to attach")
+    parser.add_argument("--sender", default=EMAIL_SENDER)
+    parser.add_argument("--receiver", default=EMAIL_RECEIVER)
+    parser.add_argument("--smtp-host", default=SMTP_HOST)
+    parser.add_argument("--smtp-port", type=int, default=SMTP_PORT)
+    parser.add_argument("--no-starttls", action="store_true", help="Plain SMTP, e.g. for `python -m aiosmtpd -n`")
+    parser.add_argument("--fake-whatsapp", action="store_true", help="Record WhatsApp messages instead of sending")
+    parser.add_argument("--queue-dir", default=ALERT_QUEUE_DIR)
+    args = parser.parse_args()
+    EMAIL_SENDER, EMAIL_RECEIVER = args.sender, args.receiver
+
+    dispatcher = AlertDispatcher(
+        email_transport=SMTPTransport(host=args.smtp_host, port=args.smtp_port, sender=args.sender,
+                                      starttls=not args.no_starttls),
+        whatsapp_transport=FakeWhatsAppTransport() if args.fake_whatsapp else None,
+        queue_dir=args.queue_dir,
+        batch_window=1,
+    ).start()
+    for i in range(args.count):
+        dispatcher.submit(
+            subject="Test Alert from IDS",
+            body=f"This is test alert {i + 1} from the Intruder Detection System.",
+            image_path=args.image,
+        )
+    time.sleep(1.5)
+    dispatcher.stop()
+    print(f"Dispatcher stats: {dispatcher.stats()}")
@@ -0,0 +1,321 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+def iter_frames(source):
+    """
+    Yields (name, frame) pairs from a video file or a directory of images.
+    Frame names are the frame index for videos and the file name for
+    image directories, matching the keys of the labels file.
+    """
+    if os.path.isdir(source):
+        for filename in sorted(os.listdir(source)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                frame = cv2.imread(os.path.join(source, filename))
+                if frame is not None:
+                    yield filename, frame
+        return
+
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise FileNotFoundError(f"Unable to open video: {source}")
+    index = 0
+    try:
+        while True:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            yield str(index), frame
+            index += 1
+    finally:
+        capture.release()
+
+def load_labels(path):
+    """
+    Loads a JSON object mapping frame names to the number of intruders
+    visible in that frame. Frames missing from the file count as zero.
+    """
+    with open(path, "r") as file:
+        return {str(name): int(count) for name, count in json.load(file).items()}
+
+def summarize(samples):
+    """
+    Returns mean and p50/p95/p99 of a list of durations, in milliseconds.
+    """
+    if not samples:
+        return {"count": 0}
+    values = np.array(samples) * 1000
+    return {
+        "count": len(samples),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+    }
+
+def burn_cpu(stop_event):
+    while not stop_event.is_set():
+        sum(i * i for i in range(10000))
+
+def inject_load(processes):
+    """
+    Starts CPU-bound processes that compete with the benchmark and returns
+    a function that stops them.
+    """
+    stop_event = multiprocessing.Event()
+    workers = [multiprocessing.Process(target=burn_cpu, args=(stop_event,), daemon=True) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+
+    def stop():
+        stop_event.set()
+        for worker in workers:
+            worker.join()
+    return stop
+
+def benchmark_unknown_index():
+    """
+    Returns an in-memory unknown face index for one run, so a benchmark
+    neither reads nor writes the detector's saved index, or None if the
+    index is disabled.
+    """
+    from unknown_index import UNKNOWN_INDEX, UnknownFaceIndex
+    return UnknownFaceIndex("benchmark", directory=None) if UNKNOWN_INDEX else None
+
+def run_benchmark(source, labels=None, motion_gate=False, save_dir=None, max_frames=None, detector=None,
+                  load_controller=None, budget_ms=None):
+    """
+    Replays a recording through DetectionStage headlessly, with alerts
+    replaced by a stub that only saves the image, and returns the results.
+    A detector from face_detector.create_detector() replaces the configured
+    one; a load controller adapts the stage to its latency budget. With
+    budget_ms, the share of processed frames within it is reported.
+    """
+    import intruder_detection as detection
+    from motion import MotionGate
+
+    save_dir = save_dir or tempfile.mkdtemp(prefix="ids_bench_")
+    save_times = []
+
+    def on_intruder(face_id, track, frame):
+        start = time.perf_counter()
+        detection.save_intruder_image(frame, directory=save_dir)
+        save_times.append(time.perf_counter() - start)
+
+    stage = detection.DetectionStage(
+        motion_gate=MotionGate() if motion_gate else None,
+        on_intruder=on_intruder,
+        on_recognition=lambda face_id, track: None,
+        detector=detector,
+        unknown_index=benchmark_unknown_index(),
+        load_controller=load_controller,
+    )
+
+    # Load the model up front so the first frame's latency is not the load time
+    model = detection.get_model()
+
+    frame_times, processed_times, detect_times, recognize_times = [], [], [], []
+    counts = {"true_positive": 0, "false_positive": 0, "false_negative": 0, "true_negative_frames": 0}
+    frames = 0
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+
+    for name, frame in iter_frames(source):
+        if max_frames is not None and frames >= max_frames:
+            break
+        start = time.perf_counter()
+        stage.process(frame)
+        frame_times.append(time.perf_counter() - start)
+        if stage.timings["detect"]:
+            processed_times.append(frame_times[-1])
+        detect_times.append(stage.timings["detect"])
+        if stage.timings["recognize"]:
+            recognize_times.append(stage.timings["recognize"])
+        frames += 1
+
+        if labels is not None:
+            predicted = stage.intruder_count()
+            expected = labels.get(name, 0)
+            counts["true_positive"] += min(predicted, expected)
+            counts["false_positive"] += max(predicted - expected, 0)
+            counts["false_negative"] += max(expected - predicted, 0)
+            if predicted == expected == 0:
+                counts["true_negative_frames"] += 1
+
+    wall = time.perf_counter() - wall_start
+    results = {
+        "source": source,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "opencv_version": cv2.__version__,
+        "python_version": platform.python_version(),
+        "motion_gate": motion_gate,
+        "recognition_engine": type(model.engine).__name__,
+        "detector": stage.detector.settings(),
+        "frames": frames,
+        "wall_seconds": wall,
+        "cpu_seconds": time.process_time() - cpu_start,
+        "fps": frames / wall if wall > 0 else 0.0,
+        "faces_seen": stage.faces_seen,
+        "recognizer_calls": stage.recognizer_calls,
+        "latency": {
+            "frame": summarize(frame_times),
+            "processed_frame": summarize(processed_times),
+            "detection": summarize(detect_times),
+            "recognition": summarize(recognize_times),
+            "saving": summarize(save_times),
+        },
+    }
+    if motion_gate:
+        results["motion_gate_stats"] = stage.motion_gate.stats()
+    if load_controller is not None:
+        results["load_control"] = load_controller.stats()
+    if budget_ms is not None and processed_times:
+        within = sum(1 for t in processed_times if t * 1000 <= budget_ms)
+        results["latency"]["within_budget"] = within / len(processed_times)
+    if labels is not None:
+        tp, fp, fn = counts["true_positive"], counts["false_positive"], counts["false_negative"]
+        counts["precision"] = tp / (tp + fp) if tp + fp else None
+        counts["recall"] = tp / (tp + fn) if tp + fn else None
+        results["intruders"] = counts
+    return results
+
+def budget_benchmark(source, budget_ms, load_processes=0, max_frames=None):
+    """
+    Replays a recording with fixed settings and then with the load
+    controller, both while `load_processes` CPU-bound processes compete
+    for the CPU, and reports how many processed frames stayed within the
+    budget.
+    """
+    from face_detector import create_detector
+    from load_controller import LoadController
+
+    results = {"source": source, "budget_ms": budget_ms, "load_processes": load_processes, "runs": {}}
+    stop_load = inject_load(load_processes)
+    try:
+        for name, controller in (("fixed", None), ("adaptive", LoadController(budget_ms))):
+            # The controller changes the detector's scale, so each run gets its own
+            run = run_benchmark(source, max_frames=max_frames, detector=create_detector(),
+                                load_controller=controller, budget_ms=budget_ms)
+            results["runs"][name] = {
+                "fps": run["fps"],
+                "processed_frame": run["latency"]["processed_frame"],
+                "within_budget": run["latency"].get("within_budget"),
+                "faces_seen": run["faces_seen"],
+                "recognizer_calls": run["recognizer_calls"],
+                "load_control": run.get("load_control"),
+            }
+    finally:
+        stop_load()
+    return results
+
+# Cold start: a fresh interpreter from launch to the first processed frame
+COLD_START_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+import cv2
+import intruder_detection as detection
+from benchmark import benchmark_unknown_index
+from model_store import get_model_store
+imported = time.perf_counter()
+get_model_store().preload()
+capture = cv2.VideoCapture(sys.argv[1])
+ok, frame = capture.read()
+opened = time.perf_counter()
+if not ok:
+    sys.exit("Unable to read a frame from " + sys.argv[1])
+stage = detection.DetectionStage(on_intruder=lambda *args: None, on_recognition=lambda *args: None,
+                                 unknown_index=benchmark_unknown_index())
+stage.process(frame)
+done = time.perf_counter()
+model = detection.get_model()
+print(json.dumps({"import_seconds": imported - start, "source_open_seconds": opened - imported,
+                  "first_frame_seconds": done - start, "model_source": model.source,
+                  "model_load_seconds": model.load_seconds}))
+"""
+
+def cold_start(source, runs=3):
+    """
+    Starts a new Python process per run and measures the time from launch
+    to the first processed frame of a video, including imports and model
+    loading.
+    """
+    results = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", COLD_START_SCRIPT, source], capture_output=True,
+                                text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        run = json.loads(output.strip().splitlines()[-1])
+        run["process_seconds"] = time.perf_counter() - start
+        results.append(run)
+    return {
+        "source": source,
+        "runs": results,
+        "best_first_frame_seconds": min(run["first_frame_seconds"] for run in results),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the detection loop on a recorded video or image directory.")
+    parser.add_argument("source", help="Video file or directory of images")
+    parser.add_argument("--labels", help="JSON file mapping frame index or image name to intruder count")
+    parser.add_argument("--motion-gate", action="store_true", help="Enable the motion gate")
+    parser.add_argument("--max-frames", type=int, default=None)
+    parser.add_argument("--save-dir", help="Where the stubbed alert path writes images (default: temp dir)")
+    parser.add_argument("--output", help="Write the JSON results to this file as well as stdout")
+    parser.add_argument("--backend", help="Comma-separated detector backends to compare (haar, lbp, yunet)")
+    parser.add_argument("--profile", help="Comma-separated detector profiles to compare")
+    parser.add_argument("--scale", type=float, default=None, help="Detection downscale factor")
+    parser.add_argument("--cold-start", type=int, metavar="RUNS", default=None,
+                        help="Measure start-up to the first processed frame in RUNS fresh processes")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="Compare fixed settings with the load controller at this per-frame budget")
+    parser.add_argument("--inject-load", type=int, metavar="PROCESSES", default=0,
+                        help="CPU-bound processes competing with the run (budget)")
+    args = parser.parse_args()
+
+    if args.cold_start:
+        results = cold_start(args.source, args.cold_start)
+    elif args.budget_ms:
+        results = budget_benchmark(args.source, args.budget_ms, args.inject_load, args.max_frames)
+    elif args.backend or args.profile or args.scale is not None:
+        from face_detector import DETECTOR_BACKEND, DETECTOR_PROFILE, create_detector
+        labels = load_labels(args.labels) if args.labels else None
+        backends = (args.backend or DETECTOR_BACKEND).split(",")
+        profiles = (args.profile or DETECTOR_PROFILE).split(",")
+        runs = []
+        for backend in backends:
+            for profile in profiles:
+                detector = create_detector(backend, profile, args.scale)
+                runs.append(run_benchmark(args.source, labels=labels, motion_gate=args.motion_gate,
+                                          save_dir=args.save_dir, max_frames=args.max_frames,
+                                          detector=detector))
+        summary = [{
+            "backend": run["detector"]["backend"],
+            "profile": profile,
+            "scale": run["detector"]["scale"],
+            "fps": run["fps"],
+            "detection_p50_ms": run["latency"]["detection"].get("p50_ms"),
+            "faces_seen": run["faces_seen"],
+        } for run, profile in zip(runs, [p for _ in backends for p in profiles])]
+        results = {"summary": summary, "runs": runs}
+    else:
+        labels = load_labels(args.labels) if args.labels else None
+        results = run_benchmark(args.source, labels=labels, motion_gate=args.motion_gate,
+                                save_dir=args.save_dir, max_frames=args.max_frames)
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+import logging
+import os
+import time
+import cv2
+from metrics import CAPTURE_RECONNECTS
+from structured_log import log_event
+
+# Capture configuration
+CAMERA_SOURCE = os.getenv("IDS_CAMERA", "0")                         # Camera index, URL, file or directory
+RECONNECT_DELAY = 0.5                                                # First retry after a lost source, seconds
+RECONNECT_MAX_DELAY = float(os.getenv("IDS_RECONNECT_MAX_DELAY", "30"))  # Backoff cap, seconds
+CAMERA_BUFFER_SIZE = 1       # Driver buffer requested from backends that honour CAP_PROP_BUFFERSIZE
+DRAIN_GRAB_SECONDS = 0.004   # A grab faster than this came out of the driver buffer, not off the sensor
+MAX_DRAIN_FRAMES = 8         # Most buffered frames skipped for one read
+DEFAULT_FPS = 30             # Pace of files that report no frame rate, and of realtime directories
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+def parse_source(source):
+    """
+    Converts a camera index given as text to an int; URLs and file paths
+    are passed to OpenCV unchanged.
+    """
+    return int(source) if str(source).isdigit() else source
+
+class CaptureSource:
+    """
+    A source of frames. read() returns (frame, ts), where ts is the
+    time.monotonic() at which the frame was captured, or None if no frame
+    is available.
+
+    Live sources (cameras, streams) that fail are closed and reopened on
+    later reads with exponential backoff, so a consumer keeps calling
+    read() and waits retry_in() seconds between failures. Finite sources
+    (files, image directories) set `ended` once exhausted.
+    """
+    live = False
+
+    def __init__(self, name, max_delay=RECONNECT_MAX_DELAY):
+        self.name = str(name)
+        self.max_delay = max_delay
+        self.connected = False
+        self.ended = False
+        self.frames_read = 0
+        self.reconnects = 0
+        self._delay = RECONNECT_DELAY
+        self._retry_at = 0.0
+        self._reconnect_metric = CAPTURE_RECONNECTS.labels(self.name)
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _read(self):
+        raise NotImplementedError
+
+    def _release(self):
+        pass
+
+    def open(self):
+        """
+        Opens the source. Returns False if it is unavailable.
+        """
+        self.connected = self._open()
+        return self.connected
+
+    def read(self):
+        if not self.connected:
+            if not self.live or self.ended or time.monotonic() < self._retry_at or not self._reconnect():
+                return None
+        captured = self._read()
+        if captured is None:
+            if self.live and not self.ended:
+                self._lost()
+            else:
+                self.ended = True
+            return None
+        self.frames_read += 1
+        return captured
+
+    def _lost(self):
+        self._release()
+        self.connected = False
+        self._delay = RECONNECT_DELAY
+        self._retry_at = time.monotonic() + self._delay
+        log_event("capture lost", logging.WARNING, source=self.name, retry_in=self._delay)
+
+    def _reconnect(self):
+        if self._open():
+            self.connected = True
+            self.reconnects += 1
+            self._reconnect_metric.inc()
+            log_event("capture reconnected", source=self.name, reconnects=self.reconnects)
+            return True
+        self._delay = min(self._delay * 2, self.max_delay)
+        self._retry_at = time.monotonic() + self._delay
+        log_event("capture reconnect failed", logging.WARNING, key=("reconnect", self.name),
+                  source=self.name, retry_in=self._delay)
+        return False
+
+    def retry_in(self):
+        """
+        Returns the seconds until a lost live source is retried.
+        """
+        if self.connected or self.ended:
+            return 0.0
+        return max(self._retry_at - time.monotonic(), 0.0)
+
+    def release(self):
+        self._release()
+        self.connected = False
+
+    def stats(self):
+        return {"source": self.name, "connected": self.connected, "ended": self.ended,
+                "frames_read": self.frames_read, "reconnects": self.reconnects}
+
+class CameraSource(CaptureSource):
+    """
+    A webcam or network stream through cv2.VideoCapture. Drivers queue a
+    few frames while the consumer is busy, and a plain read() returns the
+    oldest of them; with drain, frames that come out of that queue are
+    skipped so each read returns the freshest frame. A grab that returns
+    almost at once was buffered; one that waits was just captured.
+    """
+    live = True
+
+    def __init__(self, source, drain=True, open_capture=cv2.VideoCapture, max_delay=RECONNECT_MAX_DELAY):
+        super().__init__(source, max_delay)
+        self.source = parse_source(source)
+        self.drain = drain
+        self.open_capture = open_capture
+        self.capture = None
+        self.drained = 0
+
+    def _open(self):
+        capture = self.open_capture(self.source)
+        if not capture.isOpened():
+            capture.release()
+            return False
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, CAMERA_BUFFER_SIZE)
+        self.capture = capture
+        return True
+
+    def _read(self):
+        start = time.monotonic()
+        if not self.capture.grab():
+            return None
+        ts = time.monotonic()
+        if self.drain:
+            drained = 0
+            while ts - start < DRAIN_GRAB_SECONDS and drained < MAX_DRAIN_FRAMES:
+                start = ts
+                if not self.capture.grab():
+                    return None
+                ts = time.monotonic()
+                drained += 1
+            self.drained += drained
+        ret, frame = self.capture.retrieve()
+        return (frame, ts) if ret else None
+
+    def _release(self):
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+
+    def stats(self):
+        return {**super().stats(), "drained": self.drained}
+
+class VideoFileSource(CaptureSource):
+    """
+    A recorded video. Frames are read as fast as they are consumed, or with
+    realtime at the file's frame rate, skipping frames the consumer was too
+    slow for, the way a camera would.
+    """
+    def __init__(self, path, realtime=False, loop=False):
+        super().__init__(path)
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self.capture = None
+        self.skipped = 0
+
+    def _open(self):
+        self.capture = cv2.VideoCapture(self.path)
+        if not self.capture.isOpened():
+            self.capture.release()
+            self.capture = None
+            return False
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+        self._index = 0
+        self._start = time.monotonic()
+        return True
+
+    def _read(self):
+        if self.realtime:
+            due = self._start + self._index / self.fps
+            now = time.monotonic()
+            if due > now:
+                time.sleep(due - now)
+            else:
+                while self._start + (self._index + 1) / self.fps <= now and self.capture.grab():
+                    self._index += 1
+                    self.skipped += 1
+        ret, frame = self.capture.read()
+        if not ret and self.loop and self._index:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            self._start, self._index = time.monotonic(), 0
+            ret, frame = self.capture.read()
+        if not ret:
+            return None
+        self._index += 1
+        return frame, time.monotonic()
+
+    def _release(self):
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+
+class ImageDirectorySource(CaptureSource):
+    """
+    The images of a directory in name order, optionally paced at fps.
+    """
+    def __init__(self, directory, fps=None, loop=False):
+        super().__init__(directory)
+        self.directory = directory
+        self.fps = fps
+        self.loop = loop
+
+    def _open(self):
+        self.files = [os.path.join(self.directory, f) for f in sorted(os.listdir(self.directory))
+                      if f.lower().endswith(IMAGE_EXTENSIONS)]
+        self._index = 0
+        self._next_due = time.monotonic()
+        return bool(self.files)
+
+    def _read(self):
+        while True:
+            if self._index >= len(self.files):
+                if not self.loop:
+                    return None
+                self._index = 0
+            path = self.files[self._index]
+            self._index += 1
+            if self.fps:
+                delay = self._next_due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                self._next_due = max(self._next_due, time.monotonic() - 1 / self.fps) + 1 / self.fps
+            frame = cv2.imread(path)
+            if frame is not None:
+                return frame, time.monotonic()
+
+def create_source(spec=CAMERA_SOURCE, realtime=False, loop=False):
+    """
+    Returns an unopened source for a camera index, URL, video file or image
+    directory. realtime paces files and directories like a camera.
+    """
+    spec = str(spec)
+    if os.path.isdir(spec):
+        return ImageDirectorySource(spec, fps=DEFAULT_FPS if realtime else None, loop=loop)
+    if os.path.isfile(spec):
+        return VideoFileSource(spec, realtime=realtime, loop=loop)
+    return CameraSource(spec)
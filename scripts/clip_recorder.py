@@ -0,0 +1,257 @@
+import collections
+import datetime
+import os
+import re
+import threading
+import time
+import cv2
+import numpy as np
+from pipeline import DropOldestQueue
+
+# Base directories
+BASE_DIR = os.path.join(os.path.expanduser("~/Desktop"), "IDS")
+SCREEN_RECORDINGS_DIR = os.path.join(BASE_DIR, "logs", "screen_recordings")
+
+# Clip configuration
+CLIP_RECORDING = os.getenv("IDS_CLIP_RECORDING", "0") == "1"     # Opt-in: buffers up to CLIP_BUFFER_MB per camera
+CLIP_PRE_SECONDS = float(os.getenv("IDS_CLIP_PRE_SECONDS", "5"))     # Footage kept from before the event
+CLIP_POST_SECONDS = float(os.getenv("IDS_CLIP_POST_SECONDS", "5"))   # Footage recorded after the event
+CLIP_BUFFER_MB = float(os.getenv("IDS_CLIP_BUFFER_MB", "64"))        # Memory for the buffer, open clip and pending clips, per camera
+CLIP_FPS = float(os.getenv("IDS_CLIP_FPS", "15"))                    # Frames per second kept for clips
+CLIP_QUALITY = 80             # JPEG quality of buffered frames
+CLIP_CODEC = "mp4v"
+CLIP_EXTENSION = ".mp4"
+ENCODE_QUEUE_SIZE = 4         # Raw frames waiting to be compressed
+WRITE_QUEUE_SIZE = 4          # Finished clips waiting to be written
+
+class Clip:
+    """
+    Frames collected for one event: the buffered lead-in plus everything
+    up to end_ts. Events that arrive while a clip is open extend it.
+    """
+    def __init__(self, trigger_ts, end_ts, frames, details):
+        self.trigger_ts = trigger_ts
+        self.end_ts = end_ts
+        self.frames = frames
+        self.bytes = sum(len(data) for _, data in frames)
+        self.details = details
+
+class ClipRecorder:
+    """
+    Keeps the last few seconds of a camera as JPEG-compressed frames in a
+    ring buffer. trigger() snapshots the buffer and keeps collecting for
+    the post-event period; the clip is then decoded and written to
+    screen_recordings on a writer thread.
+
+    The buffer, the open clip and the clips waiting to be written share
+    one budget of max_bytes. When it is exceeded, the oldest pending clip
+    is dropped first, then the oldest buffered frames; an open clip that
+    would still not fit stops growing.
+
+    The detection loop only hands over frame references. Compression runs
+    on an encoder thread behind a drop-oldest queue, so a busy encoder
+    costs clip frames rather than detection time. on_clip(path, clip) is
+    called from the writer thread for each finished file.
+    """
+    def __init__(self, camera=None, directory=SCREEN_RECORDINGS_DIR, pre_seconds=CLIP_PRE_SECONDS,
+                 post_seconds=CLIP_POST_SECONDS, max_bytes=int(CLIP_BUFFER_MB * 1024 * 1024),
+                 fps=CLIP_FPS, quality=CLIP_QUALITY, on_clip=None):
+        self.camera = camera
+        self.directory = directory
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.max_bytes = max_bytes
+        self.min_interval = 1.0 / fps if fps > 0 else 0.0
+        self.quality = quality
+        self.on_clip = on_clip
+        os.makedirs(directory, exist_ok=True)
+
+        self._ring = collections.deque()  # (ts, jpeg bytes), oldest first
+        self._ring_bytes = 0
+        self._pending_bytes = 0  # Clips queued for or being written
+        self._clip = None
+        self._lock = threading.Lock()
+        self._last_accepted = 0.0
+        self.encode_queue = DropOldestQueue("clip-encode", ENCODE_QUEUE_SIZE, camera)
+        self.write_queue = DropOldestQueue("clip-write", WRITE_QUEUE_SIZE, camera)
+        self.clips_written = 0
+        self.clips_failed = 0
+        self.clip_frames_dropped = 0
+        self._stop = threading.Event()
+        self._encoder = threading.Thread(target=self._encode_loop, name="clip-encoder", daemon=True)
+        self._writer = threading.Thread(target=self._write_loop, name="clip-writer", daemon=True)
+        self._encoder.start()
+        self._writer.start()
+
+    def add_frame(self, frame, ts=None):
+        """
+        Offers a frame to the buffer. The frame must not be modified
+        afterwards. Frames beyond the clip frame rate are ignored.
+        """
+        ts = time.time() if ts is None else ts
+        if ts - self._last_accepted < self.min_interval:
+            return
+        self._last_accepted = ts
+        self.encode_queue.put((ts, frame))
+
+    def trigger(self, ts=None, **details):
+        """
+        Starts a clip around an event, or extends the open one. Details
+        (face_id, track_id, confidence...) are passed on with the clip.
+        """
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            if self._clip is not None:
+                self._clip.end_ts = max(self._clip.end_ts, ts + self.post_seconds)
+                return
+            frames = [(t, data) for t, data in self._ring if t >= ts - self.pre_seconds]
+            self._clip = Clip(ts, ts + self.post_seconds, frames, details)
+
+    def _encode_loop(self):
+        while not self._stop.is_set() or self.encode_queue.depth():
+            item = self.encode_queue.get(timeout=0.5)
+            if item is None:
+                continue
+            ts, frame = item
+            ok, data = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if not ok:
+                continue
+            self._append(ts, data.tobytes())
+        with self._lock:
+            self._finish_clip()
+
+    def _append(self, ts, data):
+        with self._lock:
+            self._ring.append((ts, data))
+            self._ring_bytes += len(data)
+            # Only the lead-in is needed outside a clip
+            while self._ring and self._ring[0][0] < ts - self.pre_seconds:
+                self._ring_bytes -= len(self._ring.popleft()[1])
+
+            clip = self._clip
+            if clip is not None:
+                clip.frames.append((ts, data))
+                clip.bytes += len(data)
+            self._shed()
+            if clip is not None and ts >= clip.end_ts:
+                self._finish_clip()
+
+    def held_bytes(self):
+        """
+        Returns the bytes counted against the budget. Frames shared by the
+        buffer and the open clip are counted twice, so this is an upper
+        bound.
+        """
+        with self._lock:
+            return self._held_bytes()
+
+    def _held_bytes(self):
+        return self._ring_bytes + (self._clip.bytes if self._clip is not None else 0) + self._pending_bytes
+
+    def _shed(self):
+        # Called with the lock held; see the class docstring for the order
+        while self._held_bytes() > self.max_bytes:
+            dropped = self.write_queue.drop_oldest()
+            if dropped is not None:
+                self._pending_bytes -= dropped.bytes
+                print("Clip memory budget exceeded; dropping the oldest pending clip.")
+            elif self._ring:
+                self._ring_bytes -= len(self._ring.popleft()[1])
+            elif self._clip is not None and self._clip.frames:
+                self._clip.bytes -= len(self._clip.frames.pop()[1])
+                self.clip_frames_dropped += 1
+            else:
+                break  # Only the clip being written is left
+
+    def _finish_clip(self):
+        # Called with the lock held
+        if self._clip is not None and self._clip.frames:
+            if self.write_queue.depth() >= self.write_queue.maxsize:
+                dropped = self.write_queue.drop_oldest()
+                if dropped is not None:
+                    self._pending_bytes -= dropped.bytes
+                    print("Clip writer is behind; dropping the oldest pending clip.")
+            self._pending_bytes += self._clip.bytes
+            self.write_queue.put(self._clip)
+        self._clip = None
+
+    def _write_loop(self):
+        while not self._stop.is_set() or self.write_queue.depth() or self._encoder.is_alive():
+            clip = self.write_queue.get(timeout=0.5)
+            if clip is None:
+                continue
+            try:
+                path = self.write_clip(clip)
+                self.clips_written += 1
+                if self.on_clip is not None:
+                    self.on_clip(path, clip)
+            except Exception as e:
+                self.clips_failed += 1
+                print(f"Failed to write clip: {e}")
+            finally:
+                with self._lock:
+                    self._pending_bytes -= clip.bytes
+
+    def clip_path(self, clip):
+        timestamp = datetime.datetime.fromtimestamp(clip.trigger_ts).strftime("%Y%m%d_%H%M%S_%f")
+        suffix = "" if self.camera is None else "_" + re.sub(r"[^A-Za-z0-9]+", "-", str(self.camera)).strip("-")
+        return os.path.join(self.directory, f"clip_{timestamp}{suffix}{CLIP_EXTENSION}")
+
+    def write_clip(self, clip):
+        """
+        Decodes a clip's frames and writes them as a video, played back at
+        the rate they were captured.
+        """
+        frames = clip.frames
+        duration = frames[-1][0] - frames[0][0]
+        fps = (len(frames) - 1) / duration if len(frames) > 1 and duration > 0 else 1.0
+        first = cv2.imdecode(np.frombuffer(frames[0][1], np.uint8), cv2.IMREAD_COLOR)
+        height, width = first.shape[:2]
+
+        path = self.clip_path(clip)
+        # Written under a temporary name so the log server never lists a partial file
+        tmp_path = path[:-len(CLIP_EXTENSION)] + ".part" + CLIP_EXTENSION
+        writer = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*CLIP_CODEC), fps, (width, height))
+        if not writer.isOpened():
+            raise IOError(f"Cannot open video writer for {tmp_path}")
+        try:
+            writer.write(first)
+            for _, data in frames[1:]:
+                frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+                if frame.shape[:2] != (height, width):
+                    frame = cv2.resize(frame, (width, height))
+                writer.write(frame)
+        finally:
+            writer.release()
+        os.replace(tmp_path, path)
+        return path
+
+    def stop(self):
+        """
+        Closes any open clip with the frames it has and waits for pending
+        clips to be written.
+        """
+        self._stop.set()
+        self._encoder.join(timeout=5)
+        self._writer.join(timeout=60)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "buffered_frames": len(self._ring),
+                "buffered_mb": self._ring_bytes / (1024 * 1024),
+                "held_mb": self._held_bytes() / (1024 * 1024),
+                "pending_clips": self.write_queue.depth(),
+                "recording": self._clip is not None,
+                "clips_written": self.clips_written,
+                "clips_failed": self.clips_failed,
+                "encode_dropped": self.encode_queue.dropped,
+                "clip_frames_dropped": self.clip_frames_dropped,
+                "clips_dropped": self.write_queue.dropped,
+            }
+
+    def format_stats(self):
+        s = self.stats()
+        return (f"buffer {s['buffered_frames']} frames ({s['buffered_mb']:.1f} MB), "
+                f"{s['clips_written']} clips written, {s['clips_failed']} failed, "
+                f"{s['encode_dropped']} frames dropped by the encoder")
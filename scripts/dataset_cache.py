@@ -0,0 +1,168 @@
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from face_utils import normalize_face, preprocessing_settings
+
+# Cache location
+BASE_DIR = os.path.join(os.path.expanduser("~/Desktop"), "IDS")
+CACHE_DIR = os.path.join(BASE_DIR, "dataset_cache")
+FACES_FILE = "faces.npy"
+LABELS_FILE = "labels.npy"
+INDEX_FILE = "index.json"
+COPY_CHUNK = 4096  # Rows copied per step when compacting the cache
+
+def load_images(dataset_path, rel_paths, labels, entries, workers=None):
+    """
+    Decodes and normalizes the given dataset files on a thread pool.
+    Returns the faces, their labels and the paths that decoded. With a
+    fixed face size the faces are packed into one contiguous
+    (N, size, size) uint8 array; otherwise they are returned as a list.
+    """
+    settings = preprocessing_settings()
+    size = settings["face_size"]
+    faces = np.empty((len(rel_paths), size, size), dtype=np.uint8) if size else [None] * len(rel_paths)
+    ok = np.zeros(len(rel_paths), dtype=bool)
+
+    def decode(i):
+        img = cv2.imread(os.path.join(dataset_path, rel_paths[i]), cv2.IMREAD_GRAYSCALE)
+        if img is not None:
+            faces[i] = normalize_face(img, size, settings["equalize_hist"])
+            ok[i] = True
+
+    # cv2.imread and resize release the GIL, so threads decode in parallel
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        list(executor.map(decode, range(len(rel_paths))))
+
+    loaded = [rel_path for rel_path, decoded in zip(rel_paths, ok) if decoded]
+    image_labels = np.array([labels[entries[rel_path]["user"]] for rel_path in loaded], dtype=np.int32)
+    if size:
+        if not ok.all():
+            faces = faces[ok]
+    else:
+        faces = [face for face in faces if face is not None]
+    return faces, image_labels, loaded
+
+def load_index(cache_dir=CACHE_DIR):
+    """
+    Returns the cache index, or None if there is no usable cache.
+    """
+    index_path = os.path.join(cache_dir, INDEX_FILE)
+    faces_path = os.path.join(cache_dir, FACES_FILE)
+    if not os.path.exists(index_path) or not os.path.exists(faces_path):
+        return None
+    with open(index_path, "r") as file:
+        index = json.load(file)
+    # An interrupted update can leave the faces file out of step with the index
+    faces = np.load(faces_path, mmap_mode="r")
+    if faces.shape[0] != len(index["paths"]):
+        return None
+    return index
+
+def is_fresh(entries, cache_dir=CACHE_DIR):
+    """
+    Returns True if the cache holds exactly the current dataset files with
+    the current normalization settings.
+    """
+    index = load_index(cache_dir)
+    if index is None or index["preprocessing"] != preprocessing_settings():
+        return False
+    cached = dict(zip(index["paths"], index["sha1"]))
+    cached.update(index["skipped"])
+    return cached == {rel_path: entry["sha1"] for rel_path, entry in entries.items()}
+
+def load_cache(cache_dir=CACHE_DIR):
+    """
+    Returns the memory-mapped faces, the label array and the source paths.
+    """
+    index = load_index(cache_dir)
+    if index is None:
+        raise FileNotFoundError(f"No dataset cache found in {cache_dir}")
+    faces = np.load(os.path.join(cache_dir, FACES_FILE), mmap_mode="r")
+    labels = np.load(os.path.join(cache_dir, LABELS_FILE))
+    return faces, labels, index["paths"]
+
+def update_cache(dataset_path, entries, labels, cache_dir=CACHE_DIR, workers=None):
+    """
+    Brings the cache in line with the dataset. Rows of unchanged files are
+    copied over from the old cache, removed files are dropped, and only new
+    or modified files are decoded. Returns the same values as load_cache().
+    """
+    settings = preprocessing_settings()
+    if not settings["face_size"]:
+        raise ValueError("The dataset cache needs a fixed face size (IDS_FACE_SIZE > 0).")
+    os.makedirs(cache_dir, exist_ok=True)
+    faces_path = os.path.join(cache_dir, FACES_FILE)
+
+    index = load_index(cache_dir)
+    if index is None or index["preprocessing"] != settings:
+        index = {"paths": [], "sha1": [], "skipped": {}}
+    wanted = {rel_path: entry["sha1"] for rel_path, entry in entries.items()}
+
+    keep = [i for i, (rel_path, sha1) in enumerate(zip(index["paths"], index["sha1"]))
+            if wanted.get(rel_path) == sha1]
+    kept_paths = [index["paths"][i] for i in keep]
+    skipped = {p: sha1 for p, sha1 in index["skipped"].items() if wanted.get(p) == sha1}
+    known = set(kept_paths) | set(skipped)
+    to_decode = [rel_path for rel_path in entries if rel_path not in known]
+
+    unchanged = len(keep) == len(index["paths"]) and not to_decode and len(skipped) == len(index["skipped"])
+    if not unchanged:
+        new_faces, _, loaded = load_images(dataset_path, to_decode, labels, entries, workers)
+        for rel_path in set(to_decode) - set(loaded):
+            skipped[rel_path] = wanted[rel_path]
+
+        size = settings["face_size"]
+        total = len(keep) + len(loaded)
+        tmp_path = faces_path + ".tmp.npy"
+        out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint8, shape=(total, size, size))
+        if keep:
+            old = np.load(faces_path, mmap_mode="r")
+            for start in range(0, len(keep), COPY_CHUNK):
+                rows = keep[start:start + COPY_CHUNK]
+                if rows[-1] - rows[0] == len(rows) - 1:
+                    out[start:start + len(rows)] = old[rows[0]:rows[-1] + 1]
+                else:
+                    out[start:start + len(rows)] = old[rows]
+            del old
+        if loaded:
+            out[len(keep):] = new_faces
+        out.flush()
+        del out
+        os.replace(tmp_path, faces_path)
+
+        index = {
+            "preprocessing": settings,
+            "paths": kept_paths + loaded,
+            "sha1": [wanted[p] for p in kept_paths + loaded],
+            "skipped": skipped,
+        }
+        tmp_index = os.path.join(cache_dir, INDEX_FILE + ".tmp")
+        with open(tmp_index, "w") as file:
+            json.dump(index, file)
+        os.replace(tmp_index, os.path.join(cache_dir, INDEX_FILE))
+        print(f"Dataset cache updated: {len(keep)} kept, {len(loaded)} decoded, "
+              f"{len(index['paths'])} total faces.")
+
+    # Labels are cheap to rebuild and follow the current label assignment
+    label_array = np.array([labels[entries[p]["user"]] for p in index["paths"]], dtype=np.int32)
+    np.save(os.path.join(cache_dir, LABELS_FILE), label_array)
+    return np.load(faces_path, mmap_mode="r"), label_array, index["paths"]
+
+if __name__ == "__main__":
+    from train_model import DATASET_PATH, assign_labels, load_manifest, scan_dataset
+
+    parser = argparse.ArgumentParser(description="Build or refresh the packed face dataset cache.")
+    parser.add_argument("--workers", type=int, default=None, help="Image decoding threads (default: CPU count)")
+    args = parser.parse_args()
+
+    manifest = load_manifest()
+    entries = scan_dataset(DATASET_PATH, manifest)
+    labels = assign_labels({entry["user"] for entry in entries.values()}, manifest["labels"])
+    if is_fresh(entries):
+        print("Dataset cache is up to date.")
+    else:
+        faces, label_array, paths = update_cache(DATASET_PATH, entries, labels, workers=args.workers)
+        print(f"Cached {faces.shape[0]} faces of size {faces.shape[1]}x{faces.shape[2]} in {CACHE_DIR}")
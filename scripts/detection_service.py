@@ -0,0 +1,475 @@
+import argparse
+import hmac
+import inspect
+import json
+import os
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import intruder_detection as detection
+from alerts import CHANNELS, get_dispatcher, shutdown_dispatcher
+from capture_source import create_source
+from clip_recorder import CLIP_RECORDING, ClipRecorder
+from face_detector import create_detector
+from face_utils import peak_memory_mb
+from load_controller import LOAD_CONTROL, LoadController
+from metrics import REGISTRY, MetricsWriter
+from model_store import get_model_store
+from motion import MOTION_GATE, MotionGate
+from pipeline import FramePipeline
+from profiler import profile_for
+from service_client import SCRIPTS_DIR, SERVICE_HOST, SERVICE_PORT, SERVICE_TOKEN, ServiceClient, ServiceError
+from stream import FrameBroadcaster, StreamServer
+from unknown_index import UNKNOWN_INDEX, get_unknown_index, shutdown_unknown_index
+
+# Base directories
+BASE_DIR = os.path.join(os.path.expanduser("~/Desktop"), "IDS")
+LOG_DIR = os.path.join(BASE_DIR, "logs")
+TRAINING_LOG_PATH = os.path.join(LOG_DIR, "training.log")
+
+# Service configuration
+CAMERA_STOP_TIMEOUT = 5  # Seconds to wait for a camera that is being restarted
+
+class CameraRunner:
+    """
+    Runs the detection loop for one source on its own thread, headless,
+    with its own detector, pipeline, tracker and clip recorder. The model
+    is shared with every other camera through the model store. A camera
+    that drops out is reconnected; a file source ends the runner.
+    """
+    def __init__(self, source, broadcaster=None, motion_gate=MOTION_GATE):
+        self.source = source
+        self.name = str(source)
+        self.broadcaster = broadcaster
+        self.capture = create_source(source)
+        if not self.capture.open():
+            raise ServiceError(f"Unable to open source {source}")
+        self.clip_recorder = ClipRecorder(camera=self.name, on_clip=detection.record_clip) if CLIP_RECORDING else None
+        self.pipeline = FramePipeline(self.capture, camera=self.name)
+        load_controller = LoadController(name=self.name) if LOAD_CONTROL else None
+        # Detector backends keep per-call state, so cameras do not share one
+        self.stage = detection.DetectionStage(self.pipeline, MotionGate() if motion_gate else None,
+                                              camera=self.name, clip_recorder=self.clip_recorder,
+                                              detector=create_detector(), load_controller=load_controller)
+        self.stop_event = threading.Event()
+        self.started_at = time.time()
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name=f"camera-{self.name}", daemon=True)
+
+    def start(self):
+        self.pipeline.start()
+        self.thread.start()
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                frame = self.pipeline.next_frame(timeout=0.2)
+                if frame is None:
+                    break
+                self.stage.process(frame)
+                self.pipeline.frame_done()
+                if self.broadcaster is not None:
+                    self.broadcaster.publish(frame)
+                if self.clip_recorder is not None:
+                    self.clip_recorder.add_frame(frame)
+        except Exception as e:
+            self.error = str(e)
+            print(f"Camera {self.name} stopped: {e}")
+        finally:
+            self.pipeline.stop()
+            if self.clip_recorder is not None:
+                self.clip_recorder.stop()
+            self.capture.release()
+
+    def stop(self):
+        """
+        Asks the loop to stop and returns at once; the pipeline is drained
+        and the camera released on the camera's thread.
+        """
+        self.stop_event.set()
+        self.pipeline.grabber.stop()
+
+    @property
+    def state(self):
+        if self.thread.is_alive():
+            return "stopping" if self.stop_event.is_set() else "running"
+        if self.error is not None:
+            return "failed"
+        return "stopped" if self.stop_event.is_set() else "ended"
+
+    def status(self):
+        elapsed = max(time.time() - self.started_at, 1e-6)
+        return {
+            "source": self.name,
+            "state": self.state,
+            "error": self.error,
+            "started_at": self.started_at,
+            "fps": self.pipeline.frames_processed / elapsed,
+            "connected": self.capture.connected,
+            "reconnects": self.capture.reconnects,
+            "faces": len(self.stage.tracks),
+            "streaming": self.broadcaster is not None,
+        }
+
+    def metrics(self):
+        metrics = {
+            "pipeline": self.pipeline.stats(),
+            "recognition": {
+                "faces_seen": self.stage.faces_seen,
+                "recognizer_calls": self.stage.recognizer_calls,
+                "active_tracks": len(self.stage.tracker.tracks),
+                "model_version": self.stage.model_version,
+                "last_frame_ms": {name: seconds * 1000 for name, seconds in self.stage.timings.items()},
+            },
+        }
+        if self.stage.motion_gate is not None:
+            metrics["motion_gate"] = self.stage.motion_gate.stats()
+        if self.stage.load_controller is not None:
+            metrics["load"] = self.stage.load_controller.stats()
+        if self.clip_recorder is not None:
+            metrics["clips"] = self.clip_recorder.stats()
+        return metrics
+
+class DetectionService:
+    """
+    A long-lived process that keeps OpenCV, the detector and the model
+    loaded, so cameras start and stop in milliseconds. Commands arrive as
+    JSON requests from the control server; handle() dispatches them to the
+    command_<name> methods.
+
+    Training runs as a child process so it cannot stall or crash detection;
+    the model store picks up the new model when training finishes.
+    """
+    def __init__(self, live_stream=detection.LIVE_STREAM):
+        self.store = get_model_store()
+        self.cameras = {}
+        self.starting = set()  # Sources being opened outside the lock
+        self.lock = threading.Lock()
+        self.live_stream = live_stream
+        self.broadcaster = None
+        self.stream_server = None
+        self.training = None
+        self.training_started = None
+        self.metrics_writer = MetricsWriter("service")
+        self.stop_event = threading.Event()
+        self.started_at = time.time()
+
+    def open(self):
+        self.store.preload()
+        self.store.watch()
+        self.metrics_writer.start()
+        if UNKNOWN_INDEX:
+            get_unknown_index("service")
+        if self.live_stream:
+            self.broadcaster = FrameBroadcaster()
+            self.stream_server = StreamServer(self.broadcaster)
+            self.stream_server.start()
+
+    def close(self):
+        with self.lock:
+            runners = list(self.cameras.values())
+        for runner in runners:
+            runner.stop()
+        for runner in runners:
+            runner.thread.join(timeout=30)
+        if self.stream_server is not None:
+            self.stream_server.stop()
+            self.broadcaster.stop()
+        self.store.stop()
+        self.metrics_writer.stop()
+        shutdown_dispatcher()
+        shutdown_unknown_index()
+
+    def handle(self, request):
+        """
+        Runs one request ({"command": name, ...arguments}) and returns its
+        result.
+        """
+        token = request.pop("token", "")
+        if SERVICE_TOKEN and not hmac.compare_digest(str(token), SERVICE_TOKEN):
+            raise ServiceError("Invalid token")
+        command = request.pop("command", None)
+        handler = getattr(self, f"command_{command}", None)
+        if handler is None:
+            raise ServiceError(f"Unknown command: {command}")
+        # Checked before the call so a TypeError raised inside a command is
+        # reported as the internal error it is
+        try:
+            inspect.signature(handler).bind(**request)
+        except TypeError as e:
+            raise ServiceError(f"Bad arguments for {command}: {e}")
+        return handler(**request)
+
+    def command_ping(self):
+        return {"pid": os.getpid(), "uptime": time.time() - self.started_at}
+
+    def command_start(self, source=0):
+        """
+        Starts detection on a camera index, URL or video file.
+        """
+        name = str(source)
+        with self.lock:
+            runner = self.cameras.get(name)
+            if runner is not None and runner.state == "running":
+                return runner.status()
+            if name in self.starting:
+                raise ServiceError(f"Camera {name} is already starting")
+            self.starting.add(name)
+        # Opening a camera can block for seconds, so it is done without the
+        # lock; the runner is only published under it
+        try:
+            if runner is not None:
+                # A previous run may still be releasing the device
+                runner.thread.join(timeout=CAMERA_STOP_TIMEOUT)
+            # Fail fast on a missing model instead of in the camera thread
+            try:
+                detection.get_model()
+            except FileNotFoundError as e:
+                raise ServiceError(str(e))
+            runner = CameraRunner(source)
+            with self.lock:
+                streaming = any(r.broadcaster is not None and r.thread.is_alive() for r in self.cameras.values())
+                runner.broadcaster = None if streaming else self.broadcaster
+                runner.start()
+                self.cameras[name] = runner
+        finally:
+            with self.lock:
+                self.starting.discard(name)
+        print(f"Started detection on {name}")
+        return runner.status()
+
+    def command_stop(self, source=None, wait=False):
+        """
+        Stops one camera, or all of them if no source is given. With wait,
+        returns only once the cameras have been released.
+        """
+        with self.lock:
+            if source is None:
+                runners = list(self.cameras.values())
+            elif str(source) in self.cameras:
+                runners = [self.cameras[str(source)]]
+            else:
+                raise ServiceError(f"Camera {source} is not running")
+        for runner in runners:
+            runner.stop()
+            print(f"Stopping detection on {runner.name}")
+        if wait:
+            for runner in runners:
+                runner.thread.join(timeout=CAMERA_STOP_TIMEOUT)
+                if runner.thread.is_alive():
+                    raise ServiceError(f"Camera {runner.name} did not stop within {CAMERA_STOP_TIMEOUT}s")
+        return [runner.status() for runner in runners]
+
+    def command_retrain(self, full=False):
+        """
+        Starts train_model.py in the background.
+        """
+        with self.lock:
+            if self.training is not None and self.training.poll() is None:
+                raise ServiceError("Training is already running")
+            args = [sys.executable, "-u", os.path.join(SCRIPTS_DIR, "train_model.py")]
+            if full:
+                args.append("--full")
+            os.makedirs(LOG_DIR, exist_ok=True)
+            with open(TRAINING_LOG_PATH, "w") as log:
+                self.training = subprocess.Popen(args, stdout=log, stderr=subprocess.STDOUT, cwd=SCRIPTS_DIR)
+            self.training_started = time.time()
+        print(f"Training started (pid {self.training.pid}, log {TRAINING_LOG_PATH})")
+        return self.training_status()
+
+    def command_reload(self):
+        """
+        Reloads the model files now instead of waiting for the watcher.
+        """
+        model = self.store.reload()
+        if model is None:
+            raise ServiceError("Model reload failed; the current model is still in use")
+        return self.model_status()
+
+    def command_test_alert(self, channel=None):
+        """
+        Sends a test message on one channel or all of them.
+        """
+        channels = CHANNELS if channel is None else (channel,)
+        unknown = [c for c in channels if c not in CHANNELS]
+        if unknown:
+            raise ServiceError(f"Unknown channel {unknown[0]}. Choose from: {', '.join(CHANNELS)}")
+        return get_dispatcher().send_test(channels)
+
+    def command_status(self):
+        with self.lock:
+            cameras = {name: runner.status() for name, runner in self.cameras.items()}
+        return {
+            "pid": os.getpid(),
+            "uptime": time.time() - self.started_at,
+            "cameras": cameras,
+            "model": self.model_status(),
+            "training": self.training_status(),
+            "live_stream": self.broadcaster is not None,
+        }
+
+    def command_unknown(self, limit=50):
+        """
+        Lists the most recently seen unknown face identities, without their
+        sightings.
+        """
+        if not UNKNOWN_INDEX:
+            raise ServiceError("The unknown face index is disabled (IDS_UNKNOWN_INDEX=0)")
+        identities = get_unknown_index("service").summary()[::-1][:limit]
+        for identity in identities:
+            identity.pop("sightings")
+        return identities
+
+    def command_metrics(self, format="json"):
+        """
+        Returns detailed runtime statistics, or with format="prometheus"
+        the process's metrics in the Prometheus text format.
+        """
+        if format == "prometheus":
+            return REGISTRY.render()
+        with self.lock:
+            cameras = {name: runner.metrics() for name, runner in self.cameras.items() if runner.thread.is_alive()}
+        metrics = {
+            "process": {"cpu_seconds": time.process_time(), "peak_memory_mb": peak_memory_mb(),
+                        "threads": threading.active_count()},
+            "cameras": cameras,
+            "alerts": get_dispatcher().stats(),
+        }
+        if self.broadcaster is not None:
+            metrics["live_stream"] = self.broadcaster.stats()
+        return metrics
+
+    def command_profile(self, seconds=10):
+        """
+        Samples every thread's stack for a number of seconds, writes the
+        folded stacks to logs/profiles and returns the busiest functions.
+        """
+        profiler = profile_for(float(seconds))
+        return {"path": profiler.path, "samples": profiler.samples,
+                "top": [{"function": function, "share": share} for function, share in profiler.top()]}
+
+    def command_shutdown(self):
+        self.stop_event.set()
+        return {"stopping": True}
+
+    def model_status(self):
+        try:
+            model = self.store.get()
+        except Exception as e:
+            return {"loaded": False, "error": str(e)}
+        return {
+            "loaded": True,
+            "version": model.version,
+            "users": len(model.labels),
+            "source": model.source,
+            "load_seconds": model.load_seconds,
+            "loaded_at": model.loaded_at,
+            "reloads": self.store.reloads,
+        }
+
+    def training_status(self):
+        if self.training is None:
+            return {"running": False}
+        exit_code = self.training.poll()
+        return {
+            "running": exit_code is None,
+            "pid": self.training.pid,
+            "started_at": self.training_started,
+            "exit_code": exit_code,
+            "log": TRAINING_LOG_PATH,
+        }
+
+# Control server: one JSON request per line, one JSON reply per line
+class ControlHandler(socketserver.StreamRequestHandler):
+    service = None
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ServiceError("Requests must be JSON objects")
+                response = {"ok": True, "result": self.service.handle(request)}
+            except json.JSONDecodeError:
+                response = {"ok": False, "error": "Invalid JSON"}
+            except ServiceError as e:
+                response = {"ok": False, "error": str(e)}
+            except Exception as e:
+                traceback.print_exc()
+                response = {"ok": False, "error": f"Internal error: {type(e).__name__}: {e}"}
+            self.wfile.write((json.dumps(response) + "\n").encode())
+
+class ControlServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, service, host=SERVICE_HOST, port=SERVICE_PORT):
+        handler = type("BoundControlHandler", (ControlHandler,), {"service": service})
+        super().__init__((host, port), handler)
+
+# Run the service
+def serve(host=SERVICE_HOST, port=SERVICE_PORT, live_stream=detection.LIVE_STREAM, sources=()):
+    service = DetectionService(live_stream)
+    server = ControlServer(service, host, port)
+    service.open()
+    threading.Thread(target=server.serve_forever, name="control-server", daemon=True).start()
+    print(f"Detection service listening on {host}:{port}")
+    try:
+        for source in sources:
+            service.command_start(source)
+        # Short waits keep Ctrl+C responsive on Windows
+        while not service.stop_event.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.close()
+        print("Detection service stopped.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the detection service or send it a command.")
+    parser.add_argument("command", nargs="?", default="serve",
+                        choices=["serve", "ping", "start", "stop", "status", "metrics", "retrain",
+                                 "reload", "test-alert", "profile", "unknown", "shutdown"])
+    parser.add_argument("source", nargs="?", help="Camera index, URL or video file (start/stop)")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--stream", action="store_true", default=detection.LIVE_STREAM,
+                        help="Serve annotated frames as MJPEG (serve)")
+    parser.add_argument("--camera", action="append", default=[], help="Source to start with the service (serve)")
+    parser.add_argument("--full", action="store_true", help="Retrain from scratch (retrain)")
+    parser.add_argument("--channel", choices=CHANNELS, help="Only test this channel (test-alert)")
+    parser.add_argument("--seconds", type=float, default=10, help="Profiling duration (profile)")
+    parser.add_argument("--prometheus", action="store_true", help="Prometheus text format (metrics)")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.host, args.port, args.stream, args.camera)
+        sys.exit()
+
+    arguments = {}
+    if args.command == "start":
+        arguments["source"] = args.source if args.source is not None else 0
+    elif args.command == "stop" and args.source is not None:
+        arguments["source"] = args.source
+    elif args.command == "retrain":
+        arguments["full"] = args.full
+    elif args.command == "test-alert":
+        arguments["channel"] = args.channel
+    elif args.command == "profile":
+        arguments["seconds"] = args.seconds
+    elif args.command == "metrics" and args.prometheus:
+        arguments["format"] = "prometheus"
+    client = ServiceClient(args.host, args.port)
+    try:
+        result = client.call(args.command.replace("-", "_"), timeout=60 + args.seconds, **arguments)
+    except (OSError, ServiceError) as e:
+        sys.exit(f"Error: {e}")
+    print(result if isinstance(result, str) else json.dumps(result, indent=2))
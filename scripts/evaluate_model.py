@@ -0,0 +1,291 @@
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from dataset_cache import load_images
+from face_utils import peak_memory_mb, preprocessing_settings
+from model_store import THRESHOLD_PATH, load_calibration
+from recognition import SHORTLIST, BatchRecognizer
+from train_model import BASE_DIR, DATASET_PATH, assign_labels, load_from_cache, load_manifest, scan_dataset, write_json
+
+# Evaluation configuration
+EVALUATION_FOLDS = 5        # Cross-validation folds
+TARGET_FAR = 0.01           # Share of unknown faces accepted at the recommended threshold
+THRESHOLD_STEP = 0.5        # LBPH distance between swept thresholds
+FEATURE_CHUNK = 256         # Faces per histogram task
+PROBE_CHUNK = 512           # Held-out faces per scoring task
+EVALUATION_SEED = 0         # Fold assignment is random but repeatable
+REPORT_PATH = os.path.join(BASE_DIR, "model_evaluation.json")
+
+# LBPH parameters, the defaults of cv2.face.LBPHFaceRecognizer_create() used by train_model.py
+LBPH_PARAMS = {"radius": 1, "neighbors": 8, "grid_x": 8, "grid_y": 8}
+
+def assign_folds(users, user_count, folds, seed=EVALUATION_SEED):
+    """
+    Returns the test fold of every image and the fold in which every user
+    is left out of training. Each user's images are spread evenly over the
+    folds; in its own fold a user is not enrolled at all, and its images
+    are scored as an intruder's.
+    """
+    rng = np.random.default_rng(seed)
+    image_folds = np.empty(len(users), dtype=np.int32)
+    for user in range(user_count):
+        rows = np.flatnonzero(users == user)
+        image_folds[rows[rng.permutation(len(rows))]] = np.arange(len(rows)) % folds
+    user_folds = (rng.permutation(user_count) % folds).astype(np.int32)
+    return image_folds, user_folds
+
+def fold_rows(fold, users, image_folds, user_folds):
+    """
+    Returns the training rows, the held-out rows of enrolled users and the
+    rows of the users left out in a fold.
+    """
+    unknown = user_folds[users] == fold
+    held_out = image_folds == fold
+    return (np.flatnonzero(~unknown & ~held_out), np.flatnonzero(~unknown & held_out),
+            np.flatnonzero(unknown))
+
+# Worker processes. Histograms are shared through a memory-mapped file, not pickled.
+_worker = {}
+
+def _init_worker(histograms_path, users):
+    import cv2
+    cv2.setNumThreads(1)
+    _worker["histograms"] = np.load(histograms_path, mmap_mode="r+")
+    _worker["users"] = users
+    _worker["fold"] = None
+
+def _engine(shortlist=SHORTLIST):
+    return BatchRecognizer(np.empty((0, _worker["histograms"].shape[1]), dtype=np.float32), [],
+                           shortlist=shortlist, **LBPH_PARAMS)
+
+def _compute_histograms(start, faces):
+    _worker["histograms"][start:start + len(faces)] = _engine().features(faces)
+    _worker["histograms"].flush()
+    return len(faces)
+
+def _score(fold, train_rows, probe_rows, shortlist):
+    # Chunks of one fold mostly land on the same worker in a row, so its gallery is reused
+    if _worker["fold"] != fold:
+        _worker["engine"] = BatchRecognizer(_worker["histograms"][train_rows], _worker["users"][train_rows],
+                                            shortlist=shortlist, **LBPH_PARAMS)
+        _worker["fold"] = fold
+    results = _worker["engine"].match(np.asarray(_worker["histograms"][probe_rows]))
+    return (np.array([label for label, _ in results], dtype=np.int32),
+            np.array([distance for _, distance in results], dtype=np.float64))
+
+def cross_validate(faces, users, user_count, folds=EVALUATION_FOLDS, workers=None, shortlist=SHORTLIST,
+                   seed=EVALUATION_SEED):
+    """
+    Runs k-fold cross-validation on a process pool. The LBP histogram of
+    every face is computed once, in parallel, into a shared memory-mapped
+    file: training LBPH is nothing more than storing those histograms, so
+    a fold's model is the histograms of its training rows. Each fold then
+    classifies its held-out faces and its left-out users' faces in chunks
+    on the pool, with the engine detection uses.
+
+    An image is scored up to twice: held out while its user is enrolled
+    ("enrolled"), and in the fold its user is left out ("unknown"). Returns
+    the folds and, per role, the label and distance every image got (-1
+    and inf where it was not scored).
+    """
+    image_folds, user_folds = assign_folds(users, user_count, folds, seed)
+    bins = LBPH_PARAMS["grid_x"] * LBPH_PARAMS["grid_y"] * 2 ** LBPH_PARAMS["neighbors"]
+    results = {"folds": folds, "image_folds": image_folds, "user_folds": user_folds}
+    for role in ("enrolled", "unknown"):
+        results[role] = {"predicted": np.full(len(users), -1, dtype=np.int32),
+                         "distance": np.full(len(users), np.inf)}
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1:
+        # One BLAS thread per worker; the pool already uses every core
+        for name in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+            os.environ.setdefault(name, "1")
+    with tempfile.TemporaryDirectory(prefix="ids-evaluate-") as tmp_dir:
+        histograms_path = os.path.join(tmp_dir, "histograms.npy")
+        np.lib.format.open_memmap(histograms_path, mode="w+", dtype=np.float32, shape=(len(users), bins)).flush()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(histograms_path, users)) as executor:
+            chunks = [executor.submit(_compute_histograms, start, np.asarray(faces[start:start + FEATURE_CHUNK])
+                                      if isinstance(faces, np.ndarray) else faces[start:start + FEATURE_CHUNK])
+                      for start in range(0, len(users), FEATURE_CHUNK)]
+            for chunk in chunks:
+                chunk.result()
+
+            tasks = []
+            for fold in range(folds):
+                train_rows, held_out, unknown = fold_rows(fold, users, image_folds, user_folds)
+                if not len(train_rows):
+                    continue
+                for role, probe_rows in (("enrolled", held_out), ("unknown", unknown)):
+                    for start in range(0, len(probe_rows), PROBE_CHUNK):
+                        rows = probe_rows[start:start + PROBE_CHUNK]
+                        tasks.append((role, rows, executor.submit(_score, fold, train_rows, rows, shortlist)))
+            for role, rows, task in tasks:
+                results[role]["predicted"][rows], results[role]["distance"][rows] = task.result()
+    return results
+
+def accepted_below(distances, thresholds):
+    """
+    Returns how many distances are below each threshold.
+    """
+    return np.searchsorted(np.sort(distances), thresholds, side="left")
+
+def error_curves(users, user_count, results, step=THRESHOLD_STEP):
+    """
+    Sweeps the recognition threshold over the cross-validation scores.
+    A face is accepted as the user it was matched to when its distance is
+    below the threshold. The false reject rate is the share of enrolled
+    users' faces not accepted as themselves; the false accept rate is the
+    share of left-out users' faces accepted as anyone, i.e. intruders let
+    through. Per user, the false accept rate is the share of other
+    people's faces accepted as that user, counted over the folds in which
+    the user was enrolled.
+    """
+    enrolled, unknown = results["enrolled"], results["unknown"]
+    genuine = enrolled["predicted"] >= 0
+    intruder = unknown["predicted"] >= 0
+    if not intruder.any():
+        raise ValueError("Cross-validation needs faces of at least two users to measure false accepts.")
+    distances = np.concatenate([enrolled["distance"][genuine], unknown["distance"][intruder]])
+    finite = distances[np.isfinite(distances)]
+    thresholds = np.arange(0, (finite.max() if len(finite) else 0) + 2 * step, step)
+
+    correct = genuine & (enrolled["predicted"] == users)
+    frr = 1 - accepted_below(enrolled["distance"][correct], thresholds) / max(genuine.sum(), 1)
+    far = accepted_below(unknown["distance"][intruder], thresholds) / intruder.sum()
+
+    # Faces scored in each fold, for the per-user false accept denominators
+    image_folds, user_folds = results["image_folds"], results["user_folds"]
+    probe_folds = np.concatenate([image_folds[genuine], user_folds[users[intruder]]])
+    probe_users = np.concatenate([users[genuine], users[intruder]])
+    probe_labels = np.concatenate([enrolled["predicted"][genuine], unknown["predicted"][intruder]])
+    fold_count = results["folds"]
+    per_fold = np.bincount(probe_folds, minlength=fold_count)
+    per_user = {}
+    for user in range(user_count):
+        own = genuine & (users == user)
+        own_per_fold = np.bincount(probe_folds[probe_users == user], minlength=fold_count)
+        others = (per_fold - own_per_fold)[np.arange(fold_count) != user_folds[user]].sum()
+        as_user = (probe_labels == user) & (probe_users != user)
+        per_user[user] = {
+            "images": int((users == user).sum()),
+            "probes": int(own.sum()),
+            "frr": 1 - accepted_below(enrolled["distance"][own & correct], thresholds) / max(own.sum(), 1),
+            "far": accepted_below(distances[as_user], thresholds) / max(others, 1),
+        }
+    return thresholds, far, frr, per_user, {"enrolled": int(genuine.sum()), "unknown": int(intruder.sum())}
+
+def recommend_threshold(thresholds, far, frr, target_far=TARGET_FAR):
+    """
+    Returns the index of the highest threshold whose false accept rate is
+    within the target, which gives the fewest false rejects an intruder
+    budget allows, and the index of the equal error rate.
+    """
+    recommended = int(np.searchsorted(far, target_far, side="right")) - 1
+    equal = int(np.argmin(np.abs(far - frr)))
+    return max(recommended, 0), equal
+
+def evaluate(folds=EVALUATION_FOLDS, target_far=TARGET_FAR, workers=None, shortlist=SHORTLIST,
+             use_cache=True, save=True, seed=EVALUATION_SEED):
+    """
+    Cross-validates recognition on the enrollment dataset, writes the
+    false accept/false reject curves to REPORT_PATH and, with save, the
+    recommended threshold to THRESHOLD_PATH, next to the model, where
+    detection picks it up.
+    """
+    if not os.path.exists(DATASET_PATH):
+        raise FileNotFoundError(f"Dataset folder not found at {DATASET_PATH}.")
+    start = time.perf_counter()
+    entries = scan_dataset(DATASET_PATH, load_manifest())
+    names = sorted({entry["user"] for entry in entries.values()})
+    if len(names) < 2:
+        raise ValueError("Evaluation needs at least two enrolled users.")
+    labels = assign_labels(names, {})
+    if use_cache and preprocessing_settings()["face_size"]:
+        faces, users, _ = load_from_cache(DATASET_PATH, list(entries), labels, entries, workers)
+    else:
+        faces, users, _ = load_images(DATASET_PATH, list(entries), labels, entries, workers)
+    for name in names:
+        count = int((users == labels[name]).sum())
+        if count < folds:
+            print(f"Warning: {name} has only {count} image(s) for {folds} folds.")
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = cross_validate(faces, users, len(names), folds, workers, shortlist, seed)
+    cv_seconds = time.perf_counter() - start
+    thresholds, far, frr, per_user, probes = error_curves(users, len(names), results)
+    recommended, equal = recommend_threshold(thresholds, far, frr, target_far)
+    if probes["unknown"] * target_far < 1:
+        print(f"Warning: only {probes['unknown']} unknown faces were scored, too few to measure a false "
+              f"accept rate of {target_far:.2%}; the threshold is only as strict as the faces allow.")
+
+    calibration = {
+        "threshold": float(thresholds[recommended]),
+        "target_far": target_far,
+        "far": float(far[recommended]),
+        "frr": float(frr[recommended]),
+        "eer": float((far[equal] + frr[equal]) / 2),
+        "eer_threshold": float(thresholds[equal]),
+        "folds": folds,
+        "images": len(users),
+        "users": len(names),
+        "preprocessing": preprocessing_settings(),
+        "evaluated_at": time.time(),
+    }
+    report = {
+        **calibration,
+        "probes": probes,
+        "seconds": {"load": load_seconds, "cross_validation": cv_seconds},
+        "thresholds": thresholds.round(3).tolist(),
+        "far": far.round(5).tolist(),
+        "frr": frr.round(5).tolist(),
+        "per_user": {name: {"images": per_user[labels[name]]["images"],
+                            "probes": per_user[labels[name]]["probes"],
+                            "far": per_user[labels[name]]["far"].round(5).tolist(),
+                            "frr": per_user[labels[name]]["frr"].round(5).tolist()}
+                     for name in names},
+    }
+    previous = load_calibration()
+    write_json(REPORT_PATH, report)
+    if save:
+        write_json(THRESHOLD_PATH, calibration)
+
+    print(f"{len(users)} images of {len(names)} users, {folds} folds: {probes['enrolled']} enrolled and "
+          f"{probes['unknown']} unknown faces scored in {cv_seconds:.1f}s (load {load_seconds:.1f}s).")
+    print(f"{'user':<20} {'images':>6} {'FRR':>7} {'FAR':>7}")
+    for name in names:
+        user = per_user[labels[name]]
+        print(f"{name:<20} {user['images']:>6} {user['frr'][recommended]:>7.2%} {user['far'][recommended]:>7.2%}")
+    print(f"Equal error rate {calibration['eer']:.2%} at threshold {calibration['eer_threshold']:g}.")
+    if previous:
+        index = min(int(np.searchsorted(thresholds, previous["threshold"])), len(thresholds) - 1)
+        print(f"Previous threshold {previous['threshold']:g}: false accepts {far[index]:.2%}, "
+              f"false rejects {frr[index]:.2%}.")
+    print(f"Recommended threshold {calibration['threshold']:g}: false accepts {calibration['far']:.2%} "
+          f"(target {target_far:.2%}), false rejects {calibration['frr']:.2%}.")
+    print(f"Curves written to {REPORT_PATH}."
+          + (f" Threshold written to {THRESHOLD_PATH}." if save else " Threshold not saved."))
+    peak = peak_memory_mb()
+    if peak is not None:
+        print(f"Peak memory: {peak:.0f} MB")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cross-validate the face model and calibrate its recognition threshold.")
+    parser.add_argument("--folds", type=int, default=EVALUATION_FOLDS, help="Cross-validation folds")
+    parser.add_argument("--target-far", type=float, default=TARGET_FAR,
+                        help="False accept rate allowed at the recommended threshold")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--shortlist", type=int, default=SHORTLIST, help="Candidates re-ranked exactly, 0 for all")
+    parser.add_argument("--no-cache", action="store_true", help="Decode images directly instead of using the dataset cache")
+    parser.add_argument("--dry-run", action="store_true", help="Report without saving the threshold")
+    parser.add_argument("--seed", type=int, default=EVALUATION_SEED, help="Seed of the fold assignment")
+    args = parser.parse_args()
+    if args.folds < 2:
+        parser.error("--folds must be at least 2")
+    evaluate(args.folds, args.target_far, args.workers, args.shortlist, not args.no_cache, not args.dry_run, args.seed)
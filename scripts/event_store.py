@@ -0,0 +1,170 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+
+# Base directories
+BASE_DIR = os.path.join(os.path.expanduser("~/Desktop"), "IDS")
+LOG_DIR = os.path.join(BASE_DIR, "logs")
+EVENTS_DB_PATH = os.path.join(LOG_DIR, "events.db")
+INTRUDER_IMAGES_DIR = os.path.join(LOG_DIR, "intruder_images")
+SCREEN_RECORDINGS_DIR = os.path.join(LOG_DIR, "screen_recordings")
+
+PAGE_SIZE = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    camera TEXT,
+    track_id TEXT,
+    label TEXT,
+    confidence REAL,
+    path TEXT NOT NULL UNIQUE,
+    identity TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_kind_ts ON events (kind, ts, id);
+"""
+
+# Columns added after the first release, created on stores that lack them
+MIGRATIONS = (
+    ("identity", "ALTER TABLE events ADD COLUMN identity TEXT"),
+)
+INDEXES = "CREATE INDEX IF NOT EXISTS idx_events_identity_ts ON events (identity, ts, id);"
+
+COLUMNS = ("id", "ts", "kind", "camera", "track_id", "label", "confidence", "path", "identity")
+
+class EventStore:
+    """
+    Append-only index of detection events (intruder images, recordings) in
+    SQLite with write-ahead logging, so the detector can write while the
+    log server reads. Listing uses keyset pagination on (ts, id), which
+    costs the same on the first page as on the millionth event.
+    """
+    def __init__(self, path=EVENTS_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(events)")}
+        with conn:
+            for column, statement in MIGRATIONS:
+                if column not in existing:
+                    conn.execute(statement)
+        conn.executescript(INDEXES)
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add_event(self, kind, path, camera=None, track_id=None, label=None, confidence=None, ts=None,
+                  identity=None):
+        """
+        Records an event and returns its ID. Re-adding a path is ignored.
+        identity is the unknown face identity the event belongs to, if any.
+        """
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO events (ts, kind, camera, track_id, label, confidence, path, identity) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (ts if ts is not None else time.time(), kind,
+                 None if camera is None else str(camera),
+                 None if track_id is None else str(track_id),
+                 label, confidence, path, identity),
+            )
+        return cursor.lastrowid if cursor.rowcount else None
+
+    def query(self, kind, start=None, end=None, before=None, after=None, limit=PAGE_SIZE, identity=None):
+        """
+        Returns up to `limit` events of a kind, newest first. `start` and
+        `end` bound the timestamp; `before` / `after` are (ts, id) cursors
+        from a previous page for the older / newer page. `identity` keeps
+        only the events of one unknown face identity.
+        """
+        clauses, params = ["kind = ?"], [kind]
+        if identity is not None:
+            clauses.append("identity = ?")
+            params.append(identity)
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("ts < ?")
+            params.append(end)
+        if before is not None:
+            clauses.append("(ts, id) < (?, ?)")
+            params += list(before)
+        if after is not None:
+            clauses.append("(ts, id) > (?, ?)")
+            params += list(after)
+        order = "ASC" if after is not None and before is None else "DESC"
+        sql = (f"SELECT {', '.join(COLUMNS)} FROM events WHERE {' AND '.join(clauses)} "
+               f"ORDER BY ts {order}, id {order} LIMIT ?")
+        rows = self._connection().execute(sql, params + [limit]).fetchall()
+        events = [dict(zip(COLUMNS, row)) for row in rows]
+        if order == "ASC":
+            events.reverse()
+        return events
+
+    def get_event(self, event_id):
+        row = self._connection().execute(
+            f"SELECT {', '.join(COLUMNS)} FROM events WHERE id = ?", (event_id,)).fetchone()
+        return dict(zip(COLUMNS, row)) if row else None
+
+    def import_directory(self, kind, directory):
+        """
+        Backfills events for files written before the store existed, using
+        each file's modification time. Returns the number of new events.
+        """
+        added = 0
+        for filename in sorted(os.listdir(directory)):
+            path = os.path.join(directory, filename)
+            if os.path.isfile(path) and self.add_event(kind, path, ts=os.path.getmtime(path)):
+                added += 1
+        return added
+
+    def import_existing(self):
+        """
+        Backfills the intruder images and recordings already on disk.
+        Returns {kind: number of new events}.
+        """
+        return {kind: self.import_directory(kind, directory)
+                for kind, directory in (("image", INTRUDER_IMAGES_DIR), ("recording", SCREEN_RECORDINGS_DIR))
+                if os.path.isdir(directory)}
+
+    def is_empty(self):
+        return self._connection().execute("SELECT 1 FROM events LIMIT 1").fetchone() is None
+
+# Process-wide store
+_store = None
+_store_lock = threading.Lock()
+
+def get_event_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = EventStore()
+        return _store
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the intruder event store.")
+    parser.add_argument("--import-existing", action="store_true",
+                        help="Index intruder images and recordings already on disk")
+    args = parser.parse_args()
+
+    store = get_event_store()
+    if args.import_existing:
+        for kind, added in store.import_existing().items():
+            print(f"Imported {added} {kind} event(s)")
+    latest = store.query("image", limit=1)
+    print(f"Event store: {store.path}. Latest image event: {latest[0] if latest else 'none'}")
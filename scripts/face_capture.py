@@ -1,7 +1,77 @@
+import argparse
+import collections
+import queue
+import threading
+import time
 import cv2
 import os
-
-def capture_faces():
+from capture_source import create_source
+from face_detector import create_detector, record_capture_settings
+
+# Capture quality configuration
+MIN_FACE_SIZE = 80          # Smallest face crop kept, in pixels
+BLUR_THRESHOLD = 60.0       # Minimum variance of the Laplacian; lower means blurry
+DUPLICATE_DISTANCE = 6      # Max differing bits of the 64-bit dHash for a near-duplicate
+RECENT_HASHES = 10          # Saved crops each new crop is compared against
+MIN_SAVE_INTERVAL = 0.1     # Seconds between saved crops
+TARGET_SAMPLES = 100        # Capture stops once this many diverse crops are saved
+
+# Function to measure sharpness
+def sharpness(face):
+    """
+    Returns the variance of the Laplacian; blurry crops score low.
+    """
+    return cv2.Laplacian(face, cv2.CV_64F).var()
+
+# Function to compute a perceptual hash
+def dhash(face):
+    """
+    Returns a 64-bit difference hash of a grayscale crop.
+    """
+    small = cv2.resize(face, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+# Background disk writer
+class ImageWriter(threading.Thread):
+    """
+    Writes crops to disk off the capture loop so the preview stays smooth.
+    """
+    def __init__(self):
+        super().__init__(name="capture-writer", daemon=True)
+        self.jobs = queue.Queue()
+        self.written = 0
+
+    def save(self, path, image):
+        self.jobs.put((path, image))
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            path, image = job
+            if cv2.imwrite(path, image):
+                self.written += 1
+            else:
+                print(f"Error: Unable to write {path}")
+
+    def close(self):
+        self.jobs.put(None)
+        self.join()
+
+def next_index(user_folder):
+    """
+    Returns the first free image number, so re-enrolling a user adds to
+    their dataset instead of overwriting it.
+    """
+    numbers = [int(name.split(".")[0]) for name in os.listdir(user_folder) if name.split(".")[0].isdigit()]
+    return max(numbers, default=-1) + 1
+
+def capture_faces(user_name=None, source=0, headless=False, target=TARGET_SAMPLES):
     # Set base directory for datasets
     base_dir = os.path.join(os.path.expanduser("~/Desktop"), "IDS")
     dataset_path = os.path.join(base_dir, "datasets")
@@ -9,46 +79,81 @@ def capture_faces():
     # Create dataset directory if it doesn't exist
     os.makedirs(dataset_path, exist_ok=True)
 
-    user_name = input("Enter the name of the new authorized user: ").strip()
+    if not user_name:
+        user_name = input("Enter the name of the new authorized user: ").strip()
     user_folder = os.path.join(dataset_path, user_name)
 
     # Create user folder if it doesn't exist
     os.makedirs(user_folder, exist_ok=True)
 
-    # Initialize webcam and face detector
-    camera = cv2.VideoCapture(0)
-    face_cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-
-    if not os.path.exists(face_cascade_path):
-        print(f"Error: Haarcascade file not found at {face_cascade_path}")
+    # Initialize webcam (or video file) and the face detector used by detection
+    camera = create_source(source)
+    try:
+        detector = create_detector()
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}")
         return
 
-    face_cascade = cv2.CascadeClassifier(face_cascade_path)
-
-    if not camera.isOpened():
+    if not camera.open():
         print("Error: Unable to access the camera.")
         return
 
-    print(f"Capturing face images for {user_name}. Press 'q' to quit.")
+    print(f"Capturing up to {target} face images for {user_name}. Press 'q' to quit.")
+    writer = ImageWriter()
+    writer.start()
+    index = next_index(user_folder)
     count = 0
-
-    while True:
-        ret, frame = camera.read()
-        if not ret:
-            print("Error: Unable to capture frame from the camera.")
-            break
+    rejected = collections.Counter()
+    recent_hashes = collections.deque(maxlen=RECENT_HASHES)
+    last_save = 0.0
+
+    while count < target:
+        captured = camera.read()
+        if captured is None:
+            if camera.ended:
+                break
+            # The camera dropped out; wait for it to be reopened
+            time.sleep(max(camera.retry_in(), 0.01))
+            continue
+        frame, _ = captured
 
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+        faces = detector.detect(gray)
 
-        for (x, y, w, h) in faces:
+        # Enrol only the most prominent face in the frame
+        if len(faces):
+            x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
             face = gray[y:y+h, x:x+w]
-            file_name = os.path.join(user_folder, f"{count}.jpg")
-            cv2.imwrite(file_name, face)
-            count += 1
-            print(f"Captured face {count}: {file_name}")
-            cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
-
+            now = time.time()
+            if w < MIN_FACE_SIZE or h < MIN_FACE_SIZE:
+                rejected["too small"] += 1
+                color = (0, 0, 255)
+            elif sharpness(face) < BLUR_THRESHOLD:
+                rejected["blurry"] += 1
+                color = (0, 0, 255)
+            elif now - last_save < MIN_SAVE_INTERVAL:
+                rejected["rate limit"] += 1
+                color = (0, 255, 255)
+            else:
+                face_hash = dhash(face)
+                if any(hamming(face_hash, previous) <= DUPLICATE_DISTANCE for previous in recent_hashes):
+                    rejected["duplicate"] += 1
+                    color = (0, 255, 255)
+                else:
+                    file_name = os.path.join(user_folder, f"{index}.jpg")
+                    writer.save(file_name, face.copy())
+                    recent_hashes.append(face_hash)
+                    last_save = now
+                    index += 1
+                    count += 1
+                    color = (255, 0, 0)
+                    print(f"Captured face {count}/{target}: {file_name}")
+            cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+
+        if headless:
+            continue
+
+        cv2.putText(frame, f"{count}/{target}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 0, 0), 2)
         cv2.imshow("Face Capture", frame)
 
         if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -57,9 +162,22 @@ def capture_faces():
                 break
 
     camera.release()
-    cv2.destroyAllWindows()
+    writer.close()
+    if count:
+        record_capture_settings(dataset_path, user_name)
+    if not headless:
+        cv2.destroyAllWindows()
     print(f"Face capture complete. Total images: {count}")
+    if rejected:
+        print("Rejected crops: " + ", ".join(f"{reason} {n}" for reason, n in rejected.items()))
     print(f"Images saved in: {user_folder}")
+    return count
 
 if __name__ == "__main__":
-    capture_faces()
+    parser = argparse.ArgumentParser(description="Capture face images for a new authorized user.")
+    parser.add_argument("--user", help="User name (prompted for if omitted)")
+    parser.add_argument("--source", default="0", help="Camera index or video file")
+    parser.add_argument("--headless", action="store_true", help="Run without a preview window")
+    parser.add_argument("--target", type=int, default=TARGET_SAMPLES, help="Number of diverse samples to collect")
+    args = parser.parse_args()
+    capture_faces(args.user, args.source, args.headless, args.target)
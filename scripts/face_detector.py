@@ -0,0 +1,184 @@
+import json
+import os
+import cv2
+
+# Base directories
+BASE_DIR = os.path.join(os.path.expanduser("~/Desktop"), "IDS")
+
+# Detector configuration, shared by capture, training and detection so crops match
+DETECTOR_BACKEND = os.getenv("IDS_DETECTOR", "haar")              # haar, lbp or yunet
+DETECTOR_PROFILE = os.getenv("IDS_DETECTOR_PROFILE", "default")   # See PROFILES
+DETECT_SCALE = os.getenv("IDS_DETECT_SCALE", "")                  # Overrides the profile's downscale factor
+HAAR_CASCADE_PATH = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+LBP_CASCADE_PATH = os.getenv("IDS_LBP_CASCADE", os.path.join(BASE_DIR, "lbpcascade_frontalface_improved.xml"))
+YUNET_MODEL_PATH = os.getenv("IDS_YUNET_MODEL", os.path.join(BASE_DIR, "face_detection_yunet_2023mar.onnx"))
+
+# Detection profiles. min_size is in full-resolution pixels; scale is the
+# factor frames are shrunk by before detection.
+PROFILES = {
+    # The original settings: full resolution, no minimum size
+    "default": {"scale_factor": 1.3, "min_neighbors": 5, "min_size": 0, "scale": 1.0, "score": 0.8},
+    # Finer pyramid for small or distant faces
+    "accurate": {"scale_factor": 1.1, "min_neighbors": 5, "min_size": 40, "scale": 1.0, "score": 0.7},
+    # Half resolution, ignores faces too small to recognize anyway
+    "balanced": {"scale_factor": 1.2, "min_neighbors": 5, "min_size": 60, "scale": 0.5, "score": 0.8},
+    # Fewer pyramid levels; misses some frames, which the tracker bridges
+    "fast": {"scale_factor": 1.25, "min_neighbors": 4, "min_size": 60, "scale": 0.4, "score": 0.85},
+}
+
+class FaceDetector:
+    """
+    Common interface of the detector backends. detect() optionally crops
+    to a region, shrinks the image by `scale`, runs the backend and maps
+    the boxes back to full-frame coordinates.
+    """
+    name = "base"
+
+    def __init__(self, scale=1.0, min_size=0):
+        self.scale = scale
+        self.min_size = min_size
+
+    def detect(self, gray, region=None):
+        """
+        Returns (x, y, w, h) face boxes in full-frame coordinates for a
+        grayscale frame, searching only inside region if given.
+        """
+        rx, ry = 0, 0
+        image = gray
+        if region is not None:
+            rx, ry, rw, rh = region
+            image = gray[ry:ry+rh, rx:rx+rw]
+        if image.size == 0:
+            return []
+
+        scale = self.scale
+        if scale != 1.0:
+            height, width = image.shape[:2]
+            size = (max(int(width * scale), 1), max(int(height * scale), 1))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        min_size = int(self.min_size * scale)
+
+        full_h, full_w = gray.shape[:2]
+        boxes = []
+        for x, y, w, h in self._detect(image, min_size):
+            x0 = min(max(int(round(x / scale)) + rx, 0), full_w)
+            y0 = min(max(int(round(y / scale)) + ry, 0), full_h)
+            x1 = min(int(round((x + w) / scale)) + rx, full_w)
+            y1 = min(int(round((y + h) / scale)) + ry, full_h)
+            if x1 > x0 and y1 > y0:
+                boxes.append((x0, y0, x1 - x0, y1 - y0))
+        return boxes
+
+    def _detect(self, image, min_size):
+        raise NotImplementedError
+
+    def settings(self):
+        return {"backend": self.name, "scale": self.scale, "min_size": self.min_size}
+
+class CascadeDetector(FaceDetector):
+    """
+    OpenCV cascade classifier, Haar or LBP features.
+    """
+    def __init__(self, path, name, scale_factor=1.3, min_neighbors=5, **kwargs):
+        super().__init__(**kwargs)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Cascade file not found: {path}")
+        self.cascade = cv2.CascadeClassifier(path)
+        if self.cascade.empty():
+            raise ValueError(f"Unable to load cascade: {path}")
+        self.name = name
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+
+    def _detect(self, image, min_size):
+        size = (min_size, min_size) if min_size else None
+        if size:
+            return self.cascade.detectMultiScale(image, self.scale_factor, self.min_neighbors, minSize=size)
+        return self.cascade.detectMultiScale(image, self.scale_factor, self.min_neighbors)
+
+    def settings(self):
+        settings = super().settings()
+        settings.update({"scale_factor": self.scale_factor, "min_neighbors": self.min_neighbors})
+        return settings
+
+class YuNetDetector(FaceDetector):
+    """
+    OpenCV's DNN face detector (YuNet), loaded from a local ONNX file.
+    """
+    name = "yunet"
+
+    def __init__(self, path=YUNET_MODEL_PATH, score=0.8, nms=0.3, **kwargs):
+        super().__init__(**kwargs)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"YuNet model not found: {path}. Download face_detection_yunet_2023mar.onnx "
+                                    f"from the OpenCV model zoo or set IDS_YUNET_MODEL.")
+        self.score = score
+        self.net = cv2.FaceDetectorYN_create(path, "", (320, 320), score, nms, 5000)
+        self.input_size = None
+
+    def _detect(self, image, min_size):
+        height, width = image.shape[:2]
+        if self.input_size != (width, height):
+            self.net.setInputSize((width, height))
+            self.input_size = (width, height)
+        # The network expects three channels
+        _, faces = self.net.detect(cv2.cvtColor(image, cv2.COLOR_GRAY2BGR))
+        if faces is None:
+            return []
+        return [tuple(face[:4]) for face in faces if face[2] >= min_size and face[3] >= min_size]
+
+    def settings(self):
+        settings = super().settings()
+        settings["score"] = self.score
+        return settings
+
+def create_detector(backend=DETECTOR_BACKEND, profile=DETECTOR_PROFILE, scale=None):
+    """
+    Builds the configured detector backend with a profile's parameters.
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown detector profile '{profile}'. Choose from: {', '.join(PROFILES)}")
+    params = PROFILES[profile]
+    if scale is None:
+        scale = float(DETECT_SCALE) if DETECT_SCALE else params["scale"]
+    common = {"scale": scale, "min_size": params["min_size"]}
+
+    if backend == "haar":
+        return CascadeDetector(HAAR_CASCADE_PATH, "haar", params["scale_factor"], params["min_neighbors"], **common)
+    if backend == "lbp":
+        return CascadeDetector(LBP_CASCADE_PATH, "lbp", params["scale_factor"], params["min_neighbors"], **common)
+    if backend == "yunet":
+        return YuNetDetector(YUNET_MODEL_PATH, params["score"], **common)
+    raise ValueError(f"Unknown detector backend '{backend}'. Choose from: haar, lbp, yunet")
+
+def detector_settings():
+    """
+    Returns the configured backend and profile. They are recorded with
+    enrolled images and the trained model so detection can tell whether
+    it crops faces the same way.
+    """
+    return {"backend": DETECTOR_BACKEND, "profile": DETECTOR_PROFILE}
+
+# Record of the detector each user was enrolled with, kept next to the user folders
+CAPTURE_SETTINGS_FILE = "capture_settings.json"
+
+def load_capture_settings(dataset_path):
+    """
+    Returns {user name: detector settings} for enrolled users.
+    """
+    path = os.path.join(dataset_path, CAPTURE_SETTINGS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as file:
+        return json.load(file)
+
+def record_capture_settings(dataset_path, user_name):
+    """
+    Notes that a user's images were cropped with the configured detector.
+    """
+    settings = load_capture_settings(dataset_path)
+    settings[user_name] = detector_settings()
+    path = os.path.join(dataset_path, CAPTURE_SETTINGS_FILE)
+    with open(path + ".tmp", "w") as file:
+        json.dump(settings, file, indent=2)
+    os.replace(path + ".tmp", path)
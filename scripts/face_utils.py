@@ -0,0 +1,43 @@
+import os
+import sys
+import cv2
+
+# Face normalization shared by training and detection, so both see the same crops
+FACE_SIZE = int(os.getenv("IDS_FACE_SIZE", "100"))       # Square face size in pixels, 0 to keep crop size
+EQUALIZE_HIST = os.getenv("IDS_EQUALIZE_HIST", "0") == "1"
+
+def preprocessing_settings():
+    """
+    Returns the normalization settings, recorded with a trained model.
+    """
+    return {"face_size": FACE_SIZE, "equalize_hist": EQUALIZE_HIST}
+
+def normalize_face(face, size=FACE_SIZE, equalize=EQUALIZE_HIST):
+    """
+    Resizes a grayscale face crop to a fixed square size and optionally
+    equalizes its histogram.
+    """
+    if size and face.shape[:2] != (size, size):
+        interpolation = cv2.INTER_AREA if face.shape[0] > size else cv2.INTER_LINEAR
+        face = cv2.resize(face, (size, size), interpolation=interpolation)
+    if equalize:
+        face = cv2.equalizeHist(face)
+    return face
+
+def peak_memory_mb():
+    """
+    Returns the peak resident memory of this process in MB, or None if the
+    platform does not report it.
+    """
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
@@ -1,194 +1,573 @@
+import argparse
 import cv2
 import os
 import datetime
+import logging
 import time
-import smtplib
-import json
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
-from twilio.rest import Client
+import re
+import threading
+from alerts import get_dispatcher, shutdown_dispatcher
+from capture_source import CAMERA_SOURCE, create_source
+from clip_recorder import CLIP_RECORDING, ClipRecorder
+from event_store import get_event_store
+from face_detector import create_detector, detector_settings
+from face_utils import normalize_face
+from load_controller import LOAD_CONTROL, LoadController
+from metrics import FRAMES, INTRUDER_ALERTS, RECOGNITION_DISTANCE, RECOGNITIONS, STAGE_SECONDS, MetricsWriter, stage_timer
+from model_store import get_model_store
+from motion import MOTION_GATE, MotionGate, union_box
+from pipeline import FramePipeline
+from profiler import PROFILER, SamplingProfiler
+from stream import FrameBroadcaster, StreamServer
+from structured_log import log_event
+from tracker import FaceTracker
+from unknown_index import (MATCH_SECONDS, UNKNOWN_ALERT_COOLDOWN, UNKNOWN_IDENTITIES_METRIC, UNKNOWN_INDEX,
+                           UNKNOWN_SIGHTINGS_METRIC, face_descriptors, get_unknown_index, identity_label,
+                           shutdown_unknown_index)
 
 # Base directories
 BASE_DIR = os.path.join(os.path.expanduser("~/Desktop"), "IDS")
-MODEL_PATH = os.path.join(BASE_DIR, "face_model.yml")
-LABEL_MAPPING_PATH = os.path.join(BASE_DIR, "label_mapping.json")
 LOG_DIR = os.path.join(BASE_DIR, "logs")
 INTRUDER_IMAGES_DIR = os.path.join(LOG_DIR, "intruder_images")
 os.makedirs(INTRUDER_IMAGES_DIR, exist_ok=True)
 
-# Load the model and label mapping
-if not os.path.exists(MODEL_PATH):
-    raise FileNotFoundError(f"Model file not found: {MODEL_PATH}")
-if not os.path.exists(LABEL_MAPPING_PATH):
-    raise FileNotFoundError(f"Label mapping file not found: {LABEL_MAPPING_PATH}")
+# The model and detector are loaded on first use, not at import
+face_detector = None
+checked_model_version = None
 
-recognizer = cv2.face.LBPHFaceRecognizer_create()
-recognizer.read(MODEL_PATH)
-
-with open(LABEL_MAPPING_PATH, "r") as file:
-    label_dict = json.load(file)
+def get_face_detector():
+    """
+    Returns the configured face detector (IDS_DETECTOR / IDS_DETECTOR_PROFILE),
+    creating it on first use.
+    """
+    global face_detector
+    if face_detector is None:
+        face_detector = create_detector()
+    return face_detector
 
-# Haarcascade for face detection
-HAARCASCADE_PATH = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-if not os.path.exists(HAARCASCADE_PATH):
-    raise FileNotFoundError(f"Haarcascade file not found: {HAARCASCADE_PATH}")
-face_cascade = cv2.CascadeClassifier(HAARCASCADE_PATH)
+def get_model():
+    """
+    Returns the current recognition model from the model store, loading it
+    on first use. Each newly loaded version is checked against the
+    detector it was trained with.
+    """
+    global checked_model_version
+    model = get_model_store().get()
+    if model.version != checked_model_version:
+        checked_model_version = model.version
+        # Crops only match the trained faces if enrollment used the same detector
+        if model.detector and model.detector != detector_settings():
+            print(f"Warning: the model was trained with detector {model.detector} but detection "
+                  f"uses {detector_settings()}. Face crops may not match.")
+        threshold = recognition_threshold(model)
+        if THRESHOLD_OVERRIDE:
+            print(f"Recognition threshold {threshold:g} (IDS_RECOGNITION_THRESHOLD).")
+        elif model.calibration:
+            print(f"Recognition threshold {threshold:g} (calibrated for a false accept rate of "
+                  f"{model.calibration['target_far']:.2%}, false reject rate {model.calibration['frr']:.2%}).")
+        else:
+            print(f"Recognition threshold {threshold:g} (default; run evaluate_model.py to calibrate it).")
+    return model
 
-# Email Configuration
-EMAIL_SENDER = os.getenv("EMAIL_SENDER", "")  # Replace for testing
-EMAIL_RECEIVER = os.getenv("EMAIL_RECEIVER", "")  # Replace for testing
-EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD", "")  # Replace for testing
+# Recognition configuration
+RECOGNITION_THRESHOLD = 50  # LBPH distance below which a face is recognized, until the model is evaluated
+THRESHOLD_OVERRIDE = os.getenv("IDS_RECOGNITION_THRESHOLD")  # Fixed threshold instead of the calibrated one
 
-# Twilio WhatsApp Configuration
-ACCOUNT_SID = ""  # Replace with your Twilio Account SID
-AUTH_TOKEN = ""    # Replace with your Twilio Auth Token
-TWILIO_WHATSAPP_NUMBER = "whatsapp:+14155238886"  # Twilio's Sandbox Number
-RECIPIENT_WHATSAPP_NUMBER = "whatsapp:+91"  # Replace with your number
+def recognition_threshold(model):
+    """
+    Returns the threshold to use with a model: IDS_RECOGNITION_THRESHOLD if
+    set, otherwise the threshold evaluate_model.py calibrated, otherwise
+    RECOGNITION_THRESHOLD.
+    """
+    if THRESHOLD_OVERRIDE:
+        return float(THRESHOLD_OVERRIDE)
+    if model.threshold is not None:
+        return model.threshold
+    return RECOGNITION_THRESHOLD
 
 # Cooldown configuration
-last_alert_time = {}  # Tracks cooldown per face ID
-ALERT_COOLDOWN = 30  # Cooldown period in seconds
+alert_expiry = {}  # Alert key -> time its cooldown ends
+alert_lock = threading.Lock()  # Camera threads of the detection service share the cooldowns
+ALERT_COOLDOWN = 30  # Cooldown period in seconds for faces not yet matched to an unknown identity
 
-# Function to send WhatsApp messages
-def send_whatsapp_message(image_path, message_body):
-    """
-    Sends a WhatsApp message with an optional image attachment.
-    """
-    client = Client(ACCOUNT_SID, AUTH_TOKEN)
-    image_host_url = "https://your_public_hosting_url.com/" + os.path.basename(image_path)  # Public image URL
-    try:
-        message = client.messages.create(
-            body=message_body,
-            from_=TWILIO_WHATSAPP_NUMBER,
-            to=RECIPIENT_WHATSAPP_NUMBER,
-            media_url=[image_host_url]
-        )
-        print(f"WhatsApp message sent: {message.sid}")
-    except Exception as e:
-        print(f"Failed to send WhatsApp message: {e}")
-
-# Function to send email
-def send_email(subject, body, attachment_path=None):
-    """
-    Sends an email with optional attachment.
-    """
-    msg = MIMEMultipart()
-    msg["From"] = EMAIL_SENDER
-    msg["To"] = EMAIL_RECEIVER
-    msg["Subject"] = subject
-    msg.attach(MIMEText(body, "plain"))
-
-    if attachment_path:
-        with open(attachment_path, "rb") as attachment:
-            part = MIMEBase("application", "octet-stream")
-            part.set_payload(attachment.read())
-        encoders.encode_base64(part)
-        part.add_header(
-            "Content-Disposition",
-            f"attachment; filename={os.path.basename(attachment_path)}"
-        )
-        msg.attach(part)
+# Pipeline configuration
+PIPELINE_STATS_INTERVAL = 10  # Seconds between pipeline stats reports
 
-    try:
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            server.starttls()
-            server.login(EMAIL_SENDER, EMAIL_PASSWORD)
-            server.send_message(msg)
-            print("Email sent successfully.")
-    except Exception as e:
-        print(f"Failed to send email: {e}")
+# Per-stage timings, looked up once
+GRAYSCALE_SECONDS = STAGE_SECONDS.labels("grayscale")
+DETECT_SECONDS = STAGE_SECONDS.labels("detect")
+PREDICT_SECONDS = STAGE_SECONDS.labels("predict")
+DESCRIBE_SECONDS = STAGE_SECONDS.labels("unknown_describe")
+
+# Display configuration
+HEADLESS = os.getenv("IDS_HEADLESS", "0") == "1"        # No local window; stop with Ctrl+C
+LIVE_STREAM = os.getenv("IDS_LIVE_STREAM", "0") == "1"  # Publish annotated frames as MJPEG
 
 # Function to save intruder image
-def save_intruder_image(frame):
+def save_intruder_image(frame, directory=INTRUDER_IMAGES_DIR, face_id=None):
     """
-    Saves the detected intruder's image to the logs directory.
+    Saves the detected intruder's image to the logs directory. The name
+    carries microseconds and the face ID so simultaneous intruders never
+    overwrite each other.
     """
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    intruder_image_path = os.path.join(INTRUDER_IMAGES_DIR, f"intruder_{timestamp}.jpg")
-    cv2.imwrite(intruder_image_path, frame)
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    suffix = "" if face_id is None else "_" + re.sub(r"[^A-Za-z0-9]+", "-", str(face_id)).strip("-")
+    intruder_image_path = os.path.join(directory, f"intruder_{timestamp}{suffix}.jpg")
+    with stage_timer("imwrite"):
+        cv2.imwrite(intruder_image_path, frame)
     return intruder_image_path
 
-# Function to handle intruders
-def handle_intruder(face_id, frame):
+# Function to save the image and send alerts (runs on the sink thread)
+def alert_intruder(face_id, frame, camera=None, track_id=None, confidence=None, identity=None):
     """
-    Handles actions when an intruder is detected.
+    Saves the intruder's image, records it in the event store and queues
+    the email and WhatsApp alerts on the alert dispatcher.
+    """
+    intruder_image_path = save_intruder_image(frame, face_id=face_id)
+    get_event_store().add_event("image", intruder_image_path, camera=camera, track_id=track_id,
+                                label="intruder", confidence=confidence, identity=identity)
+
+    who = f"Face ID {face_id}" if identity is None else f"Face ID {face_id}, unknown identity {identity}"
+    get_dispatcher().submit(
+        subject=f"Intruder Alert: Face ID {face_id}",
+        body=f"An unauthorized person has been detected ({who}). See the attached image for details.",
+        image_path=intruder_image_path
+    )
+
+# Function to index a finished clip (runs on the clip writer thread)
+def record_clip(path, clip):
+    """
+    Records a pre/post-event clip in the event store.
+    """
+    get_event_store().add_event("recording", path, camera=clip.details.get("camera"),
+                                track_id=clip.details.get("track_id"), label="intruder",
+                                confidence=clip.details.get("confidence"), identity=clip.details.get("identity"),
+                                ts=clip.trigger_ts)
+    log_event("clip saved", file=os.path.basename(path), frames=len(clip.frames))
+
+# Function to apply the alert cooldown
+def alert_key(face_id, identity=None):
+    """
+    Returns the (key, cooldown) an alert is deduplicated on: the unknown
+    identity if the face was matched to one, so a returning stranger is
+    reported once per UNKNOWN_ALERT_COOLDOWN whichever track they are on,
+    otherwise the face (track) ID.
+    """
+    if identity is not None:
+        return identity, UNKNOWN_ALERT_COOLDOWN
+    return face_id, ALERT_COOLDOWN
+
+def should_alert(key, cooldown=ALERT_COOLDOWN):
+    """
+    Returns True if no alert was raised for this key within the cooldown,
+    and starts a new cooldown if so.
     """
-    global last_alert_time
     current_time = time.time()
 
-    # Check cooldown for this face
-    if face_id in last_alert_time and current_time - last_alert_time[face_id] < ALERT_COOLDOWN:
-        print(f"Cooldown active for face {face_id}. Skipping alert.")
+    with alert_lock:
+        # Check cooldown for this key
+        active = key in alert_expiry and current_time < alert_expiry[key]
+        if not active:
+            # Start the cooldown for this key and forget expired ones
+            alert_expiry[key] = current_time + cooldown
+            for expired in [k for k, t in alert_expiry.items() if current_time >= t]:
+                del alert_expiry[expired]
+    if active:
+        log_event("alert cooldown active", key=("cooldown", key), alert_key=key)
+        return False
+    INTRUDER_ALERTS.inc()
+    return True
+
+# Function to handle intruders
+def handle_intruder(face_id, frame, pipeline=None, clip_recorder=None, **details):
+    """
+    Handles actions when an intruder is detected. When a pipeline is given,
+    saving and alerting are queued on its sink stage instead of blocking
+    the detection loop. With a clip recorder, a clip around the event is
+    saved as well. Extra details (camera, track_id, confidence, identity)
+    are recorded with the event.
+    """
+    if not should_alert(*alert_key(face_id, details.get("identity"))):
         return
 
-    # Update last alert time for this face
-    last_alert_time[face_id] = current_time
+    log_event("intruder detected", logging.WARNING, face_id=face_id, **details)
+    if clip_recorder is not None:
+        clip_recorder.trigger(face_id=face_id, **details)
+    if pipeline is not None:
+        pipeline.submit(alert_intruder, face_id, frame.copy(), **details)
+    else:
+        alert_intruder(face_id, frame, **details)
 
-    print(f"Intruder detected! Face ID: {face_id}")
-    intruder_image_path = save_intruder_image(frame)
+# Detection and recognition stage
+class DetectionStage:
+    """
+    Detects faces in each frame, follows them with a tracker and runs the
+    recognizer only for new tracks or tracks whose identity has gone stale.
+    Alerts are keyed on the track, or on the stranger's identity in the
+    unknown face index. on_intruder(face_id, track, frame) and
+    on_recognition(face_id, track) replace the default alert handling, e.g.
+    to forward events from a worker process; face IDs are prefixed with the
+    camera name if given.
+    """
+    def __init__(self, pipeline=None, motion_gate=None, camera=None, on_intruder=None, on_recognition=None,
+                 clip_recorder=None, detector=None, unknown_index=None, load_controller=None):
+        self.pipeline = pipeline
+        self.detector = detector or get_face_detector()
+        self.clip_recorder = clip_recorder
+        self.motion_gate = motion_gate
+        self.camera = camera
+        self.on_intruder = on_intruder
+        self.on_recognition = on_recognition
+        self.threshold = RECOGNITION_THRESHOLD
+        self.tracker = FaceTracker(threshold=self.threshold)
+        if unknown_index is None and UNKNOWN_INDEX:
+            unknown_index = get_unknown_index()
+        self.unknown_index = unknown_index
+        self.faces_seen = 0
+        self.frames_seen = 0
+        self.recognizer_calls = 0
+        self.tracks = []  # Faces in the last processed frame
+        self.model_version = None  # Model version the cached identities came from
+        self.frames_metric = FRAMES.labels(camera if camera is not None else "local")
+        self.timings = {"detect": 0.0, "recognize": 0.0}  # Seconds spent on the last frame
+        self.load_controller = load_controller
+        if load_controller is not None:
+            load_controller.attach(self)
 
-    # Send an email alert
-    send_email(
-        subject=f"Intruder Alert: Face ID {face_id}",
-        body="An unauthorized person has been detected. See the attached image for details.",
-        attachment_path=intruder_image_path
-    )
+    def process(self, frame):
+        """
+        Detects and recognizes faces in a frame, annotates it in place and
+        raises alerts for unrecognized faces.
+        """
+        process_frames([(self, frame)])
+        return frame
 
-    # Send a WhatsApp alert
-    send_whatsapp_message(
-        image_path=intruder_image_path,
-        message_body="Alert! An intruder has been detected. See the attached image."
-    )
+    def use_model(self, model):
+        """
+        Switches to a model version and its threshold. When the model is
+        reloaded, cached identities are dropped so every track is
+        recognized again with the new model.
+        """
+        if self.model_version is not None and self.model_version != model.version:
+            self.tracker.expire_identities()
+        if self.model_version != model.version:
+            self.threshold = recognition_threshold(model)
+            self.tracker.threshold = self.threshold
+        self.model_version = model.version
+
+    def begin(self, frame):
+        """
+        First half of process(): runs the motion gate, detection and
+        tracking. Returns the (track, normalized face) pairs that need
+        recognition, or None if the frame was skipped.
+
+        With a motion gate, static frames skip detection and busy frames
+        are only searched around the moving region; tracked faces stay
+        tracked. With a load controller, detection resolution, frame
+        skipping and re-recognition follow its frame time budget.
+        """
+        self.timings = {"detect": 0.0, "recognize": 0.0}
+        self.frames_metric.inc()
+        self.frames_seen += 1
+        if self.load_controller is not None and self.load_controller.skip(self):
+            self.show_last(frame)
+            return None
+        start = time.perf_counter()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        GRAYSCALE_SECONDS.observe(time.perf_counter() - start)
+
+        region = None
+        if self.motion_gate is not None:
+            region = self.motion_gate.check(gray)
+            if region is None:
+                # Nothing moved: the faces last seen are still there, so
+                # keep showing them and re-alert once their cooldown ends
+                self.tracker.age()
+                self.show_last(frame)
+                self.raise_alerts(frame, [track for track in self.tracks if not track.missed])
+                return None
+            for track in self.tracker.tracks:
+                region = union_box(region, track.box)
+            self._work_start = time.process_time()
+
+        start = time.perf_counter()
+        faces = self.detect(gray, region)
+        self.timings["detect"] = time.perf_counter() - start
+        DETECT_SECONDS.observe(self.timings["detect"])
+        tracks = self.tracker.update(faces)
+        self.tracks = tracks
+        self.faces_seen += len(tracks)
+
+        pending = []
+        for track in tracks:
+            if self.tracker.needs_recognition(track):
+                x, y, w, h = track.box
+                pending.append((track, normalize_face(gray[y:y+h, x:x+w])))
+        return pending
+
+    def show_last(self, frame):
+        """
+        Annotates a frame that is not processed with the last known faces.
+        """
+        self.tracks = list(self.tracker.tracks)
+        for track in self.tracks:
+            self.annotate(frame, track)
+
+    def finish(self, frame, pending, results, model):
+        """
+        Second half of process(): applies the recognition results for the
+        pending faces, annotates the frame and raises alerts. Names come
+        from the model that produced the results.
+        """
+        for (track, _), (label, confidence) in zip(pending, results):
+            self.recognizer_calls += 1
+            self.tracker.set_identity(track, label, confidence, model.label_name(label))
+            recognized = confidence < self.threshold
+            RECOGNITIONS.labels("recognized" if recognized else "unrecognized").inc()
+            RECOGNITION_DISTANCE.observe(confidence)
+            if self.on_recognition is not None:
+                self.on_recognition(self.face_id(track), track)
+            elif recognized:
+                log_event("face recognized", key=("recognized", self.camera, track.track_id),
+                          user=track.name, track_id=track.track_id, confidence=confidence)
+            else:
+                log_event("face unrecognized", key=("unrecognized", self.camera, track.track_id),
+                          track_id=track.track_id, confidence=confidence)
+        if self.unknown_index is not None:
+            self.match_unknown([(track, face) for track, face in pending
+                                if track.confidence >= self.threshold])
+
+        for track in self.tracks:
+            self.annotate(frame, track)
+        self.raise_alerts(frame, self.tracks)
+
+        if self.motion_gate is not None:
+            self.motion_gate.record_work(time.process_time() - self._work_start)
+
+    def raise_alerts(self, frame, tracks):
+        """
+        Raises an alert for every intruder among tracks; should_alert()
+        holds back the ones still in their cooldown. With a clip recorder,
+        an alert also saves a clip of the seconds around it.
+        """
+        for track in tracks:
+            if track.confidence is None or track.confidence < self.threshold:
+                continue
+            if self.on_intruder is not None:
+                self.on_intruder(self.face_id(track), track, frame)
+            else:
+                handle_intruder(self.face_id(track), frame, self.pipeline, self.clip_recorder,
+                                camera=self.camera, track_id=track.track_id,
+                                confidence=track.confidence, identity=track.unknown_id)
+
+    def match_unknown(self, unrecognized):
+        """
+        Records (track, face) pairs the recognizer did not know in the
+        unknown face index. A track's first unknown face is matched to an
+        identity, kept as track.unknown_id so alerts are deduplicated on
+        the stranger; later ones only add to that identity.
+        """
+        if not unrecognized:
+            return
+        start = time.perf_counter()
+        descriptors = face_descriptors([face for _, face in unrecognized])
+        DESCRIBE_SECONDS.observe(time.perf_counter() - start)
+        # One call for the whole frame; the index may live in another process
+        start = time.perf_counter()
+        results, identities = self.unknown_index.match_batch(
+            [track.unknown_id for track, _ in unrecognized], descriptors,
+            [track.track_id for track, _ in unrecognized], self.camera)
+        MATCH_SECONDS.observe(time.perf_counter() - start)
+        UNKNOWN_IDENTITIES_METRIC.set(identities)
+        for (track, _), result in zip(unrecognized, results):
+            if result is None:
+                continue  # Added to the track's identity
+            track.unknown_id, similarity, new = result
+            UNKNOWN_SIGHTINGS_METRIC.labels("new" if new else "matched").inc()
+            log_event("unknown face", key=("unknown", self.camera, track.track_id), track_id=track.track_id,
+                      identity=track.unknown_id, new=new, similarity=similarity)
+
+    def intruder_count(self):
+        """
+        Returns how many faces in the last frame were classed as intruders.
+        """
+        return sum(1 for track in self.tracks if track.confidence >= self.threshold)
+
+    def face_id(self, track):
+        if self.camera is None:
+            return track.track_id
+        return f"{self.camera}/{track.track_id}"
+
+    def detect(self, gray, region=None):
+        """
+        Runs the face detector on the whole frame or only inside a region,
+        returning boxes in full-frame coordinates.
+        """
+        return self.detector.detect(gray, region)
+
+    def annotate(self, frame, track):
+        x, y, w, h = track.box
+        if track.confidence < self.threshold:  # Recognized face
+            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)  # Green rectangle
+            cv2.putText(frame, f"{track.name} ({track.confidence:.2f})", (x, y-10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
+        else:
+            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 0, 255), 2)  # Red rectangle
+            label = f"Intruder #{track.track_id}" if track.unknown_id is None else identity_label(track.unknown_id)
+            cv2.putText(frame, label, (x, y-10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
+
+    def format_stats(self):
+        saved = 1 - self.recognizer_calls / self.faces_seen if self.faces_seen else 0.0
+        text = (f"{self.faces_seen} faces, {self.recognizer_calls} recognizer calls "
+                f"({saved:.0%} skipped), {len(self.tracker.tracks)} active tracks")
+        if self.motion_gate is not None:
+            text += f" | motion gate: {self.motion_gate.format_stats()}"
+        if self.load_controller is not None:
+            text += f" | load: {self.load_controller.format_stats()}"
+        return text
+
+# Batched recognition across stages
+def process_frames(batch):
+    """
+    Processes a list of (stage, frame) pairs, e.g. the current frame of
+    every camera a worker handles, with one recognition call for all the
+    faces that need it. Recognition time is shared out per face. The model
+    is fetched once, so a reload never splits a batch between versions.
+    The batch's processing time is reported to the stages' load controllers.
+    """
+    batch_start = time.perf_counter()
+    model = get_model()
+    for stage, _ in batch:
+        stage.use_model(model)
+    begun = [(stage, frame, stage.begin(frame)) for stage, frame in batch]
+    faces = [face for _, _, pending in begun if pending for _, face in pending]
+    results = []
+    if faces:
+        start = time.perf_counter()
+        results = model.engine.predict_batch(faces)
+        elapsed = time.perf_counter() - start
+        PREDICT_SECONDS.observe(elapsed)
+        per_face = elapsed / len(faces)
+
+    offset = 0
+    for stage, frame, pending in begun:
+        if pending is None:
+            continue
+        stage.timings["recognize"] = per_face * len(pending) if pending else 0.0
+        stage.finish(frame, pending, results[offset:offset + len(pending)], model)
+        offset += len(pending)
+
+    # Skipped frames cost next to nothing and would hide the real frame time
+    if any(pending is not None for _, _, pending in begun):
+        elapsed = time.perf_counter() - batch_start
+        for controller in {stage.load_controller for stage, _ in batch if stage.load_controller is not None}:
+            controller.observe(elapsed)
 
 # Detect faces
-def detect_faces():
+def detect_faces(headless=HEADLESS, live_stream=LIVE_STREAM, profile=PROFILER, source=CAMERA_SOURCE):
     """
-    Detects and recognizes multiple faces using a webcam.
+    Detects and recognizes multiple faces using a webcam (or any capture
+    source). Capture, detection and alerting run as separate pipeline
+    stages; a lost camera is reconnected rather than ending detection.
+    Annotated frames go to a local window unless headless, and to the live
+    MJPEG stream if enabled. The model loads while the camera opens and is
+    reloaded when retrained. Metrics are published for the log server's
+    /metrics page; with profile, a sampling profile of the whole run is
+    written on exit.
     """
-    camera = cv2.VideoCapture(0)
-    if not camera.isOpened():
+    store = get_model_store()
+    store.preload()
+    camera = create_source(source)
+    if not camera.open():
         print("Error: Unable to access the camera.")
         return
 
-    print("Intruder Detection System Started. Press 'q' to exit.")
+    if headless:
+        print("Intruder Detection System Started. Press Ctrl+C to exit.")
+    else:
+        print("Intruder Detection System Started. Press 'q' to exit.")
 
-    while True:
-        ret, frame = camera.read()
-        if not ret:
-            print("Error: Failed to grab frame.")
-            break
+    broadcaster = server = None
+    if live_stream:
+        broadcaster = FrameBroadcaster()
+        server = StreamServer(broadcaster)
+        server.start()
 
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, 1.3, 5)
-
-        for face_id, (x, y, w, h) in enumerate(faces):
-            face = gray[y:y+h, x:x+w]
-            label, confidence = recognizer.predict(face)
-
-            if confidence < 50:  # Recognized face
-                user_name = label_dict.get(str(label), "Unknown")
-                print(f"Recognized: {user_name} (Face ID: {face_id}, Confidence: {confidence:.2f})")
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)  # Green rectangle
-                cv2.putText(frame, f"{user_name} ({confidence:.2f})", (x, y-10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
-            else:  # Intruder detected
-                print(f"Unrecognized face detected (Face ID: {face_id})")
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 0, 255), 2)  # Red rectangle
-                cv2.putText(frame, "Intruder", (x, y-10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
-                handle_intruder(face_id, frame)
-
-        cv2.imshow("Intruder Detection", frame)
-
-        # Quit detection loop on 'q'
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-
-    camera.release()
-    cv2.destroyAllWindows()
-    print("Camera released.")
+    clip_recorder = ClipRecorder(on_clip=record_clip) if CLIP_RECORDING else None
+    try:
+        get_model()
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        camera.release()
+        return
+    store.watch()
+    metrics_writer = MetricsWriter("detector").start()
+    profiler = SamplingProfiler().start() if profile else None
+
+    pipeline = FramePipeline(camera)
+    stage = DetectionStage(pipeline, MotionGate() if MOTION_GATE else None, clip_recorder=clip_recorder,
+                           load_controller=LoadController() if LOAD_CONTROL else None)
+    pipeline.start()
+    last_stats_time = time.time()
+
+    try:
+        while True:
+            frame = pipeline.next_frame()
+            if frame is None:
+                break
+
+            stage.process(frame)
+            pipeline.frame_done()
+            if broadcaster is not None:
+                broadcaster.publish(frame)
+            if clip_recorder is not None:
+                clip_recorder.add_frame(frame)
+
+            if time.time() - last_stats_time >= PIPELINE_STATS_INTERVAL:
+                print(f"Pipeline: {pipeline.format_stats()}")
+                print(f"Recognition: {stage.format_stats()}")
+                if broadcaster is not None:
+                    print(f"Live stream: {broadcaster.format_stats()}")
+                if clip_recorder is not None:
+                    print(f"Clips: {clip_recorder.format_stats()}")
+                last_stats_time = time.time()
+
+            if not headless:
+                cv2.imshow("Intruder Detection", frame)
+                # Quit detection loop on 'q'
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pipeline.stop()
+        store.stop()
+        metrics_writer.stop()
+        if profiler is not None:
+            print(f"Profile written to {profiler.stop().write()}")
+        print(f"Pipeline: {pipeline.format_stats()}")
+        print(f"Recognition: {stage.format_stats()}")
+        if broadcaster is not None:
+            server.stop()
+            broadcaster.stop()
+        if clip_recorder is not None:
+            clip_recorder.stop()
+        shutdown_dispatcher()
+        shutdown_unknown_index()
+        camera.release()
+        if not headless:
+            cv2.destroyAllWindows()
+        print("Camera released.")
 
 if __name__ == "__main__":
-    detect_faces()
+    parser = argparse.ArgumentParser(description="Run intruder detection on the webcam.")
+    parser.add_argument("--headless", action="store_true", default=HEADLESS, help="Do not open a display window")
+    parser.add_argument("--stream", action="store_true", default=LIVE_STREAM,
+                        help="Serve annotated frames as MJPEG (see IDS_STREAM_PORT)")
+    parser.add_argument("--profile", action="store_true", default=PROFILER,
+                        help="Write a sampling profile of the run to logs/profiles")
+    parser.add_argument("--source", default=CAMERA_SOURCE,
+                        help="Camera index, URL, video file or image directory (default: IDS_CAMERA)")
+    args = parser.parse_args()
+    detect_faces(headless=args.headless, live_stream=args.stream, profile=args.profile, source=args.source)
@@ -0,0 +1,148 @@
+import logging
+import os
+from metrics import REGISTRY
+from structured_log import log_event
+
+# Load control configuration
+LOAD_CONTROL = os.getenv("IDS_LOAD_CONTROL", "0") == "1"  # Opt-in: it lowers detection quality under load
+LATENCY_BUDGET_MS = float(os.getenv("IDS_LATENCY_BUDGET_MS", "150"))  # Per-frame processing budget
+LOAD_WINDOW = 15             # Processed frames per decision
+LOAD_PERCENTILE = 0.9        # The window's p90 is held to the budget
+RECOVER_HEADROOM = 0.6       # Step back up once the p90 is below this fraction of the budget...
+RECOVER_WINDOWS = 3          # ...for this many windows in a row
+MAX_RECOVER_WINDOWS = 24     # Cap when recoveries keep failing
+
+# Degradation steps, mildest first: detection downscale (times the
+# detector's own), frames processed (1 in `stride`) and how much less often
+# tracked faces are re-recognized
+LEVELS = (
+    {"scale": 1.0, "stride": 1, "recognition": 1},
+    {"scale": 0.75, "stride": 1, "recognition": 1},
+    {"scale": 0.5, "stride": 1, "recognition": 2},
+    {"scale": 0.5, "stride": 2, "recognition": 2},
+    {"scale": 0.4, "stride": 3, "recognition": 4},
+)
+
+LOAD_LEVEL = REGISTRY.gauge("ids_load_level", "Degradation level chosen by the load controller (0 is full quality).",
+                            ("controller",))
+LOAD_LEVEL_CHANGES = REGISTRY.counter("ids_load_level_changes", "Load controller level changes.",
+                                      ("controller", "direction"))
+LOAD_SKIPPED = REGISTRY.counter("ids_frames_load_skipped", "Frames skipped by the load controller.", ("controller",))
+
+class LoadController:
+    """
+    Keeps per-frame processing time within a latency budget by trading
+    quality for speed. Every LOAD_WINDOW processed frames the p90 frame
+    time is compared with the budget: over it, the stages attached to the
+    controller move one level down LEVELS (smaller detection images, then
+    skipped frames and rarer re-recognition); well under it for a few
+    windows, one level back up. A recovery that immediately overloads
+    again doubles the wait before the next one, so the controller settles
+    instead of oscillating.
+
+    Stages that share a detector and a CPU (the cameras of one worker)
+    share one controller.
+    """
+    def __init__(self, budget_ms=LATENCY_BUDGET_MS, window=LOAD_WINDOW, levels=LEVELS, name="detector"):
+        self.budget = budget_ms / 1000
+        self.window = window
+        self.levels = levels
+        self.name = name
+        self.level = 0
+        self.stages = []
+        self.samples = []
+        self.good_windows = 0
+        self.recover_windows = RECOVER_WINDOWS
+        self.recovered = False  # The last change was a recovery and no window has passed since
+        self.changes = 0
+        self.skipped = 0
+        # One series per controller: the detection service runs one per camera
+        self._level_metric = LOAD_LEVEL.labels(name)
+        self._skipped_metric = LOAD_SKIPPED.labels(name)
+        self._level_metric.set(0)
+
+    def attach(self, stage):
+        """
+        Puts a stage under control, remembering its full-quality settings.
+        """
+        stage.base_scale = stage.detector.scale
+        stage.base_recognition_interval = stage.tracker.recognition_interval
+        stage.base_uncertain_interval = stage.tracker.uncertain_interval
+        self.stages.append(stage)
+        self._apply(stage)
+        return self
+
+    @property
+    def settings(self):
+        return self.levels[self.level]
+
+    def skip(self, stage):
+        """
+        Returns True if the stage should skip its current frame.
+        """
+        stride = self.settings["stride"]
+        if stride > 1 and stage.frames_seen % stride:
+            self.skipped += 1
+            self._skipped_metric.inc()
+            return True
+        return False
+
+    def observe(self, seconds):
+        """
+        Records the processing time of one frame (or one batch of frames)
+        and changes level at the end of a window if needed.
+        """
+        self.samples.append(seconds)
+        if len(self.samples) < self.window:
+            return
+        samples = sorted(self.samples)
+        self.samples = []
+        p90 = samples[min(int(len(samples) * LOAD_PERCENTILE), len(samples) - 1)]
+        if p90 > self.budget:
+            if self.recovered:
+                self.recover_windows = min(self.recover_windows * 2, MAX_RECOVER_WINDOWS)
+            self.good_windows = 0
+            self.recovered = False
+            if self.level < len(self.levels) - 1:
+                self._change(self.level + 1, p90)
+            return
+        if self.recovered:
+            self.recover_windows = RECOVER_WINDOWS  # The recovery held
+            self.recovered = False
+        if p90 < self.budget * RECOVER_HEADROOM and self.level > 0:
+            self.good_windows += 1
+            if self.good_windows >= self.recover_windows:
+                self.good_windows = 0
+                self.recovered = True
+                self._change(self.level - 1, p90)
+        else:
+            self.good_windows = 0
+
+    def _change(self, level, p90):
+        direction = "down" if level > self.level else "up"
+        self.level = level
+        self.changes += 1
+        self._level_metric.set(level)
+        LOAD_LEVEL_CHANGES.labels(self.name, direction).inc()
+        settings = self.settings
+        log_event("load level changed", logging.WARNING if direction == "down" else logging.INFO,
+                  controller=self.name, load_level=level, direction=direction, p90_ms=p90 * 1000,
+                  budget_ms=self.budget * 1000, scale=settings["scale"], stride=settings["stride"],
+                  recognition=settings["recognition"])
+        for stage in self.stages:
+            self._apply(stage)
+
+    def _apply(self, stage):
+        settings = self.settings
+        stage.detector.scale = stage.base_scale * settings["scale"]
+        stage.tracker.recognition_interval = stage.base_recognition_interval * settings["recognition"]
+        stage.tracker.uncertain_interval = stage.base_uncertain_interval * settings["recognition"]
+
+    def stats(self):
+        return {"level": self.level, "budget_ms": self.budget * 1000, "changes": self.changes,
+                "skipped": self.skipped, **self.settings}
+
+    def format_stats(self):
+        s = self.stats()
+        return (f"level {s['level']} (scale x{s['scale']}, 1 in {s['stride']} frames, recognition "
+                f"x{s['recognition']} less often), {s['changes']} changes, {s['skipped']} frames skipped")
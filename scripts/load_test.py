@@ -0,0 +1,112 @@
+import argparse
+import http.client
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+
+# Default browsing mix: (weight, path)
+DEFAULT_PATHS = [
+    (4, "/"),
+    (2, "/api/events?limit=200"),
+    (1, "/api/events?kind=recording&limit=50"),
+]
+THUMBNAIL_WEIGHT = 8  # Each page view pulls in many previews
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+def discover_thumbnails(host, port):
+    """
+    Returns the thumbnail URLs linked from the first page of the log server.
+    """
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    connection.request("GET", "/")
+    html = connection.getresponse().read().decode(errors="replace")
+    connection.close()
+    return re.findall(r'<img src="([^"]+)"', html)
+
+class Client(threading.Thread):
+    """
+    One simulated browser: a keep-alive connection issuing weighted random
+    requests until the deadline.
+    """
+    def __init__(self, host, port, paths, weights, deadline, gzip):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.paths = paths
+        self.weights = weights
+        self.deadline = deadline
+        self.headers = {"Accept-Encoding": "gzip"} if gzip else {}
+        self.latencies = []
+        self.errors = 0
+        self.bytes = 0
+
+    def run(self):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        while time.time() < self.deadline:
+            path = random.choices(self.paths, self.weights)[0]
+            start = time.perf_counter()
+            try:
+                connection.request("GET", path, headers=self.headers)
+                response = connection.getresponse()
+                body = response.read()
+                if response.status >= 400:
+                    self.errors += 1
+                    continue
+                self.bytes += len(body)
+                self.latencies.append(time.perf_counter() - start)
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                connection.close()
+                connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        connection.close()
+
+def run_load_test(server, concurrency, duration, gzip=True):
+    url = urllib.parse.urlsplit(server)
+    host, port = url.hostname, url.port or 80
+    weighted = list(DEFAULT_PATHS)
+    thumbnails = discover_thumbnails(host, port)
+    if thumbnails:
+        weighted += [(THUMBNAIL_WEIGHT / len(thumbnails), path) for path in thumbnails]
+    weights, paths = zip(*weighted)
+
+    deadline = time.time() + duration
+    clients = [Client(host, port, paths, weights, deadline, gzip) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for client in clients for latency in client.latencies]
+    return {
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "requests": len(latencies),
+        "errors": sum(client.errors for client in clients),
+        "requests_per_second": len(latencies) / elapsed,
+        "megabytes_per_second": sum(client.bytes for client in clients) / elapsed / 1e6,
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p95": percentile(latencies, 0.95) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "max": max(latencies, default=0.0) * 1000,
+        },
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the log server with concurrent simulated browsers.")
+    parser.add_argument("--server", default="http://localhost:5000")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to run")
+    parser.add_argument("--no-gzip", action="store_true", help="Do not send Accept-Encoding: gzip")
+    args = parser.parse_args()
+    print(json.dumps(run_load_test(args.server, args.concurrency, args.duration, not args.no_gzip), indent=2))
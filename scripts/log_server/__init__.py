@@ -0,0 +1 @@
+from log_server.server import app
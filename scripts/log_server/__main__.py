@@ -0,0 +1,90 @@
+import argparse
+import os
+
+# Serving configuration
+HOST = os.getenv("LOG_SERVER_HOST", "0.0.0.0")
+PORT = int(os.getenv("LOG_SERVER_PORT", "5000"))
+SERVER = os.getenv("LOG_SERVER_MODE", "auto")                   # auto, gunicorn, waitress or dev
+WORKERS = int(os.getenv("LOG_SERVER_WORKERS", "0")) or min((os.cpu_count() or 1) * 2 + 1, 8)
+THREADS = int(os.getenv("LOG_SERVER_THREADS", "8"))             # Threads per worker
+TIMEOUT = int(os.getenv("LOG_SERVER_TIMEOUT", "120"))           # Seconds before a stuck worker is restarted
+
+def run_gunicorn(app, host, port, workers, threads):
+    """
+    Serves the app with gunicorn's threaded workers, so large downloads and
+    streamed listings tie up one thread rather than a whole process.
+    """
+    from gunicorn.app.base import BaseApplication
+
+    class LogServerApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("threads", threads)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("timeout", TIMEOUT)
+            self.cfg.set("accesslog", "-")
+
+        def load(self):
+            return app
+
+    LogServerApplication().run()
+
+def run_waitress(app, host, port, threads):
+    """
+    Serves the app with waitress, which also runs on Windows.
+    """
+    from waitress import serve as waitress_serve
+    waitress_serve(app, host=host, port=port, threads=threads)
+
+def choose_server(server):
+    """
+    Resolves "auto" to the best production server that is installed.
+    """
+    if server != "auto":
+        return server
+    if os.name == "posix":
+        try:
+            import gunicorn  # noqa: F401
+            return "gunicorn"
+        except ImportError:
+            pass
+    try:
+        import waitress  # noqa: F401
+        return "waitress"
+    except ImportError:
+        return "dev"
+
+def serve(host=HOST, port=PORT, server=SERVER, workers=WORKERS, threads=THREADS, debug=False):
+    """
+    Starts the log server. "dev" runs Flask's threaded development server
+    and is only meant for debugging.
+    """
+    from log_server.server import app, import_existing_logs
+
+    # Once, before any workers start
+    import_existing_logs()
+    server = "dev" if debug else choose_server(server)
+    if server == "gunicorn":
+        print(f"Log server on {host}:{port} (gunicorn, {workers} workers x {threads} threads)")
+        run_gunicorn(app, host, port, workers, threads)
+    elif server == "waitress":
+        print(f"Log server on {host}:{port} (waitress, {threads} threads)")
+        run_waitress(app, host, port, threads)
+    else:
+        print(f"Log server on {host}:{port} (development server)")
+        app.run(host=host, port=port, debug=debug, threaded=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve intruder logs and recordings.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--server", choices=["auto", "gunicorn", "waitress", "dev"], default=SERVER)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Worker processes (gunicorn only)")
+    parser.add_argument("--threads", type=int, default=THREADS, help="Threads per worker")
+    parser.add_argument("--debug", action="store_true", help="Development server with the debugger and reloader")
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.server, args.workers, args.threads, args.debug)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+from flask import Flask, Response, send_from_directory, send_file, render_template, abort, request, stream_with_context
+from werkzeug.security import safe_join
+import datetime
+import gzip
+import json
+import os
+import urllib.error
+import urllib.request
+import zlib
+from event_store import PAGE_SIZE, get_event_store
+from metrics import merge_snapshots
+from thumbnails import ThumbnailCache
+from unknown_index import load_identities
+
+# Templates stay in scripts/templates next to the other entry points
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+app = Flask(__name__, template_folder=TEMPLATE_DIR)
+
+# Paths to logs
+BASE_DIR = os.path.join(os.path.expanduser("~/Desktop"), "IDS", "logs")
+INTRUDER_IMAGES_DIR = os.path.join(BASE_DIR, "intruder_images")
+SCREEN_RECORDINGS_DIR = os.path.join(BASE_DIR, "screen_recordings")
+
+# Ensure directories exist
+os.makedirs(INTRUDER_IMAGES_DIR, exist_ok=True)
+os.makedirs(SCREEN_RECORDINGS_DIR, exist_ok=True)
+
+MAX_PAGE_SIZE = 1000
+API_MAX_EVENTS = 100000   # Upper bound for one streamed API listing
+API_CHUNK = 500           # Rows fetched from the store per step while streaming
+
+# Compression of HTML and JSON listings
+GZIP_MIMETYPES = ("text/html", "application/json")
+GZIP_MIN_SIZE = 500
+GZIP_LEVEL = 6
+
+# Browser caching. Logged files are never modified once written.
+MEDIA_MAX_AGE = 7 * 24 * 3600
+THUMBNAIL_MAX_AGE = 365 * 24 * 3600
+
+# Live view. The detector serves MJPEG itself (intruder_detection.py --stream).
+LIVE_STREAM_URL = os.getenv("LIVE_STREAM_URL", "http://localhost:8081/stream.mjpg")
+LIVE_PROXY_CHUNK = 64 * 1024
+
+thumbnail_cache = ThumbnailCache()
+
+def import_existing_logs():
+    """
+    Indexes the images and recordings already on disk when the event store
+    is empty, so logs written before the store existed show up on first
+    start.
+    """
+    store = get_event_store()
+    if not store.is_empty():
+        return
+    for kind, added in store.import_existing().items():
+        if added:
+            print(f"Imported {added} existing {kind} event(s) into the event store")
+
+def log_folder(log_type):
+    """
+    Returns the directory for a log type, or None if the type is unknown.
+    """
+    if log_type == "images":
+        return INTRUDER_IMAGES_DIR
+    elif log_type == "recordings":
+        return SCREEN_RECORDINGS_DIR
+    return None
+
+def parse_time(value):
+    """
+    Converts an ISO date/time from the filter form to a Unix timestamp.
+    """
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        abort(400)
+
+def parse_cursor(value):
+    """
+    Parses a "ts:id" pagination cursor.
+    """
+    if not value:
+        return None
+    try:
+        ts, event_id = value.split(":")
+        return float(ts), int(event_id)
+    except ValueError:
+        abort(400)
+
+def page_links(events, cursor_used):
+    """
+    Returns the cursors for the newer and older pages around a page of events.
+    """
+    if not events:
+        return None, None
+    newer = f"{events[0]['ts']!r}:{events[0]['id']}" if cursor_used else None
+    older = f"{events[-1]['ts']!r}:{events[-1]['id']}"
+    return newer, older
+
+def event_page(store, kind, start, end, prefix, limit):
+    """
+    Fetches the page of one kind of event selected by the request's
+    <prefix>before / <prefix>after cursors. Returns the events, the cursors
+    for the newer and older pages and the cursor arguments of this page.
+    """
+    cursor_args = {name: request.args[name] for name in (prefix + "before", prefix + "after")
+                   if request.args.get(name)}
+    before = parse_cursor(request.args.get(prefix + "before"))
+    after = parse_cursor(request.args.get(prefix + "after"))
+    events = store.query(kind, start, end, before, after, limit)
+    newer, older = page_links(events, before is not None or after is not None)
+    if len(events) < limit:
+        if after is None:
+            older = None
+        else:
+            newer = None
+    return events, newer, older, cursor_args
+
+@app.template_filter("basename")
+def basename(path):
+    return os.path.basename(path)
+
+@app.template_filter("timestamp")
+def format_timestamp(ts):
+    return datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+@app.route("/")
+def home():
+    """
+    Renders one page of intruder images and one of screen recordings from
+    the event store, optionally limited to a time range. Images page with
+    before / after, recordings with recordings_before / recordings_after,
+    so each list keeps its place while the other is paged.
+    """
+    store = get_event_store()
+    start = parse_time(request.args.get("start"))
+    end = parse_time(request.args.get("end"))
+    limit = min(request.args.get("limit", PAGE_SIZE, type=int), MAX_PAGE_SIZE)
+
+    intruder_images, newer, older, image_cursor = event_page(store, "image", start, end, "", limit)
+    screen_recordings, recordings_newer, recordings_older, recording_cursor = event_page(
+        store, "recording", start, end, "recordings_", limit)
+    return render_template("index.html", images=intruder_images, recordings=screen_recordings,
+                           newer=newer, older=older, image_cursor=image_cursor,
+                           recordings_newer=recordings_newer, recordings_older=recordings_older,
+                           recording_cursor=recording_cursor, limit=limit,
+                           start=request.args.get("start", ""), end=request.args.get("end", ""))
+
+@app.route("/view/<log_type>/<filename>")
+def view_log(log_type, filename):
+    """
+    Serves the requested log file for viewing. Responses carry ETag and
+    Last-Modified headers and honour Range requests, so browsers can seek
+    in recordings without downloading them in full.
+    """
+    folder = log_folder(log_type)
+
+    if folder and os.path.exists(os.path.join(folder, filename)):
+        return send_from_directory(folder, filename, conditional=True, etag=True, max_age=MEDIA_MAX_AGE)
+    else:
+        abort(404)
+
+@app.route("/download/<log_type>/<filename>")
+def download_log(log_type, filename):
+    """
+    Serves the requested log file for download.
+    """
+    folder = log_folder(log_type)
+
+    if folder and os.path.exists(os.path.join(folder, filename)):
+        return send_from_directory(folder, filename, as_attachment=True, conditional=True,
+                                   etag=True, max_age=MEDIA_MAX_AGE)
+    else:
+        abort(404)
+
+@app.route("/thumb/<log_type>/<filename>")
+def thumbnail(log_type, filename):
+    """
+    Serves a cached preview of a log file, generating it on first request.
+    """
+    folder = log_folder(log_type)
+    source_path = safe_join(folder, filename) if folder else None
+    if not source_path or not os.path.isfile(source_path):
+        abort(404)
+
+    thumb_path = thumbnail_cache.get(source_path)
+    if thumb_path is None:
+        abort(404)
+    # The thumbnail's mtime tracks LRU use, so validators come from the key and the source
+    response = send_file(thumb_path, mimetype="image/jpeg", conditional=True,
+                         etag=os.path.splitext(os.path.basename(thumb_path))[0],
+                         last_modified=os.path.getmtime(source_path), max_age=THUMBNAIL_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
+
+@app.route("/api/events")
+def api_events():
+    """
+    Streams events as JSON, newest first, fetching them from the store in
+    chunks so large listings start arriving immediately and never sit in
+    memory whole. Takes the same filters and cursors as the home page.
+    """
+    kind = request.args.get("kind", "image")
+    start = parse_time(request.args.get("start"))
+    end = parse_time(request.args.get("end"))
+    before = parse_cursor(request.args.get("before"))
+    limit = min(request.args.get("limit", PAGE_SIZE, type=int), API_MAX_EVENTS)
+    store = get_event_store()
+
+    def generate():
+        cursor, sent = before, 0
+        yield '{"events": ['
+        while sent < limit:
+            wanted = min(API_CHUNK, limit - sent)
+            events = store.query(kind, start, end, before=cursor, limit=wanted)
+            for event in events:
+                yield ("," if sent else "") + json.dumps(event)
+                sent += 1
+            if events:
+                cursor = (events[-1]["ts"], events[-1]["id"])
+            if len(events) < wanted:
+                break
+        # A full listing may have more events behind it
+        next_cursor = f"{cursor[0]!r}:{cursor[1]}" if sent and sent >= limit else None
+        yield f'], "count": {sent}, "next": {json.dumps(next_cursor)}}}'
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
+@app.route("/api/unknown")
+def api_unknown():
+    """
+    Lists the unknown face identities of every detection process, most
+    recently seen first, with how often and where each was seen.
+    """
+    identities = load_identities()
+    for identity in identities:
+        identity.pop("sightings")
+    return {"identities": identities, "count": len(identities)}
+
+@app.route("/api/unknown/<key>")
+def api_unknown_identity(key):
+    """
+    Returns one unknown identity with its recent sightings and the intruder
+    images and recordings saved for it.
+    """
+    identity = next((identity for identity in load_identities() if identity["key"] == key), None)
+    if identity is None:
+        abort(404)
+    limit = min(request.args.get("limit", PAGE_SIZE, type=int), MAX_PAGE_SIZE)
+    store = get_event_store()
+    identity["images"] = store.query("image", limit=limit, identity=key)
+    identity["recordings"] = store.query("recording", limit=limit, identity=key)
+    return identity
+
+@app.route("/live")
+def live():
+    """
+    Shows the detector's annotated frames.
+    """
+    return render_template("live.html")
+
+@app.route("/live/stream.mjpg")
+def live_stream():
+    """
+    Relays the detector's MJPEG stream so viewers only need to reach the
+    log server. The detector encodes each frame once however many viewers
+    are relayed.
+    """
+    try:
+        upstream = urllib.request.urlopen(LIVE_STREAM_URL, timeout=10)
+    except (urllib.error.URLError, OSError):
+        abort(503)
+
+    def relay():
+        try:
+            while True:
+                chunk = upstream.read1(LIVE_PROXY_CHUNK)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            upstream.close()
+
+    response = Response(relay(), content_type=upstream.headers["Content-Type"])
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+@app.route("/metrics")
+def metrics():
+    """
+    Prometheus text exposition of the detection processes' metrics, from
+    the snapshots each of them writes to logs/metrics.
+    """
+    response = Response(merge_snapshots(), content_type="text/plain; version=0.0.4; charset=utf-8")
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+def gzip_chunks(chunks):
+    """
+    Compresses a streamed body chunk by chunk.
+    """
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk if isinstance(chunk, bytes) else chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+@app.after_request
+def compress_response(response):
+    """
+    Gzips HTML pages and JSON listings for clients that accept it. File
+    downloads and thumbnails are left alone.
+    """
+    if (response.mimetype not in GZIP_MIMETYPES
+            or "gzip" not in request.headers.get("Accept-Encoding", "").lower()
+            or "Content-Encoding" in response.headers
+            or response.status_code < 200 or response.status_code >= 300):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    if response.is_streamed:
+        response.response = gzip_chunks(response.response)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < GZIP_MIN_SIZE:
+            return response
+        response.set_data(gzip.compress(data, GZIP_LEVEL))
+    response.headers["Content-Encoding"] = "gzip"
+    return response
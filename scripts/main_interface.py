@@ -1,17 +1,37 @@
-from PyQt5.QtWidgets import QApplication, QMainWindow, QPushButton, QVBoxLayout, QWidget, QMessageBox
+from PyQt5.QtCore import QUrl, pyqtSignal
+from PyQt5.QtGui import QDesktopServices
+from PyQt5.QtWidgets import QApplication, QMainWindow, QPushButton, QVBoxLayout, QWidget, QMessageBox, QInputDialog
 import os
 import subprocess
+import sys
+import threading
+from service_client import SCRIPTS_DIR, ServiceClient, ServiceError
+
+# Camera the GUI starts detection on
+CAMERA_SOURCE = os.getenv("IDS_CAMERA", "0")
 
 class IntruderDetectionApp(QMainWindow):
+    """
+    Front end for the detection service. Commands are sent over the
+    service's control socket on a background thread, and the service is
+    launched the first time it is needed.
+    """
+    command_finished = pyqtSignal(str)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Intruder Detection System")
         self.setGeometry(100, 100, 500, 400)
+        self.client = ServiceClient()
+        self.command_finished.connect(self.show_message)
 
         # Buttons
         start_btn = QPushButton("Start Intruder Detection", self)
         start_btn.clicked.connect(self.start_detection)
 
+        stop_btn = QPushButton("Stop Intruder Detection", self)
+        stop_btn.clicked.connect(self.stop_detection)
+
         register_face_btn = QPushButton("Register New Face", self)
         register_face_btn.clicked.connect(self.register_new_face)
 
@@ -24,141 +44,154 @@ class IntruderDetectionApp(QMainWindow):
         test_whatsapp_btn = QPushButton("Test WhatsApp Notification", self)
         test_whatsapp_btn.clicked.connect(self.test_whatsapp)
 
+        status_btn = QPushButton("Status", self)
+        status_btn.clicked.connect(self.show_status)
+
         view_logs_btn = QPushButton("View Logs", self)
         view_logs_btn.clicked.connect(self.view_logs)
 
         # Layout
         layout = QVBoxLayout()
         layout.addWidget(start_btn)
+        layout.addWidget(stop_btn)
         layout.addWidget(register_face_btn)
         layout.addWidget(train_model_btn)
         layout.addWidget(test_email_btn)
         layout.addWidget(test_whatsapp_btn)
+        layout.addWidget(status_btn)
         layout.addWidget(view_logs_btn)
 
         container = QWidget()
         container.setLayout(layout)
         self.setCentralWidget(container)
 
+    def send_command(self, command, describe, start_service=True, timeout=None, **args):
+        """
+        Runs a service command off the UI thread and shows describe(result),
+        or the error, when it finishes.
+        """
+        def run():
+            try:
+                if start_service:
+                    self.client.ensure_running()
+                message = describe(self.client.call(command, timeout=timeout, **args))
+            except ServiceError as e:
+                message = f"Detection service: {e}"
+            except OSError as e:
+                message = "Detection service is not running." if not start_service else f"Detection service: {e}"
+            self.command_finished.emit(message)
+        threading.Thread(target=run, daemon=True).start()
+
     def start_detection(self):
         """
-        Starts the intruder detection process.
+        Starts intruder detection on the camera.
         """
-        detection_script = os.path.abspath(r"C:/Users/arnav/Desktop/IDS/scripts/intruder_detection.py")
-        print(f"Resolved detection script path: {detection_script}")
+        self.send_command("start", lambda result: f"Intruder Detection Started ({result['state']})",
+                          source=CAMERA_SOURCE)
 
-        if os.path.exists(detection_script):
-            subprocess.Popen(["python", detection_script])
-            self.show_message("Intruder Detection Started")
-        else:
-            self.show_message(f"Script not found: {detection_script}")
+    def stop_detection(self):
+        """
+        Stops intruder detection on every camera.
+        """
+        self.send_command("stop", lambda result: f"Intruder Detection Stopped ({len(result)} camera(s))",
+                          start_service=False)
 
     def register_new_face(self):
         """
-        Opens the face registration script to capture new face data.
+        Runs the face capture script to collect images of a new user. The
+        detection service releases the camera first and gets it back when
+        the capture ends, whether or not it succeeded; this runs off the UI
+        thread because stopping a camera can take seconds.
         """
-        register_script = os.path.abspath(r"C:/Users/arnav/Desktop/IDS/scripts/capture_faces.py")
-        print(f"Resolved face registration script path: {register_script}")
+        user_name, ok = QInputDialog.getText(self, "Register New Face", "User name:")
+        if not ok or not user_name.strip():
+            return
 
-        if os.path.exists(register_script):
-            subprocess.Popen(["python", register_script])
-            self.show_message("Face registration started. Follow the prompts.")
-        else:
-            self.show_message(f"Script not found: {register_script}")
+        def run():
+            was_running = False
+            try:
+                if self.client.is_running():
+                    camera = self.client.call("status")["cameras"].get(CAMERA_SOURCE)
+                    was_running = camera is not None and camera["state"] == "running"
+                    if was_running:
+                        self.client.call("stop", source=CAMERA_SOURCE, wait=True)
+            except (OSError, ServiceError) as e:
+                message = f"Unable to release the camera: {e}"
+            else:
+                capture_script = os.path.join(SCRIPTS_DIR, "face_capture.py")
+                try:
+                    capture = subprocess.run([sys.executable, capture_script, "--user", user_name.strip(),
+                                              "--source", CAMERA_SOURCE], cwd=SCRIPTS_DIR)
+                    if capture.returncode == 0:
+                        message = "Face registration finished. Train the model to recognize the new user."
+                    else:
+                        message = f"Face registration failed (exit code {capture.returncode})."
+                except OSError as e:
+                    message = f"Unable to start face registration: {e}"
+            if was_running:
+                message += "\n" + self.restart_detection()
+            self.command_finished.emit(message)
+        threading.Thread(target=run, daemon=True).start()
+
+    def restart_detection(self):
+        """
+        Starts detection on the camera again after enrollment released it.
+        """
+        try:
+            self.client.call("start", source=CAMERA_SOURCE)
+            return "Intruder detection restarted."
+        except (OSError, ServiceError) as e:
+            return f"Unable to restart intruder detection: {e}"
 
     def train_model(self):
         """
-        Runs the model training script to update the face recognizer.
+        Retrains the model in the background; the detector switches to it
+        when training finishes.
         """
-        train_script = os.path.abspath(r"C:/Users/arnav/Desktop/IDS/scripts/train_model.py")
-        print(f"Resolved training script path: {train_script}")
-
-        if os.path.exists(train_script):
-            subprocess.Popen(["python", train_script])
-            self.show_message("Model training started. Please wait.")
-        else:
-            self.show_message(f"Script not found: {train_script}")
+        self.send_command("retrain", lambda result: "Model training started. Detection will use the new "
+                                                    "model once it finishes.")
 
     def test_email(self):
         """
         Test email alert functionality.
         """
-        test_script = """
-import os
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-
-EMAIL_SENDER = os.getenv("EMAIL_SENDER", "")
-EMAIL_RECEIVER = os.getenv("EMAIL_RECEIVER", "")
-EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD", "")
-
-if not EMAIL_SENDER or not EMAIL_PASSWORD or not EMAIL_RECEIVER:
-    print("Email credentials are not set.")
-else:
-    msg = MIMEMultipart()
-    msg["From"] = EMAIL_SENDER
-    msg["To"] = EMAIL_RECEIVER
-    msg["Subject"] = "Test Email from IDS"
-    msg.attach(MIMEText("This is a test email from the Intruder Detection System.", "plain"))
-
-    try:
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            server.starttls()
-            server.login(EMAIL_SENDER, EMAIL_PASSWORD)
-            server.send_message(msg)
-            print("Test email sent successfully.")
-    except Exception as e:
-        print(f"Error sending test email: {e}")
-"""
-        with open("test_email.py", "w") as file:
-            file.write(test_script)
-
-        test_email_script = os.path.abspath("test_email.py")
-        subprocess.Popen(["python", test_email_script])
+        self.send_command("test_alert", self.describe_test, timeout=60, channel="email")
 
     def test_whatsapp(self):
         """
         Test WhatsApp notification functionality.
         """
-        test_script = """
-from twilio.rest import Client
-
-ACCOUNT_SID = ""
-AUTH_TOKEN = ""
-TWILIO_WHATSAPP_NUMBER = "whatsapp:+14155238886"
-RECIPIENT_WHATSAPP_NUMBER = "whatsapp:+91"
-
-def send_test_whatsapp_message():
-    client = Client(ACCOUNT_SID, AUTH_TOKEN)
-    try:
-        message = client.messages.create(
-            body="This is a test WhatsApp message from the Intruder Detection System.",
-            from_=TWILIO_WHATSAPP_NUMBER,
-            to=RECIPIENT_WHATSAPP_NUMBER
-        )
-        print(f"WhatsApp test message sent: {message.sid}")
-    except Exception as e:
-        print(f"Failed to send WhatsApp test message: {e}")
-
-send_test_whatsapp_message()
-"""
-        with open("test_whatsapp.py", "w") as file:
-            file.write(test_script)
-
-        test_whatsapp_script = os.path.abspath("test_whatsapp.py")
-        subprocess.Popen(["python", test_whatsapp_script])
+        self.send_command("test_alert", self.describe_test, timeout=60, channel="whatsapp")
+
+    def describe_test(self, result):
+        return "\n".join(f"Test {channel}: {'sent' if error is None else f'failed ({error})'}"
+                         for channel, error in result.items())
+
+    def show_status(self):
+        """
+        Shows the cameras, model and training state of the service.
+        """
+        def describe(status):
+            lines = [f"{name}: {camera['state']}, {camera['fps']:.1f} fps"
+                     for name, camera in status["cameras"].items()] or ["No cameras"]
+            model = status["model"]
+            if model["loaded"]:
+                lines.append(f"Model version {model['version']}, {model['users']} users")
+            else:
+                lines.append(f"Model not loaded: {model['error']}")
+            if status["training"]["running"]:
+                lines.append("Training in progress")
+            return "\n".join(lines)
+        self.send_command("status", describe, start_service=False)
 
     def view_logs(self):
         """
-        Opens the logs directory in File Explorer.
+        Opens the logs directory in the file manager.
         """
         log_dir = os.path.join(os.path.expanduser("~/Desktop"), "IDS", "logs")
         if os.path.exists(log_dir):
-            try:
-                os.startfile(log_dir)  # For Windows
-            except Exception as e:
-                self.show_message(f"Unable to open logs folder: {e}")
+            if not QDesktopServices.openUrl(QUrl.fromLocalFile(log_dir)):
+                self.show_message("Unable to open logs folder.")
         else:
             self.show_message("Logs folder does not exist.")
 
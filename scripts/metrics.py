@@ -0,0 +1,303 @@
+import bisect
+import os
+import re
+import threading
+import time
+
+# Base directories
+BASE_DIR = os.path.join(os.path.expanduser("~/Desktop"), "IDS")
+METRICS_DIR = os.path.join(BASE_DIR, "logs", "metrics")
+
+# Snapshot configuration
+METRICS_INTERVAL = float(os.getenv("IDS_METRICS_INTERVAL", "5"))  # Seconds between snapshot writes, 0 to disable
+METRICS_STALE_SECONDS = 60    # Snapshots older than this belong to a process that has exited
+
+# Histogram buckets, in seconds unless noted
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+ALERT_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+DISTANCE_BUCKETS = (10, 20, 30, 40, 50, 60, 70, 80, 100, 125, 150, 200)  # LBPH distance
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def format_labels(names, values, extra=()):
+    pairs = list(extra) + list(zip(names, values))
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class CounterValue:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name):
+        yield name, (), self.value
+
+class GaugeValue:
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name):
+        yield name, (), self.value
+
+class HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def samples(self, name):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = 0
+        for bound, count in zip(list(self.buckets) + [float("inf")], counts):
+            cumulative += count
+            yield name + "_bucket", (("le", format_value(bound)),), cumulative
+        yield name + "_sum", (), total
+        yield name + "_count", (), cumulative
+
+class Metric:
+    """
+    A named metric with optional labels. labels(*values) returns the value
+    for one combination of label values, created on first use; hot paths
+    can keep that value and skip the lookup.
+    """
+    type = None
+    suffix = ""
+
+    def __init__(self, name, help, labelnames=(), **options):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.options = options
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _new_value(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        value = self._values.get(key)
+        if value is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            with self._lock:
+                value = self._values.setdefault(key, self._new_value())
+        return value
+
+    def render(self, extra_labels=()):
+        name = self.name + self.suffix
+        lines = [f"# HELP {name} {self.help}", f"# TYPE {name} {self.type}"]
+        for key, value in sorted(self._values.items()):
+            for sample, labels, number in value.samples(name):
+                lines.append(f"{sample}{format_labels(self.labelnames, key, list(extra_labels) + list(labels))} "
+                             f"{format_value(number)}")
+        return lines
+
+class Counter(Metric):
+    type = "counter"
+    suffix = "_total"
+
+    def _new_value(self):
+        return CounterValue()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def _new_value(self):
+        return GaugeValue()
+
+    def set(self, value):
+        self.labels().set(value)
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def _new_value(self):
+        return HistogramValue(self.options.get("buckets", LATENCY_BUCKETS))
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+class Registry:
+    """
+    The metrics of one process, rendered in the Prometheus text format.
+    Registering a name twice returns the existing metric.
+    """
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, help, labelnames, **options):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help, labelnames, **options)
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter, name, help, labelnames)
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register(Gauge, name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, help, labelnames, buckets=tuple(buckets))
+
+    def render(self, extra_labels=()):
+        with self._lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render(extra_labels))
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+# Detection runtime metrics
+STAGE_SECONDS = REGISTRY.histogram(
+    "ids_stage_seconds", "Time spent in each processing stage (capture, grayscale, detect, predict, imwrite).",
+    ("stage",))
+FRAMES = REGISTRY.counter("ids_frames", "Frames processed by the detection loop.", ("camera",))
+FRAMES_CAPTURED = REGISTRY.counter("ids_frames_captured", "Frames read from cameras.")
+CAPTURE_LATENCY = REGISTRY.histogram("ids_capture_to_decision_seconds",
+                                     "Time from a frame's capture to the detector's decision on it.")
+CAPTURE_RECONNECTS = REGISTRY.counter("ids_capture_reconnects", "Capture sources reopened after a failure.",
+                                      ("source",))
+QUEUE_DEPTH = REGISTRY.gauge("ids_queue_depth", "Items waiting in a pipeline queue.", ("camera", "queue"))
+QUEUE_DROPPED = REGISTRY.counter("ids_queue_dropped", "Items dropped from a full pipeline queue.", ("camera", "queue"))
+RECOGNITIONS = REGISTRY.counter("ids_recognitions", "Faces classified by the recognizer.", ("result",))
+RECOGNITION_DISTANCE = REGISTRY.histogram(
+    "ids_recognition_distance", "LBPH distance of each recognition; lower is a closer match.",
+    buckets=DISTANCE_BUCKETS)
+INTRUDER_ALERTS = REGISTRY.counter("ids_intruder_alerts", "Intruder alerts raised after the cooldown.")
+ALERT_SEND_SECONDS = REGISTRY.histogram("ids_alert_send_seconds", "Time to deliver one alert batch.", ("channel",))
+ALERT_LATENCY = REGISTRY.histogram(
+    "ids_alert_latency_seconds", "Time from an alert being raised to its delivery.", ("channel",),
+    buckets=ALERT_BUCKETS)
+ALERT_DELIVERIES = REGISTRY.counter("ids_alert_deliveries", "Alert batch deliveries by outcome.",
+                                    ("channel", "result"))
+
+class Timer:
+    """
+    Observes the time spent in a with-block on a histogram value.
+    """
+    def __init__(self, histogram_value):
+        self.histogram_value = histogram_value
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram_value.observe(time.perf_counter() - self.start)
+
+def stage_timer(stage):
+    return Timer(STAGE_SECONDS.labels(stage))
+
+# Snapshots shared with the log server
+class MetricsWriter:
+    """
+    Writes this process's metrics to METRICS_DIR/<process>.prom every
+    interval, tagged with a process label. Detection runs in processes of
+    its own, so the log server serves the merged snapshots rather than
+    scraping each one.
+    """
+    def __init__(self, process, directory=METRICS_DIR, interval=METRICS_INTERVAL, registry=REGISTRY):
+        self.process = re.sub(r"[^A-Za-z0-9_.-]+", "-", str(process))
+        self.path = os.path.join(directory, f"{self.process}.prom")
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as file:
+            file.write(self.registry.render((("process", self.process),)))
+        os.replace(tmp_path, self.path)
+
+    def start(self):
+        if self.interval <= 0:
+            return self
+
+        def run():
+            while not self._stop.wait(self.interval):
+                try:
+                    self.write()
+                except OSError as e:
+                    print(f"Could not write metrics to {self.path}: {e}")
+        self._thread = threading.Thread(target=run, name="metrics-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops writing and removes the snapshot, so an exited process does
+        not keep reporting.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+def merge_snapshots(directory=METRICS_DIR, max_age=METRICS_STALE_SECONDS):
+    """
+    Combines the recent snapshots of every process into one exposition,
+    with each metric's HELP and TYPE given once.
+    """
+    families = {}
+    now = time.time()
+    if os.path.isdir(directory):
+        for filename in sorted(os.listdir(directory)):
+            path = os.path.join(directory, filename)
+            if not filename.endswith(".prom"):
+                continue
+            try:
+                if now - os.path.getmtime(path) > max_age:
+                    continue
+                with open(path, "r") as file:
+                    lines = file.read().splitlines()
+            except OSError:
+                continue
+            family = None
+            for line in lines:
+                if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                    family = families.setdefault(line.split(" ", 3)[2], {"header": [], "samples": []})
+                    if len(family["header"]) < 2:
+                        family["header"].append(line)
+                elif line and family is not None:
+                    family["samples"].append(line)
+    lines = []
+    for family in families.values():
+        lines.extend(family["header"])
+        lines.extend(family["samples"])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,274 @@
+import json
+import os
+import threading
+import time
+import numpy as np
+
+# Base directories
+BASE_DIR = os.path.join(os.path.expanduser("~/Desktop"), "IDS")
+MODEL_PATH = os.path.join(BASE_DIR, "face_model.yml")
+HISTOGRAMS_PATH = os.path.join(BASE_DIR, "face_model.npz")  # Binary copy of the model for fast loading
+LABEL_MAPPING_PATH = os.path.join(BASE_DIR, "label_mapping.json")
+MANIFEST_PATH = os.path.join(BASE_DIR, "training_manifest.json")
+THRESHOLD_PATH = os.path.join(BASE_DIR, "face_model_threshold.json")  # Written by evaluate_model.py
+
+# Reload configuration
+MODEL_RELOAD_INTERVAL = float(os.getenv("IDS_MODEL_RELOAD_INTERVAL", "2"))  # Seconds between checks, 0 to disable
+
+def file_signature(path):
+    """
+    Returns (mtime in ns, size) of a file, or None if it does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def save_histograms(recognizer, model_signature, histograms_path=HISTOGRAMS_PATH):
+    """
+    Writes a trained LBPH model's histograms, labels and parameters as a
+    binary copy, tagged with the signature of the model file they match.
+    """
+    histograms = recognizer.getHistograms()
+    tmp_path = histograms_path + ".part.npz"
+    np.savez(
+        tmp_path,
+        histograms=np.vstack([h.reshape(1, -1) for h in histograms]) if len(histograms) else np.empty((0, 0), np.float32),
+        labels=np.asarray(recognizer.getLabels(), dtype=np.int32).ravel(),
+        params=np.array([recognizer.getRadius(), recognizer.getNeighbors(),
+                         recognizer.getGridX(), recognizer.getGridY()], dtype=np.int64),
+        model_signature=np.array(model_signature, dtype=np.int64),
+    )
+    os.replace(tmp_path, histograms_path)
+
+def save_model(recognizer, model_path=MODEL_PATH, histograms_path=HISTOGRAMS_PATH):
+    """
+    Saves a trained LBPH model and its binary copy. The model is written
+    to a temporary file first and the copy records that file's signature,
+    which the rename keeps, so a reader never sees a half-written model
+    and can always tell whether the two files belong together.
+    """
+    root, extension = os.path.splitext(model_path)
+    tmp_model = f"{root}.part{extension}"
+    recognizer.save(tmp_model)
+    save_histograms(recognizer, file_signature(tmp_model), histograms_path)
+    os.replace(tmp_model, model_path)
+
+def load_calibration(threshold_path=THRESHOLD_PATH):
+    """
+    Returns the calibrated recognition threshold record, or None if the
+    model has not been evaluated or was evaluated with different face
+    normalization settings, whose distances are on another scale.
+    """
+    from face_utils import preprocessing_settings
+
+    if not os.path.exists(threshold_path):
+        return None
+    try:
+        with open(threshold_path, "r") as file:
+            calibration = json.load(file)
+        float(calibration["threshold"])
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Ignoring unreadable threshold file {threshold_path}: {e}")
+        return None
+    if calibration.get("preprocessing") != preprocessing_settings():
+        print(f"Ignoring the threshold in {threshold_path}: it was calibrated with face normalization "
+              f"{calibration.get('preprocessing')}, not {preprocessing_settings()}. Run evaluate_model.py again.")
+        return None
+    return calibration
+
+class RecognitionModel:
+    """
+    One loaded version of the model: the recognition engine, the label
+    names and the calibrated threshold (None if not evaluated) that go
+    with it. Never modified once built, so a frame that took a reference
+    keeps a consistent model even if a reload happens.
+    """
+    def __init__(self, engine, labels, signature, source, load_seconds, detector=None, calibration=None):
+        self.engine = engine
+        self.labels = labels
+        self.signature = signature
+        self.source = source
+        self.load_seconds = load_seconds
+        self.detector = detector
+        self.calibration = calibration
+        self.threshold = float(calibration["threshold"]) if calibration else None
+        self.loaded_at = time.time()
+        self.version = 0
+
+    def label_name(self, label):
+        return self.labels.get(str(label), "Unknown")
+
+def load_model(engine=None, model_path=MODEL_PATH, histograms_path=HISTOGRAMS_PATH,
+               label_path=LABEL_MAPPING_PATH, manifest_path=MANIFEST_PATH, threshold_path=THRESHOLD_PATH):
+    """
+    Loads the model, label mapping and threshold. The batched engine reads
+    the binary histogram copy when it matches the model file, and only
+    parses the YAML model (writing a fresh copy for next time) when it
+    does not.
+    """
+    from recognition import RECOGNITION_ENGINE, BatchRecognizer, create_engine
+
+    engine = engine or RECOGNITION_ENGINE
+    start = time.perf_counter()
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model file not found: {model_path}")
+    if not os.path.exists(label_path):
+        raise FileNotFoundError(f"Label mapping file not found: {label_path}")
+    signature = (file_signature(model_path), file_signature(label_path), file_signature(threshold_path))
+
+    with open(label_path, "r") as file:
+        labels = json.load(file)
+    detector = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as file:
+            detector = json.load(file).get("detector")
+
+    recognition_engine = None
+    source = "yml"
+    if engine != "opencv" and os.path.exists(histograms_path):
+        with np.load(histograms_path) as data:
+            if tuple(data["model_signature"]) == signature[0]:
+                radius, neighbors, grid_x, grid_y = (int(v) for v in data["params"])
+                recognition_engine = BatchRecognizer(data["histograms"], data["labels"],
+                                                     radius, neighbors, grid_x, grid_y)
+                source = "npz"
+
+    if recognition_engine is None:
+        import cv2
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.read(model_path)
+        recognition_engine = create_engine(recognizer, engine)
+        # Only tag the copy if the model was not replaced while it was being read
+        if engine != "opencv" and file_signature(model_path) == signature[0]:
+            try:
+                save_histograms(recognizer, signature[0], histograms_path)
+            except OSError as e:
+                print(f"Could not write {histograms_path}: {e}")
+    return RecognitionModel(recognition_engine, labels, signature, source,
+                            time.perf_counter() - start, detector, load_calibration(threshold_path))
+
+class ModelStore:
+    """
+    Holds the current model. It is loaded on first use rather than at
+    import, can be preloaded on a background thread while the camera
+    opens, and is swapped for a new version when training rewrites the
+    model files or evaluation writes a new threshold. Reloads happen on
+    the watcher thread and replace the model with a single reference
+    assignment, so detection keeps running on the old model until the new
+    one is fully loaded.
+    """
+    def __init__(self, model_path=MODEL_PATH, histograms_path=HISTOGRAMS_PATH, label_path=LABEL_MAPPING_PATH,
+                 threshold_path=THRESHOLD_PATH):
+        self.model_path = model_path
+        self.histograms_path = histograms_path
+        self.label_path = label_path
+        self.threshold_path = threshold_path
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._pending_signature = None
+        self._watcher = None
+        self._stop = threading.Event()
+        self.version = 0
+        self.reloads = 0
+
+    def _signature(self):
+        return (file_signature(self.model_path), file_signature(self.label_path),
+                file_signature(self.threshold_path))
+
+    def _load(self):
+        model = load_model(model_path=self.model_path, histograms_path=self.histograms_path,
+                           label_path=self.label_path, threshold_path=self.threshold_path)
+        self.version += 1
+        model.version = self.version
+        self._model = model
+        return model
+
+    def get(self):
+        """
+        Returns the current model, loading it on first use.
+        """
+        model = self._model
+        if model is not None:
+            return model
+        with self._load_lock:
+            if self._model is None:
+                self._load()
+            return self._model
+
+    def preload(self):
+        """
+        Starts loading the model in the background. Errors surface on the
+        first get().
+        """
+        def run():
+            try:
+                self.get()
+            except Exception:
+                pass
+        threading.Thread(target=run, name="model-preload", daemon=True).start()
+
+    def reload_if_changed(self):
+        """
+        Loads and swaps in a new model if the model, label or threshold
+        files changed and have been stable since the previous check. The
+        threshold file is optional. Returns True if a new
+        model was swapped in.
+        """
+        if self._model is None:
+            return False
+        signature = self._signature()
+        if signature == self._model.signature or None in signature[:2]:
+            self._pending_signature = None
+            return False
+        # Wait one more interval so a training run has finished writing every file
+        if signature != self._pending_signature:
+            self._pending_signature = signature
+            return False
+        self._pending_signature = None
+        return self.reload() is not None
+
+    def reload(self):
+        """
+        Loads the model files now and swaps them in. Returns the new model,
+        or None if loading failed and the current model was kept.
+        """
+        with self._load_lock:
+            try:
+                model = self._load()
+            except Exception as e:
+                print(f"Model reload failed, keeping the current model: {e}")
+                return None
+        self.reloads += 1
+        print(f"Reloaded model (version {model.version}, {len(model.labels)} users, "
+              f"{model.load_seconds:.2f}s from {model.source}).")
+        return model
+
+    def watch(self, interval=MODEL_RELOAD_INTERVAL):
+        """
+        Checks for a retrained model every `interval` seconds on a daemon
+        thread.
+        """
+        if interval <= 0 or self._watcher is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                self.reload_if_changed()
+        self._watcher = threading.Thread(target=run, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+
+# Process-wide store
+_store = None
+_store_lock = threading.Lock()
+
+def get_model_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ModelStore()
+        return _store
@@ -0,0 +1,122 @@
+import os
+import time
+import cv2
+import numpy as np
+
+# Motion gate configuration
+MOTION_GATE = os.getenv("IDS_MOTION_GATE", "0") == "1"
+MOTION_THRESHOLD = int(os.getenv("IDS_MOTION_THRESHOLD", "25"))        # Per-pixel intensity change
+MOTION_MIN_AREA = float(os.getenv("IDS_MOTION_MIN_AREA", "0.002"))     # Fraction of ROI that must change
+MOTION_ROI = os.getenv("IDS_MOTION_ROI", "")  # "x,y,w,h" as fractions of the frame, empty for full frame
+MOTION_WIDTH = 160            # Width of the downscaled frame used for differencing
+BACKGROUND_ALPHA = 0.05       # Background model learning rate
+MOTION_PADDING = 0.25         # Growth of the motion box, as a fraction of its size
+
+def parse_roi(value):
+    """
+    Parses an "x,y,w,h" string of frame fractions into a tuple.
+    """
+    if not value:
+        return None
+    x, y, w, h = (float(v) for v in value.split(","))
+    return (x, y, w, h)
+
+class MotionGate:
+    """
+    Cheap activity check in front of face detection. Frames are downscaled,
+    compared against a running-average background, and only frames (and the
+    region of them) with enough changed pixels are passed on.
+    """
+    def __init__(self, threshold=MOTION_THRESHOLD, min_area=MOTION_MIN_AREA,
+                 roi=None, width=MOTION_WIDTH, alpha=BACKGROUND_ALPHA):
+        self.threshold = threshold
+        self.min_area = min_area
+        self.roi = roi if roi is not None else parse_roi(MOTION_ROI)
+        self.width = width
+        self.alpha = alpha
+        self.background = None
+        self.frames = 0
+        self.skipped = 0
+        self.gate_cpu = 0.0
+        self.work_cpu = 0.0
+        self.work_frames = 0
+
+    def _roi_slice(self, shape):
+        if self.roi is None:
+            return slice(None), slice(None)
+        h, w = shape
+        x, y, rw, rh = self.roi
+        return (slice(int(y * h), max(int((y + rh) * h), int(y * h) + 1)),
+                slice(int(x * w), max(int((x + rw) * w), int(x * w) + 1)))
+
+    def check(self, gray):
+        """
+        Returns the (x, y, w, h) region of the full-resolution frame that
+        contains motion, or None if the frame can be skipped.
+        """
+        start = time.process_time()
+        self.frames += 1
+        full_h, full_w = gray.shape[:2]
+        scale = self.width / full_w
+        small = cv2.resize(gray, (self.width, max(int(full_h * scale), 1)), interpolation=cv2.INTER_AREA)
+        small = cv2.GaussianBlur(small, (5, 5), 0)
+
+        if self.background is None:
+            self.background = small.astype(np.float32)
+            self.gate_cpu += time.process_time() - start
+            return (0, 0, full_w, full_h)
+
+        diff = cv2.absdiff(small, cv2.convertScaleAbs(self.background))
+        cv2.accumulateWeighted(small, self.background, self.alpha)
+
+        mask = np.zeros(diff.shape, dtype=bool)
+        rows, cols = self._roi_slice(diff.shape)
+        mask[rows, cols] = diff[rows, cols] > self.threshold
+        roi_pixels = max(mask[rows, cols].size, 1)
+        changed = np.count_nonzero(mask)
+
+        if changed / roi_pixels < self.min_area:
+            self.skipped += 1
+            self.gate_cpu += time.process_time() - start
+            return None
+
+        ys, xs = np.nonzero(mask)
+        x0, x1 = xs.min() / scale, (xs.max() + 1) / scale
+        y0, y1 = ys.min() / scale, (ys.max() + 1) / scale
+        pad_x, pad_y = (x1 - x0) * MOTION_PADDING, (y1 - y0) * MOTION_PADDING
+        x0, y0 = max(int(x0 - pad_x), 0), max(int(y0 - pad_y), 0)
+        x1, y1 = min(int(x1 + pad_x), full_w), min(int(y1 + pad_y), full_h)
+        self.gate_cpu += time.process_time() - start
+        return (x0, y0, x1 - x0, y1 - y0)
+
+    def record_work(self, cpu_seconds):
+        """
+        Records the CPU time detection and recognition took on a frame that
+        passed the gate, used to estimate the time saved on skipped frames.
+        """
+        self.work_cpu += cpu_seconds
+        self.work_frames += 1
+
+    def stats(self):
+        avg_work = self.work_cpu / self.work_frames if self.work_frames else 0.0
+        saved = self.skipped * avg_work - self.gate_cpu
+        return {
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "skipped_fraction": self.skipped / self.frames if self.frames else 0.0,
+            "gate_cpu_seconds": self.gate_cpu,
+            "cpu_seconds_saved": saved,
+        }
+
+    def format_stats(self):
+        s = self.stats()
+        return (f"skipped {s['skipped']}/{s['frames']} frames ({s['skipped_fraction']:.0%}), "
+                f"~{s['cpu_seconds_saved']:.1f}s CPU saved (gate cost {s['gate_cpu_seconds']:.1f}s)")
+
+def union_box(a, b):
+    """
+    Returns the smallest (x, y, w, h) box covering both boxes.
+    """
+    x0, y0 = min(a[0], b[0]), min(a[1], b[1])
+    x1, y1 = max(a[0] + a[2], b[0] + b[2]), max(a[1] + a[3], b[1] + b[3])
+    return (x0, y0, x1 - x0, y1 - y0)
@@ -0,0 +1,331 @@
+import argparse
+import functools
+import multiprocessing
+import os
+import queue
+import time
+
+# Engine configuration
+STATS_INTERVAL = 1.0  # Seconds between worker throughput reports
+
+def assign_sources(sources, workers):
+    """
+    Spreads sources round-robin over the workers.
+    """
+    return [sources[i::workers] for i in range(workers) if sources[i::workers]]
+
+class SharedCooldown:
+    """
+    A worker's alert cooldowns. Intruders matched to an unknown identity
+    use the cooldowns of the shared unknown face index, so a stranger seen
+    by several workers raises one alert; a running cooldown is remembered
+    locally so the index is only asked again once it has ended. Faces
+    without an identity use the worker's own cooldowns.
+    """
+    def __init__(self, unknown_index):
+        self.unknown_index = unknown_index
+        self.until = {}  # Identity key -> end of its cooldown, as last reported by the index
+
+    def should_alert(self, face_id, identity):
+        import intruder_detection as detection
+        if identity is None or self.unknown_index is None:
+            return detection.should_alert(*detection.alert_key(face_id, identity))
+        if time.time() < self.until.get(identity, 0.0):
+            return False
+        allowed, self.until[identity] = self.unknown_index.should_alert(identity)
+        if allowed:
+            detection.INTRUDER_ALERTS.inc()
+        return allowed
+
+# Worker process
+def camera_worker(worker_id, sources, event_queue, stop_event, motion_gate, unknown_index=None):
+    """
+    Runs detection for a group of sources in one process. The model loads
+    in the background while the sources open, is shared by every source
+    the worker handles, and is reloaded when retrained. Sources are read
+    round-robin, the faces of each round are recognized in one batch, and
+    every event is forwarded to the parent's queue. A camera that drops
+    out is skipped while it reconnects; a file source ends when exhausted.
+    Unknown faces are grouped in the engine's shared unknown_index, so a
+    stranger is one identity, with one alert cooldown, across all cameras.
+    """
+    import cv2
+    # One core per worker; OpenCV's own threads would compete with the other workers
+    cv2.setNumThreads(1)
+    import intruder_detection as detection
+    from capture_source import create_source
+    from clip_recorder import CLIP_RECORDING, ClipRecorder
+    from load_controller import LOAD_CONTROL, LoadController
+    from metrics import CAPTURE_LATENCY, MetricsWriter
+    from model_store import get_model_store
+    from motion import MotionGate
+    from pipeline import SINK_QUEUE_SIZE, BlockingQueue, SinkWorker
+
+    store = get_model_store()
+    store.preload()
+    metrics_writer = MetricsWriter(f"worker-{worker_id}").start()
+    # Image writes run on a sink thread so they never stall detection
+    sink = SinkWorker(BlockingQueue("sink", SINK_QUEUE_SIZE, f"worker-{worker_id}"))
+    sink.start()
+    cooldown = SharedCooldown(unknown_index)
+
+    def forward_intruder(event, frame):
+        event["image_path"] = detection.save_intruder_image(frame, face_id=event["face_id"])
+        event_queue.put(event)
+
+    def on_intruder(camera, recorder, face_id, track, frame):
+        if cooldown.should_alert(face_id, track.unknown_id):
+            if recorder is not None:
+                recorder.trigger(face_id=face_id, track_id=track.track_id, confidence=track.confidence,
+                                 identity=track.unknown_id)
+            sink.submit(forward_intruder, {
+                "type": "intruder",
+                "camera": str(camera),
+                "face_id": face_id,
+                "identity": track.unknown_id,
+                "confidence": track.confidence,
+                "time": time.time(),
+                "track_id": track.track_id,
+            }, frame.copy())
+
+    def on_recognition(camera, face_id, track):
+        recognized = track.confidence < detection.recognition_threshold(store.get())
+        event_queue.put({
+            "type": "recognition",
+            "camera": str(camera),
+            "face_id": face_id,
+            "user": track.name if recognized else None,
+            "confidence": track.confidence,
+            "time": time.time(),
+        })
+
+    def on_clip(camera, path, clip):
+        event_queue.put({
+            "type": "recording",
+            "camera": str(camera),
+            "path": path,
+            "track_id": clip.details.get("track_id"),
+            "confidence": clip.details.get("confidence"),
+            "identity": clip.details.get("identity"),
+            "time": clip.trigger_ts,
+        })
+
+    # The worker's cameras share a detector and a core, so they share one controller
+    load_controller = LoadController(name=f"worker-{worker_id}") if LOAD_CONTROL else None
+    streams = []
+    for camera in sources:
+        capture = create_source(camera)
+        if not capture.open():
+            event_queue.put({"type": "error", "camera": str(camera), "message": "Unable to open source"})
+            continue
+        recorder = ClipRecorder(camera=str(camera), on_clip=functools.partial(on_clip, camera)) if CLIP_RECORDING else None
+        stage = detection.DetectionStage(
+            motion_gate=MotionGate() if motion_gate else None,
+            camera=str(camera),
+            on_intruder=functools.partial(on_intruder, camera, recorder),
+            on_recognition=functools.partial(on_recognition, camera),
+            clip_recorder=recorder,
+            unknown_index=unknown_index,
+            load_controller=load_controller,
+        )
+        streams.append((camera, capture, stage))
+
+    try:
+        detection.get_model()
+    except FileNotFoundError as e:
+        event_queue.put({"type": "error", "camera": None, "message": str(e)})
+        streams = []
+    store.watch()
+
+    frames = 0
+    start = last_stats = time.time()
+    cpu_start = time.process_time()
+    while streams and not stop_event.is_set():
+        # One frame from every source, recognized in a single batch
+        batch, captured_at = [], []
+        for stream in list(streams):
+            camera, capture, stage = stream
+            captured = capture.read()
+            if captured is None:
+                if not capture.ended:
+                    continue  # Reconnecting; the other sources carry on
+                capture.release()
+                if stage.clip_recorder is not None:
+                    stage.clip_recorder.stop()
+                streams.remove(stream)
+                event_queue.put({"type": "source_ended", "camera": str(camera)})
+                continue
+            frame, ts = captured
+            batch.append((stage, frame))
+            captured_at.append(ts)
+        if not batch:
+            if streams:
+                stop_event.wait(min(max(capture.retry_in(), 0.01) for _, capture, _ in streams))
+            continue
+        detection.process_frames(batch)
+        decided = time.monotonic()
+        for ts in captured_at:
+            CAPTURE_LATENCY.observe(decided - ts)
+        for stage, frame in batch:
+            if stage.clip_recorder is not None:
+                stage.clip_recorder.add_frame(frame)
+        frames += len(batch)
+
+        if time.time() - last_stats >= STATS_INTERVAL:
+            last_stats = time.time()
+            event_queue.put({"type": "stats", "worker": worker_id, "frames": frames,
+                             "elapsed": last_stats - start, "cpu": time.process_time() - cpu_start})
+
+    for camera, capture, stage in streams:
+        capture.release()
+        if stage.clip_recorder is not None:
+            stage.clip_recorder.stop()
+    sink.stop()
+    sink.join(timeout=10)
+    metrics_writer.stop()
+    event_queue.put({"type": "worker_done", "worker": worker_id, "frames": frames,
+                     "elapsed": time.time() - start, "cpu": time.process_time() - cpu_start})
+
+class MultiCameraEngine:
+    """
+    Distributes camera indices, RTSP URLs or video files over a pool of
+    worker processes (one per core by default) and merges their events
+    into a single stream. The workers share one unknown face index, run by
+    a manager process and saved under a fixed name, so identities hold
+    across workers and across changes to the camera list.
+    """
+    def __init__(self, sources, workers=None, motion_gate=False):
+        self.sources = [str(source) for source in sources]
+        self.workers = min(workers or os.cpu_count() or 1, len(self.sources))
+        self.motion_gate = motion_gate
+        self.processes = []
+        self.worker_frames = {}
+        self.started_at = None
+        self.finished_at = None
+        context = multiprocessing.get_context("spawn")
+        self.context = context
+        self.event_queue = context.Queue()
+        self.stop_event = context.Event()
+        self.index_manager = None
+        self.unknown_index = None
+
+    def start(self):
+        from unknown_index import UNKNOWN_INDEX, UnknownIndexManager
+        self.started_at = time.time()
+        if UNKNOWN_INDEX:
+            self.index_manager = UnknownIndexManager(ctx=self.context)
+            self.index_manager.start()
+            self.unknown_index = self.index_manager.get_unknown_index("multi-camera")
+        for worker_id, group in enumerate(assign_sources(self.sources, self.workers)):
+            process = self.context.Process(
+                target=camera_worker,
+                args=(worker_id, group, self.event_queue, self.stop_event, self.motion_gate, self.unknown_index),
+                name=f"camera-worker-{worker_id}",
+                daemon=True,
+            )
+            process.start()
+            self.processes.append(process)
+        return self
+
+    def events(self):
+        """
+        Yields events from all workers until every worker has finished.
+        """
+        running = len(self.processes)
+        while running:
+            try:
+                event = self.event_queue.get(timeout=1)
+            except queue.Empty:
+                if not any(process.is_alive() for process in self.processes):
+                    break
+                continue
+            if event["type"] in ("stats", "worker_done"):
+                self.worker_frames[event["worker"]] = event["frames"]
+            if event["type"] == "worker_done":
+                running -= 1
+            yield event
+        self.finished_at = time.time()
+
+    def stop(self):
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout=5)
+        if self.index_manager is not None:
+            self.unknown_index.stop()  # Saves the index
+            self.index_manager.shutdown()
+            self.index_manager = None
+
+    def throughput(self):
+        """
+        Returns aggregate frames/sec and frames/sec per worker core.
+        """
+        elapsed = max((self.finished_at or time.time()) - (self.started_at or time.time()), 1e-6)
+        total = sum(self.worker_frames.values())
+        return {
+            "workers": self.workers,
+            "frames": total,
+            "elapsed": elapsed,
+            "fps": total / elapsed,
+            "fps_per_core": total / elapsed / max(self.workers, 1),
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Run intruder detection on several cameras or video files.")
+    parser.add_argument("sources", nargs="+", help="Camera indices, RTSP URLs or video files")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--motion-gate", action="store_true", help="Skip detection on static frames")
+    parser.add_argument("--no-alerts", action="store_true", help="Log intruders without sending alerts")
+    args = parser.parse_args()
+
+    engine = MultiCameraEngine(args.sources, workers=args.workers, motion_gate=args.motion_gate).start()
+    print(f"Started {engine.workers} worker(s) for {len(engine.sources)} source(s). Press Ctrl+C to stop.")
+    from event_store import get_event_store
+    from metrics import MetricsWriter
+    from structured_log import log_event
+    store = get_event_store()
+    # Alerts are delivered from this process
+    metrics_writer = MetricsWriter("multi-camera").start()
+    dispatcher = None
+    if not args.no_alerts:
+        from alerts import get_dispatcher
+        dispatcher = get_dispatcher()
+
+    try:
+        for event in engine.events():
+            if event["type"] == "intruder":
+                print(f"Intruder detected! Camera {event['camera']}, Face ID: {event['face_id']}")
+                store.add_event("image", event["image_path"], camera=event["camera"],
+                                track_id=event["track_id"], label="intruder",
+                                confidence=event["confidence"], ts=event["time"], identity=event["identity"])
+                if dispatcher is not None:
+                    dispatcher.submit(
+                        subject=f"Intruder Alert: Camera {event['camera']}",
+                        body=f"An unauthorized person has been detected on camera {event['camera']} "
+                             f"(Face ID {event['face_id']}). See the attached image for details.",
+                        image_path=event["image_path"],
+                    )
+            elif event["type"] == "recording":
+                print(f"Saved clip from camera {event['camera']}: {os.path.basename(event['path'])}")
+                store.add_event("recording", event["path"], camera=event["camera"],
+                                track_id=event["track_id"], label="intruder",
+                                confidence=event["confidence"], ts=event["time"], identity=event["identity"])
+            elif event["type"] == "recognition" and event["user"]:
+                log_event("face recognized", key=("recognized", event["face_id"]), user=event["user"],
+                          camera=event["camera"], face_id=event["face_id"], confidence=event["confidence"])
+            elif event["type"] in ("error", "source_ended"):
+                print(f"Camera {event['camera']}: {event.get('message', 'source ended')}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.stop()
+        metrics_writer.stop()
+        if dispatcher is not None:
+            from alerts import shutdown_dispatcher
+            shutdown_dispatcher()
+
+    t = engine.throughput()
+    print(f"Processed {t['frames']} frames in {t['elapsed']:.1f}s with {t['workers']} worker(s): "
+          f"{t['fps']:.1f} fps total, {t['fps_per_core']:.1f} fps per core")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import argparse
+import json
+import re
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+FIRST_SCREEN_IMAGES = 12  # Previews visible before scrolling
+BROWSER_CONNECTIONS = 6   # Parallel requests a browser makes per host
+
+def fetch(url, headers=None):
+    """
+    Returns (status, body size, seconds, response headers) for a GET.
+    """
+    request = urllib.request.Request(url, headers=headers or {})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request) as response:
+            body = response.read()
+            return response.status, len(body), time.perf_counter() - start, dict(response.headers)
+    except urllib.error.HTTPError as e:
+        return e.code, 0, time.perf_counter() - start, dict(e.headers)
+
+def fetch_all(urls, headers_for=None):
+    with ThreadPoolExecutor(max_workers=BROWSER_CONNECTIONS) as executor:
+        return list(executor.map(lambda url: fetch(url, headers_for(url) if headers_for else None), urls))
+
+def seed_events(count):
+    """
+    Writes synthetic intruder images and events so there is a full page to
+    measure. Seeded files are named intruder_seed_*.jpg.
+    """
+    import cv2
+    import numpy as np
+    import os
+    from event_store import INTRUDER_IMAGES_DIR, get_event_store
+
+    os.makedirs(INTRUDER_IMAGES_DIR, exist_ok=True)
+    store = get_event_store()
+    rng = np.random.default_rng(0)
+    base = (rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8) // 4 + 96).astype(np.uint8)
+    now = time.time()
+    for i in range(count):
+        path = os.path.join(INTRUDER_IMAGES_DIR, f"intruder_seed_{i:06d}.jpg")
+        frame = base.copy()
+        cv2.putText(frame, f"seed {i}", (50, 360), cv2.FONT_HERSHEY_SIMPLEX, 4, (255, 255, 255), 8)
+        cv2.imwrite(path, frame)
+        store.add_event("image", path, camera="seed", track_id=i, label="intruder",
+                        confidence=99.0, ts=now - i)
+
+def measure(server, limit):
+    page_url = f"{server.rstrip('/')}/?limit={limit}"
+    status, html_bytes, html_seconds, _ = fetch(page_url)
+    if status != 200:
+        raise SystemExit(f"{page_url} returned {status}")
+    html = urllib.request.urlopen(page_url).read().decode()
+    thumbs = [server.rstrip("/") + src for src in re.findall(r'<img src="([^"]+)"', html)]
+    fulls = [server.rstrip("/") + href for href in re.findall(r'href="(/view/images/[^"]+)"', html)]
+    fulls = list(dict.fromkeys(fulls))
+
+    # Cold: thumbnails generated on demand
+    start = time.perf_counter()
+    first_screen = fetch_all(thumbs[:FIRST_SCREEN_IMAGES])
+    first_render_cold = html_seconds + (time.perf_counter() - start)
+    rest = fetch_all(thumbs[FIRST_SCREEN_IMAGES:])
+    cold = first_screen + rest
+
+    # Warm: thumbnails served from the disk cache
+    start = time.perf_counter()
+    fetch_all(thumbs[:FIRST_SCREEN_IMAGES])
+    first_render_warm = html_seconds + (time.perf_counter() - start)
+
+    # Revalidation: what a returning browser sends once max-age has passed
+    etags = {url: result[3].get("ETag") for url, result in zip(thumbs, cold)}
+    revalidated = fetch_all(thumbs, lambda url: {"If-None-Match": etags[url]} if etags.get(url) else {})
+
+    # Before: previewing meant opening the full-resolution images
+    start = time.perf_counter()
+    full_first_screen = fetch_all(fulls[:FIRST_SCREEN_IMAGES])
+    first_render_full = html_seconds + (time.perf_counter() - start)
+    full_rest = fetch_all(fulls[FIRST_SCREEN_IMAGES:])
+
+    return {
+        "events_on_page": len(fulls),
+        "html_bytes": html_bytes,
+        "html_ms": html_seconds * 1000,
+        "before": {
+            "page_weight_bytes": html_bytes + sum(r[1] for r in full_first_screen + full_rest),
+            "first_screen_render_ms": first_render_full * 1000,
+        },
+        "after": {
+            "page_weight_bytes": html_bytes + sum(r[1] for r in cold),
+            "first_screen_render_cold_ms": first_render_cold * 1000,
+            "first_screen_render_warm_ms": first_render_warm * 1000,
+            "revalidated_not_modified": sum(1 for r in revalidated if r[0] == 304),
+            "thumbnail_cache_control": cold[0][3].get("Cache-Control") if cold else None,
+        },
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure log page weight and time to first render.")
+    parser.add_argument("--server", default="http://localhost:5000")
+    parser.add_argument("--limit", type=int, default=1000, help="Events on the measured page")
+    parser.add_argument("--seed", type=int, default=0, help="First write this many synthetic events")
+    args = parser.parse_args()
+    if args.seed:
+        seed_events(args.seed)
+    print(json.dumps(measure(args.server, args.limit), indent=2))
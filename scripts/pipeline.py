@@ -0,0 +1,281 @@
+import collections
+import threading
+import time
+from metrics import CAPTURE_LATENCY, FRAMES_CAPTURED, QUEUE_DEPTH, QUEUE_DROPPED, stage_timer
+
+# Default queue sizes for each stage
+FRAME_QUEUE_SIZE = 1    # Latest-frame slot: detection always gets the freshest frame
+SINK_QUEUE_SIZE = 32    # Pending save/alert jobs; detection waits when full, nothing is dropped
+
+# Bounded queue that drops the oldest item when full
+class DropOldestQueue:
+    """
+    Thread-safe bounded queue. When full, the oldest item is discarded so
+    producers never block and consumers always see the most recent data.
+    Metrics are labelled with the camera, so the queues of several cameras
+    in one process are told apart.
+    """
+    def __init__(self, name, maxsize, camera=None):
+        self.name = name
+        self.maxsize = maxsize
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        self.put_count = 0
+        self.dropped = 0
+        self.max_depth = 0
+        camera = str(camera) if camera is not None else "local"
+        self._depth_metric = QUEUE_DEPTH.labels(camera, name)
+        self._dropped_metric = QUEUE_DROPPED.labels(camera, name)
+
+    def put(self, item):
+        """
+        Adds an item, dropping the oldest one if the queue is full.
+        """
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+                self._dropped_metric.inc()
+            self._items.append(item)
+            self.put_count += 1
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._depth_metric.set(len(self._items))
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """
+        Removes and returns the oldest item, or None if the timeout expires.
+        """
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._depth_metric.set(len(self._items))
+            return item
+
+    def drop_oldest(self):
+        """
+        Discards and returns the oldest item, or None if the queue is empty,
+        e.g. to keep the queued items within a memory budget.
+        """
+        with self._cond:
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self.dropped += 1
+            self._dropped_metric.inc()
+            self._depth_metric.set(len(self._items))
+            return item
+
+    def depth(self):
+        with self._cond:
+            return len(self._items)
+
+    def stats(self):
+        """
+        Returns the queue depth and back-pressure counters.
+        """
+        with self._cond:
+            return {
+                "depth": len(self._items),
+                "max_depth": self.max_depth,
+                "maxsize": self.maxsize,
+                "put": self.put_count,
+                "dropped": self.dropped,
+            }
+
+# Bounded queue that makes producers wait when full
+class BlockingQueue(DropOldestQueue):
+    """
+    Thread-safe bounded queue for jobs that must not be lost, such as
+    intruder images and alerts. When full, put() waits for room instead of
+    dropping anything; the number of puts that had to wait is counted as
+    back-pressure.
+    """
+    def __init__(self, name, maxsize, camera=None):
+        super().__init__(name, maxsize, camera)
+        self.waited = 0
+
+    def put(self, item):
+        """
+        Adds an item, waiting while the queue is full.
+        """
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self.waited += 1
+                while len(self._items) >= self.maxsize:
+                    self._cond.wait()
+            self._items.append(item)
+            self.put_count += 1
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._depth_metric.set(len(self._items))
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        item = super().get(timeout)
+        if item is not None:
+            with self._cond:
+                self._cond.notify_all()  # Wake a producer waiting for room
+        return item
+
+    def stats(self):
+        stats = super().stats()
+        with self._cond:
+            stats["waited"] = self.waited
+        return stats
+
+# Capture stage
+class FrameGrabber(threading.Thread):
+    """
+    Reads (frame, capture time) pairs from a capture source as fast as it
+    delivers them and pushes them into a drop-oldest queue, so stale frames
+    never pile up. A lost camera is retried with the source's backoff; the
+    grabber only ends with a finite source.
+    """
+    def __init__(self, source, frame_queue):
+        super().__init__(name="frame-grabber", daemon=True)
+        self.source = source
+        self.frame_queue = frame_queue
+        self.stop_event = threading.Event()
+        self.frames_read = 0
+
+    def run(self):
+        timer = stage_timer("capture")
+        while not self.stop_event.is_set():
+            with timer:
+                captured = self.source.read()
+            if captured is None:
+                if self.source.ended:
+                    break
+                self.stop_event.wait(max(self.source.retry_in(), 0.01))
+                continue
+            self.frames_read += 1
+            FRAMES_CAPTURED.inc()
+            self.frame_queue.put(captured)
+
+    def stop(self):
+        self.stop_event.set()
+
+# Saving and alerting stage
+class SinkWorker(threading.Thread):
+    """
+    Runs slow jobs (image writes, alerts) off the detection thread. Jobs
+    are never dropped: when the queue is full, submit() waits.
+    """
+    def __init__(self, sink_queue):
+        super().__init__(name="alert-sink", daemon=True)
+        self.sink_queue = sink_queue
+        self.stop_event = threading.Event()
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, func, *args, **kwargs):
+        self.sink_queue.put((func, args, kwargs))
+
+    def run(self):
+        while not self.stop_event.is_set() or self.sink_queue.depth():
+            job = self.sink_queue.get(timeout=0.5)
+            if job is None:
+                continue
+            func, args, kwargs = job
+            try:
+                func(*args, **kwargs)
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Sink job {getattr(func, '__name__', func)} failed: {e}")
+
+    def stop(self):
+        self.stop_event.set()
+
+class FramePipeline:
+    """
+    Wires a grabber thread, the caller's detection loop and a sink thread
+    together. The detection loop pulls frames with next_frame(), hands
+    slow work to submit() and calls frame_done() once it has decided on a
+    frame, which records the capture-to-decision latency.
+    """
+    def __init__(self, source, frame_queue_size=FRAME_QUEUE_SIZE, sink_queue_size=SINK_QUEUE_SIZE, camera=None):
+        self.source = source
+        self.frame_queue = DropOldestQueue("frames", frame_queue_size, camera)
+        self.sink_queue = BlockingQueue("sink", sink_queue_size, camera)
+        self.grabber = FrameGrabber(source, self.frame_queue)
+        self.sink = SinkWorker(self.sink_queue)
+        self.frames_processed = 0
+        self.frame_ts = None  # Capture time of the frame last returned by next_frame()
+        self.latencies = collections.deque(maxlen=1000)
+        self.started_at = None
+
+    def start(self):
+        self.started_at = time.time()
+        self.grabber.start()
+        self.sink.start()
+
+    def next_frame(self, timeout=1.0):
+        """
+        Returns the next frame, or None if the grabber has stopped.
+        """
+        while True:
+            captured = self.frame_queue.get(timeout=timeout)
+            if captured is not None:
+                self.frames_processed += 1
+                frame, self.frame_ts = captured
+                return frame
+            if not self.grabber.is_alive():
+                return None
+
+    def frame_done(self):
+        """
+        Records the time from the current frame's capture to now.
+        """
+        latency = time.monotonic() - self.frame_ts
+        self.latencies.append(latency)
+        CAPTURE_LATENCY.observe(latency)
+
+    def submit(self, func, *args, **kwargs):
+        self.sink.submit(func, *args, **kwargs)
+
+    def stop(self):
+        self.grabber.stop()
+        self.grabber.join(timeout=2)
+        self.sink.stop()
+        self.sink.join(timeout=10)
+
+    def stats(self):
+        """
+        Returns per-stage queue depths, drop counters and throughput.
+        """
+        elapsed = max(time.time() - (self.started_at or time.time()), 1e-6)
+        latencies = sorted(self.latencies)
+        return {
+            "capture": {
+                "frames_read": self.grabber.frames_read,
+                "fps": self.grabber.frames_read / elapsed,
+                "source": self.source.stats(),
+            },
+            "detection": {
+                "frames_processed": self.frames_processed,
+                "fps": self.frames_processed / elapsed,
+                "queue": self.frame_queue.stats(),
+                "latency_p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else None,
+                "latency_max_ms": latencies[-1] * 1000 if latencies else None,
+            },
+            "sink": {
+                "completed": self.sink.completed,
+                "failed": self.sink.failed,
+                "queue": self.sink_queue.stats(),
+            },
+        }
+
+    def format_stats(self):
+        s = self.stats()
+        latency = s["detection"]["latency_p50_ms"]
+        latency_text = f"latency p50 {latency:.0f} ms" if latency is not None else "latency n/a"
+        return (f"capture {s['capture']['fps']:.1f} fps, {s['capture']['source']['reconnects']} reconnects | "
+                f"detection {s['detection']['fps']:.1f} fps, {latency_text}, queue {s['detection']['queue']['depth']}"
+                f"/{s['detection']['queue']['maxsize']}, dropped {s['detection']['queue']['dropped']} | "
+                f"sink queue {s['sink']['queue']['depth']}/{s['sink']['queue']['maxsize']}, "
+                f"waited {s['sink']['queue']['waited']}, done {s['sink']['completed']}, "
+                f"failed {s['sink']['failed']}")
@@ -0,0 +1,106 @@
+import collections
+import datetime
+import os
+import sys
+import threading
+import time
+
+# Base directories
+BASE_DIR = os.path.join(os.path.expanduser("~/Desktop"), "IDS")
+PROFILES_DIR = os.path.join(BASE_DIR, "logs", "profiles")
+
+# Profiler configuration
+PROFILER = os.getenv("IDS_PROFILER", "0") == "1"                    # Profile detect_faces for its whole run
+PROFILE_INTERVAL = float(os.getenv("IDS_PROFILE_INTERVAL", "0.01"))  # Seconds between samples
+PROFILE_MAX_DEPTH = 64
+IDLE_FILES = ("threading.py", "selectors.py", "socketserver.py", "queue.py")  # Leaves that mean a thread is waiting
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of every other thread at a fixed interval and
+    counts identical stacks. Nothing is hooked into the profiled code, so
+    the cost is one stack walk per thread per sample, on this thread. The
+    result is written in the folded format read by flamegraph.pl and
+    speedscope.
+    """
+    def __init__(self, interval=PROFILE_INTERVAL, exclude=()):
+        self.interval = interval
+        self.exclude = set(exclude)
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.started_at = None
+        self.duration = 0.0
+        self.path = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        skip = self.exclude | {threading.get_ident()}
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id in skip:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self.duration = time.time() - self.started_at if self.started_at else 0.0
+        return self
+
+    def top(self, limit=20, include_idle=False):
+        """
+        Returns the functions seen most often on top of a stack, as
+        (function, share of samples) pairs. Threads blocked in a wait are
+        left out unless include_idle is set.
+        """
+        leaves = collections.Counter()
+        for stack, count in self.stacks.items():
+            leaf = stack.rsplit(";", 1)[-1]
+            if include_idle or not any(f"({name}:" in leaf for name in IDLE_FILES):
+                leaves[leaf] += count
+        total = sum(leaves.values()) or 1
+        return [(function, count / total) for function, count in leaves.most_common(limit)]
+
+    def write(self, path=None):
+        """
+        Writes the folded stacks and returns the file path.
+        """
+        if path is None:
+            os.makedirs(PROFILES_DIR, exist_ok=True)
+            timestamp = datetime.datetime.fromtimestamp(self.started_at or time.time()).strftime("%Y%m%d_%H%M%S")
+            path = os.path.join(PROFILES_DIR, f"profile_{timestamp}_{os.getpid()}.folded")
+        with open(path, "w") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+        self.path = path
+        return path
+
+def profile_for(seconds, interval=PROFILE_INTERVAL):
+    """
+    Profiles the running process for a number of seconds and writes the
+    result. Returns the profiler.
+    """
+    # The calling thread only sleeps, so it is not sampled
+    profiler = SamplingProfiler(interval, exclude=[threading.get_ident()]).start()
+    time.sleep(seconds)
+    profiler.stop()
+    profiler.write()
+    return profiler
@@ -0,0 +1,247 @@
+import argparse
+import json
+import os
+import time
+import cv2
+import numpy as np
+from face_utils import normalize_face
+
+# Recognition engine configuration
+RECOGNITION_ENGINE = os.getenv("IDS_RECOGNITION_ENGINE", "numpy")  # "numpy" (batched) or "opencv"
+SHORTLIST = int(os.getenv("IDS_RECOGNITION_SHORTLIST", "32"))       # Candidates re-ranked exactly, 0 for all
+DISTANCE_BLOCK = 4 * 1024 * 1024  # Histogram bins compared per step when ranking exactly
+
+def lbp_codes(faces, radius=1, neighbors=8):
+    """
+    Computes circular LBP codes for a (N, H, W) stack of grayscale faces,
+    sampling neighbours with bilinear interpolation the same way as
+    OpenCV's LBPH recognizer. Returns an (N, H - 2r, W - 2r) int array.
+    """
+    faces = faces.astype(np.float32)
+    _, height, width = faces.shape
+    center = faces[:, radius:height - radius, radius:width - radius]
+    codes = np.zeros(center.shape, dtype=np.int32)
+    eps = np.finfo(np.float32).eps
+
+    def shifted(dy, dx):
+        return faces[:, radius + dy:height - radius + dy, radius + dx:width - radius + dx]
+
+    for n in range(neighbors):
+        x = np.float32(radius * np.cos(2.0 * np.pi * n / neighbors))
+        y = np.float32(-radius * np.sin(2.0 * np.pi * n / neighbors))
+        fx, fy = int(np.floor(x)), int(np.floor(y))
+        cx, cy = int(np.ceil(x)), int(np.ceil(y))
+        ty, tx = y - fy, x - fx
+        w1, w2 = (1 - tx) * (1 - ty), tx * (1 - ty)
+        w3, w4 = (1 - tx) * ty, tx * ty
+        value = w1 * shifted(fy, fx) + w2 * shifted(fy, cx) + w3 * shifted(cy, fx) + w4 * shifted(cy, cx)
+        codes |= ((value > center) | (np.abs(value - center) < eps)).astype(np.int32) << n
+    return codes
+
+def spatial_histograms(codes, grid_x=8, grid_y=8, patterns=256):
+    """
+    Splits each LBP image into a grid and concatenates the normalized
+    histogram of every cell, giving one (grid_x * grid_y * patterns) row per
+    face. All histograms of the batch come from a single bincount.
+    """
+    count, height, width = codes.shape
+    cell_h, cell_w = height // grid_y, width // grid_x
+    cells = codes[:, :grid_y * cell_h, :grid_x * cell_w].reshape(count, grid_y, cell_h, grid_x, cell_w)
+    cell_index = np.arange(count * grid_y * grid_x, dtype=np.int64).reshape(count, grid_y, 1, grid_x, 1)
+    flat = (cell_index * patterns + cells).ravel()
+    hist = np.bincount(flat, minlength=count * grid_y * grid_x * patterns).astype(np.float32)
+    return hist.reshape(count, -1) / np.float32(cell_h * cell_w)
+
+def chi_square(query, histograms, totals=None):
+    """
+    Returns the chi-square distances used by OpenCV's LBPH
+    (HISTCMP_CHISQR_ALT) from one histogram to each row of a matrix.
+    Bins where the query is empty contribute exactly the row's value, so
+    only the query's non-empty bins are compared element by element and
+    the rest comes from the row totals.
+    """
+    nonzero = np.flatnonzero(query)
+    a = query[nonzero].astype(np.float64)
+    b = histograms[:, nonzero].astype(np.float64)
+    if totals is None:
+        totals = histograms.sum(axis=1, dtype=np.float64)
+    return 2 * (((a - b) ** 2 / (a + b)).sum(axis=1) + totals - b.sum(axis=1))
+
+class BatchRecognizer:
+    """
+    Nearest-neighbour LBP recognizer that classifies many faces per call.
+    The training histograms are taken from a trained LBPH model, so
+    distances are on the same scale as recognizer.predict() and the same
+    thresholds apply.
+
+    A batch of faces is normalized, turned into LBP histograms with a few
+    array operations, and ranked against the training set in one matrix
+    product of square-rooted histograms. The best SHORTLIST candidates per
+    face are then re-ranked with the exact chi-square distance.
+    """
+    def __init__(self, histograms, labels, radius=1, neighbors=8, grid_x=8, grid_y=8, shortlist=SHORTLIST):
+        self.histograms = np.ascontiguousarray(histograms, dtype=np.float32)
+        self.labels = np.asarray(labels, dtype=np.int32).ravel()
+        self.roots = np.sqrt(self.histograms)
+        self.totals = self.histograms.sum(axis=1, dtype=np.float64)
+        self.radius = radius
+        self.neighbors = neighbors
+        self.grid_x = grid_x
+        self.grid_y = grid_y
+        self.shortlist = shortlist
+
+    @classmethod
+    def from_recognizer(cls, recognizer, shortlist=SHORTLIST):
+        histograms = recognizer.getHistograms()
+        histograms = np.vstack([h.reshape(1, -1) for h in histograms]) if len(histograms) else np.empty((0, 0))
+        return cls(histograms, recognizer.getLabels(), recognizer.getRadius(), recognizer.getNeighbors(),
+                   recognizer.getGridX(), recognizer.getGridY(), shortlist)
+
+    def features(self, faces):
+        """
+        Returns the LBP histograms of a list of normalized grayscale faces.
+        Faces of the same size are processed together.
+        """
+        result = np.empty((len(faces), self.histograms.shape[1]), dtype=np.float32)
+        by_shape = {}
+        for i, face in enumerate(faces):
+            by_shape.setdefault(face.shape, []).append(i)
+        for indices in by_shape.values():
+            stack = np.stack([faces[i] for i in indices])
+            codes = lbp_codes(stack, self.radius, self.neighbors)
+            result[indices] = spatial_histograms(codes, self.grid_x, self.grid_y, 2 ** self.neighbors)
+        return result
+
+    def predict_batch(self, faces):
+        """
+        Returns a (label, distance) pair for every normalized face.
+        """
+        if not len(faces):
+            return []
+        if not len(self.labels):
+            return [(-1, float("inf"))] * len(faces)
+        return self.match(self.features(faces))
+
+    def match(self, queries):
+        """
+        Returns a (label, distance) pair for every row of LBP histograms.
+        """
+        if self.shortlist and self.shortlist < len(self.labels):
+            similarity = np.sqrt(queries) @ self.roots.T
+            candidates = np.argpartition(-similarity, self.shortlist - 1, axis=1)[:, :self.shortlist]
+        else:
+            candidates = np.broadcast_to(np.arange(len(self.labels)), (len(queries), len(self.labels)))
+
+        # Exact distances to each face's candidates, a bounded block at a time
+        distances = np.empty(candidates.shape, dtype=np.float64)
+        step = max(DISTANCE_BLOCK // queries.shape[1], 1)
+        for i, (query, rows) in enumerate(zip(queries, candidates)):
+            for start in range(0, len(rows), step):
+                block = rows[start:start + step]
+                distances[i, start:start + step] = chi_square(query, self.histograms[block], self.totals[block])
+        best = np.argmin(distances, axis=1)
+        rows = np.arange(len(queries))
+        return [(int(label), float(distance)) for label, distance
+                in zip(self.labels[candidates[rows, best]], distances[rows, best])]
+
+class OpenCVRecognizer:
+    """
+    Per-face LBPH predictions behind the same batch interface.
+    """
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+
+    def predict_batch(self, faces):
+        return [self.recognizer.predict(face) for face in faces]
+
+def create_engine(recognizer, engine=RECOGNITION_ENGINE):
+    """
+    Wraps a trained LBPH recognizer in the configured recognition engine.
+    """
+    if engine == "opencv":
+        return OpenCVRecognizer(recognizer)
+    return BatchRecognizer.from_recognizer(recognizer)
+
+# Accuracy and speed comparison against OpenCV's LBPH
+def split_dataset(dataset_path, test_every):
+    """
+    Lists dataset images per user and holds out every n-th one for testing.
+    """
+    train, test = [], []
+    for user_name in sorted(os.listdir(dataset_path)):
+        user_folder = os.path.join(dataset_path, user_name)
+        if not os.path.isdir(user_folder):
+            continue
+        for i, filename in enumerate(sorted(os.listdir(user_folder))):
+            (test if i % test_every == test_every - 1 else train).append((f"{user_name}/{filename}", user_name))
+    return train, test
+
+def load_faces(dataset_path, items, labels):
+    faces, face_labels = [], []
+    for rel_path, user_name in items:
+        img = cv2.imread(os.path.join(dataset_path, rel_path), cv2.IMREAD_GRAYSCALE)
+        if img is not None:
+            faces.append(normalize_face(img))
+            face_labels.append(labels[user_name])
+    return faces, np.array(face_labels, dtype=np.int32)
+
+def compare(dataset_path, test_every=5, batch_sizes=(1, 8, 32), shortlist=SHORTLIST, repeats=3):
+    """
+    Trains LBPH on part of a dataset, then classifies the held-out faces
+    with OpenCV's predict() and with the batched engine, and reports
+    accuracy, agreement and time per face.
+    """
+    train, test = split_dataset(dataset_path, test_every)
+    labels = {user_name: i for i, user_name in enumerate(sorted({user for _, user in train + test}))}
+    train_faces, train_labels = load_faces(dataset_path, train, labels)
+    test_faces, test_labels = load_faces(dataset_path, test, labels)
+
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.train(train_faces, train_labels)
+    engine = BatchRecognizer.from_recognizer(recognizer, shortlist=shortlist)
+
+    def timed(func):
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - start)
+        return result, best
+
+    opencv, opencv_seconds = timed(lambda: [recognizer.predict(face) for face in test_faces])
+    report = {
+        "train_faces": len(train_faces),
+        "test_faces": len(test_faces),
+        "users": len(labels),
+        "shortlist": shortlist,
+        "opencv": {
+            "accuracy": float(np.mean([label == truth for (label, _), truth in zip(opencv, test_labels)])),
+            "ms_per_face": opencv_seconds / len(test_faces) * 1000,
+        },
+        "batched": {},
+    }
+    for batch_size in batch_sizes:
+        def run():
+            results = []
+            for start in range(0, len(test_faces), batch_size):
+                results.extend(engine.predict_batch(test_faces[start:start + batch_size]))
+            return results
+        batched, seconds = timed(run)
+        report["batched"][str(batch_size)] = {
+            "accuracy": float(np.mean([label == truth for (label, _), truth in zip(batched, test_labels)])),
+            "agreement_with_opencv": float(np.mean([a[0] == b[0] for a, b in zip(batched, opencv)])),
+            "max_distance_difference": float(max(abs(a[1] - b[1]) for a, b in zip(batched, opencv))),
+            "ms_per_face": seconds / len(test_faces) * 1000,
+            "speedup": opencv_seconds / seconds,
+        }
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare batched recognition against OpenCV's LBPH predict().")
+    parser.add_argument("dataset", help="Folder with one sub-folder of face images per user")
+    parser.add_argument("--test-every", type=int, default=5, help="Hold out every n-th image of each user")
+    parser.add_argument("--shortlist", type=int, default=SHORTLIST, help="Candidates re-ranked exactly, 0 for all")
+    parser.add_argument("--batch-sizes", default="1,8,32")
+    args = parser.parse_args()
+    batch_sizes = [int(size) for size in args.batch_sizes.split(",")]
+    print(json.dumps(compare(args.dataset, args.test_every, batch_sizes, args.shortlist), indent=2))
@@ -0,0 +1,81 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+# Base directories
+BASE_DIR = os.path.join(os.path.expanduser("~/Desktop"), "IDS")
+LOG_DIR = os.path.join(BASE_DIR, "logs")
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICE_LOG_PATH = os.path.join(LOG_DIR, "detection_service.log")
+
+# Control API configuration, shared with detection_service.py
+SERVICE_HOST = os.getenv("IDS_SERVICE_HOST", "127.0.0.1")   # Keep on loopback; the API can start cameras
+SERVICE_PORT = int(os.getenv("IDS_SERVICE_PORT", "8765"))
+SERVICE_TOKEN = os.getenv("IDS_SERVICE_TOKEN", "")           # Required in every request if set
+SERVICE_TIMEOUT = 10          # Seconds a client waits for a reply
+SERVICE_START_TIMEOUT = 30    # Seconds to wait for a freshly launched service
+
+class ServiceError(Exception):
+    """
+    A command the service could not carry out.
+    """
+
+class ServiceClient:
+    """
+    Sends commands to a running detection service.
+    """
+    def __init__(self, host=SERVICE_HOST, port=SERVICE_PORT, token=SERVICE_TOKEN, timeout=SERVICE_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.timeout = timeout
+
+    def call(self, command, timeout=None, **args):
+        """
+        Runs a command and returns its result. Raises ServiceError if the
+        service refused it and OSError if the service is unreachable.
+        """
+        request = dict(args, command=command)
+        if self.token:
+            request["token"] = self.token
+        with socket.create_connection((self.host, self.port), timeout=timeout or self.timeout) as sock:
+            sock.sendall((json.dumps(request) + "\n").encode())
+            with sock.makefile("rb") as reader:
+                line = reader.readline()
+        if not line:
+            raise ServiceError("The service closed the connection")
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise ServiceError(response.get("error", "Unknown error"))
+        return response.get("result")
+
+    def is_running(self):
+        try:
+            self.call("ping", timeout=1)
+            return True
+        except (OSError, ServiceError):
+            return False
+
+    def ensure_running(self, timeout=SERVICE_START_TIMEOUT):
+        """
+        Launches the service in the background if it is not running and
+        waits until it answers.
+        """
+        if self.is_running():
+            return
+        os.makedirs(LOG_DIR, exist_ok=True)
+        args = [sys.executable, "-u", os.path.join(SCRIPTS_DIR, "detection_service.py"), "serve", "--port", str(self.port)]
+        detach = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP} if os.name == "nt" else {"start_new_session": True}
+        with open(SERVICE_LOG_PATH, "a") as log:
+            process = subprocess.Popen(args, stdout=log, stderr=subprocess.STDOUT, cwd=SCRIPTS_DIR, **detach)
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.is_running():
+                return
+            if process.poll() is not None:
+                raise ServiceError(f"The detection service exited with code {process.returncode}; see {SERVICE_LOG_PATH}")
+            time.sleep(0.1)
+        raise ServiceError(f"The detection service did not start within {timeout}s; see {SERVICE_LOG_PATH}")
@@ -0,0 +1,206 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+
+# Live stream configuration
+STREAM_HOST = os.getenv("IDS_STREAM_HOST", "0.0.0.0")
+STREAM_PORT = int(os.getenv("IDS_STREAM_PORT", "8081"))
+STREAM_QUALITY = int(os.getenv("IDS_STREAM_QUALITY", "70"))  # JPEG quality of streamed frames
+STREAM_MAX_FPS = float(os.getenv("IDS_STREAM_MAX_FPS", "15"))  # Upper bound on frames encoded per second
+STREAM_BOUNDARY = "idsframe"
+
+class FrameBroadcaster:
+    """
+    Fans annotated frames out to any number of viewers. The detection loop
+    hands over frames with publish(), which only stores a reference; a
+    background thread JPEG-encodes the newest frame once and every viewer
+    reads that same buffer. Viewers always take the latest encoded frame,
+    so a slow viewer skips frames instead of holding anything up, and
+    nothing is encoded while no one is watching.
+    """
+    def __init__(self, quality=STREAM_QUALITY, max_fps=STREAM_MAX_FPS):
+        self.quality = quality
+        self.min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self._cond = threading.Condition()
+        self._pending = None
+        self._jpeg = None
+        self.sequence = 0
+        self.viewers = 0
+        self.published = 0
+        self.encoded = 0
+        self.encode_seconds = 0.0
+        self._running = True
+        self._thread = threading.Thread(target=self._encode_loop, name="stream-encoder", daemon=True)
+        self._thread.start()
+
+    def publish(self, frame):
+        """
+        Offers a frame to viewers. The frame must not be modified afterwards.
+        Returns immediately, and does nothing when there are no viewers.
+        """
+        if not self.viewers:
+            return
+        with self._cond:
+            self._pending = frame
+            self.published += 1
+            self._cond.notify_all()
+
+    def _encode_loop(self):
+        next_encode = 0.0
+        while True:
+            # Cap the encode rate; frames published meanwhile replace each other
+            delay = next_encode - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            with self._cond:
+                while self._running and (self._pending is None or not self.viewers):
+                    self._cond.wait()
+                if not self._running:
+                    return
+                frame, self._pending = self._pending, None
+
+            start = time.perf_counter()
+            next_encode = start + self.min_interval
+            ok, data = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if not ok:
+                continue
+            with self._cond:
+                self._jpeg = data.tobytes()
+                self.sequence += 1
+                self.encoded += 1
+                self.encode_seconds += time.perf_counter() - start
+                self._cond.notify_all()
+
+    def add_viewer(self):
+        with self._cond:
+            self.viewers += 1
+
+    def remove_viewer(self):
+        with self._cond:
+            self.viewers -= 1
+            if not self.viewers:
+                self._pending = None
+
+    def wait_frame(self, last_sequence, timeout=5.0):
+        """
+        Blocks until a frame newer than last_sequence is available and
+        returns (sequence, jpeg bytes), or (last_sequence, None) on timeout
+        or once the broadcaster has stopped.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.sequence != last_sequence or not self._running, timeout)
+            if self.sequence == last_sequence or self._jpeg is None:
+                return last_sequence, None
+            return self.sequence, self._jpeg
+
+    def latest(self):
+        with self._cond:
+            return self._jpeg
+
+    @property
+    def running(self):
+        return self._running
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join(timeout=2)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "viewers": self.viewers,
+                "published": self.published,
+                "encoded": self.encoded,
+                "encode_ms": self.encode_seconds / self.encoded * 1000 if self.encoded else 0.0,
+            }
+
+    def format_stats(self):
+        s = self.stats()
+        return (f"{s['viewers']} viewers, {s['encoded']} frames encoded "
+                f"({s['encode_ms']:.1f} ms each) of {s['published']} published")
+
+class StreamHandler(BaseHTTPRequestHandler):
+    """
+    Serves /stream.mjpg as multipart/x-mixed-replace and /snapshot.jpg as
+    the latest frame. Streams end when the broadcaster stops.
+    """
+    broadcaster = None
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/stream.mjpg":
+            self.send_stream()
+        elif path == "/snapshot.jpg":
+            self.send_snapshot()
+        else:
+            self.send_error(404)
+
+    def send_snapshot(self):
+        jpeg = self.broadcaster.latest()
+        if jpeg is None:
+            # Nothing has been encoded yet; wait briefly for a first frame
+            self.broadcaster.add_viewer()
+            try:
+                _, jpeg = self.broadcaster.wait_frame(self.broadcaster.sequence)
+            finally:
+                self.broadcaster.remove_viewer()
+        if jpeg is None:
+            self.send_error(503, "No frame available")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(jpeg)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(jpeg)
+
+    def send_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={STREAM_BOUNDARY}")
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.broadcaster.add_viewer()
+        sequence = 0
+        try:
+            while True:
+                sequence, jpeg = self.broadcaster.wait_frame(sequence)
+                if jpeg is None:
+                    if not self.broadcaster.running:
+                        break
+                    continue  # No new frame within the timeout; keep the viewer
+                self.wfile.write(f"--{STREAM_BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                 f"Content-Length: {len(jpeg)}\r\n\r\n".encode())
+                self.wfile.write(jpeg)
+                self.wfile.write(b"\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.broadcaster.remove_viewer()
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+class StreamServer:
+    """
+    Serves a broadcaster's frames over HTTP on a background thread.
+    """
+    def __init__(self, broadcaster, host=STREAM_HOST, port=STREAM_PORT):
+        handler = type("BoundStreamHandler", (StreamHandler,), {"broadcaster": broadcaster})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="stream-server", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        host, port = self.httpd.server_address[:2]
+        print(f"Live stream at http://{host}:{port}/stream.mjpg")
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
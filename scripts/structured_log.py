@@ -0,0 +1,102 @@
+import datetime
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+# Logging configuration
+LOG_FORMAT = os.getenv("IDS_LOG_FORMAT", "text")            # "text" (key=value) or "json" (one object per line)
+LOG_LEVEL = os.getenv("IDS_LOG_LEVEL", "INFO")
+LOG_RATE_INTERVAL = float(os.getenv("IDS_LOG_RATE_INTERVAL", "10"))  # Window for rate-limited events, seconds
+LOG_RATE_BURST = int(os.getenv("IDS_LOG_RATE_BURST", "1"))           # Events per key and window
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Formats an event and its fields as "time level event key=value ..." or
+    as a JSON object.
+    """
+    def __init__(self, json_lines=False):
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record):
+        fields = getattr(record, "fields", {})
+        timestamp = datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds")
+        if self.json_lines:
+            return json.dumps({"time": timestamp, "level": record.levelname, "event": record.getMessage(),
+                               **fields}, default=str)
+        text = " ".join(f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}"
+                        for key, value in fields.items())
+        return f"{timestamp} {record.levelname} {record.getMessage()} {text}".rstrip()
+
+class RateLimiter:
+    """
+    Lets at most `burst` events per key through in each `interval`, and
+    counts the rest so the next event that passes can report them.
+    """
+    def __init__(self, interval=LOG_RATE_INTERVAL, burst=LOG_RATE_BURST):
+        self.interval = interval
+        self.burst = burst
+        self._windows = {}  # key -> [window start, events in window, suppressed]
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        """
+        Returns (allowed, suppressed events since the last allowed one).
+        """
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window is not None else 0
+                self._windows[key] = [now, 1, 0]
+                if len(self._windows) > 10000:
+                    self._expire(now)
+                return True, suppressed
+            if window[1] < self.burst:
+                window[1] += 1
+                suppressed, window[2] = window[2], 0
+                return True, suppressed
+            window[2] += 1
+            return False, 0
+
+    def _expire(self, now):
+        for key in [k for k, w in self._windows.items() if now - w[0] >= self.interval and not w[2]]:
+            del self._windows[key]
+
+_logger = None
+_rate_limiter = RateLimiter()
+
+def get_logger():
+    """
+    Returns the "ids" logger, writing structured lines to stdout.
+    """
+    global _logger
+    if _logger is None:
+        logger = logging.getLogger("ids")
+        if not logger.handlers:
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(StructuredFormatter(LOG_FORMAT == "json"))
+            logger.addHandler(handler)
+            logger.setLevel(LOG_LEVEL)
+            logger.propagate = False
+        _logger = logger
+    return _logger
+
+def log_event(event, level=logging.INFO, key=None, **fields):
+    """
+    Logs an event with fields. Events with a key are rate limited per key,
+    and the number suppressed is reported as `suppressed` on the next one.
+    """
+    logger = get_logger()
+    if not logger.isEnabledFor(level):
+        return
+    if key is not None:
+        allowed, suppressed = _rate_limiter.allow(key)
+        if not allowed:
+            return
+        if suppressed:
+            fields["suppressed"] = suppressed
+    logger.log(level, event, extra={"fields": fields})
@@ -0,0 +1,94 @@
+import hashlib
+import os
+import threading
+import cv2
+
+# Thumbnail configuration
+BASE_DIR = os.path.join(os.path.expanduser("~/Desktop"), "IDS")
+THUMBNAIL_DIR = os.path.join(BASE_DIR, "logs", "thumbnails")
+THUMBNAIL_WIDTH = 240
+THUMBNAIL_QUALITY = 70
+THUMBNAIL_CACHE_BYTES = 200 * 1024 * 1024  # Evict least recently used thumbnails beyond this
+
+VIDEO_EXTENSIONS = (".avi", ".mp4", ".mkv", ".mov")
+
+class ThumbnailCache:
+    """
+    Generates small JPEG previews of intruder images and recordings on first
+    request and keeps them on disk. Each file's mtime is bumped when it is
+    served, and the least recently used thumbnails are evicted once the
+    cache grows past its size limit.
+    """
+    def __init__(self, directory=THUMBNAIL_DIR, width=THUMBNAIL_WIDTH, max_bytes=THUMBNAIL_CACHE_BYTES):
+        self.directory = directory
+        self.width = width
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+    def _thumb_path(self, source_path):
+        # Keyed on the source's mtime so a replaced source gets a new thumbnail
+        key = f"{os.path.abspath(source_path)}:{os.path.getmtime(source_path)}:{self.width}"
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest()[:20] + ".jpg")
+
+    def _read_source(self, source_path):
+        if source_path.lower().endswith(VIDEO_EXTENSIONS):
+            capture = cv2.VideoCapture(source_path)
+            ret, frame = capture.read()
+            capture.release()
+            return frame if ret else None
+        # Decoding at reduced size is much cheaper for large frames
+        return cv2.imread(source_path, cv2.IMREAD_REDUCED_COLOR_2)
+
+    def get(self, source_path):
+        """
+        Returns the path of the thumbnail for a source file, generating it
+        if needed, or None if the source cannot be decoded.
+        """
+        thumb_path = self._thumb_path(source_path)
+        if os.path.exists(thumb_path):
+            try:
+                os.utime(thumb_path)
+            except OSError:
+                pass
+            return thumb_path
+
+        frame = self._read_source(source_path)
+        if frame is None:
+            return None
+        height = max(int(frame.shape[0] * self.width / frame.shape[1]), 1)
+        thumb = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        ok, data = cv2.imencode(".jpg", thumb, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_QUALITY])
+        if not ok:
+            return None
+
+        tmp_path = f"{thumb_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(data.tobytes())
+        os.replace(tmp_path, thumb_path)
+        with self._lock:
+            self.total_bytes += len(data)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+        return thumb_path
+
+    def _evict(self):
+        """
+        Deletes least recently used thumbnails until the cache is 90% full.
+        """
+        entries = sorted((entry for entry in os.scandir(self.directory)
+                          if entry.is_file() and entry.name.endswith(".jpg")),
+                         key=lambda entry: entry.stat().st_mtime)
+        target = self.max_bytes * 0.9
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if total <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                total -= size
+            except OSError:
+                pass
+        self.total_bytes = total
@@ -0,0 +1,170 @@
+import itertools
+
+# Tracker configuration
+IOU_THRESHOLD = 0.3          # Minimum overlap to continue a track
+CENTROID_THRESHOLD = 0.6     # Max centroid shift, as a fraction of box size, when overlap fails
+MAX_MISSED_FRAMES = 10       # Frames a track survives without a matching detection
+RECOGNITION_INTERVAL = 30    # Frames between re-recognitions of a confident track
+UNCERTAIN_INTERVAL = 5       # Frames between re-recognitions of a borderline track
+UNCERTAIN_MARGIN = 10        # Confidence distance from the threshold considered borderline
+
+def iou(a, b):
+    """
+    Returns the intersection-over-union of two (x, y, w, h) boxes.
+    """
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+def centroid_distance(a, b):
+    """
+    Returns the distance between box centres relative to the box size.
+    """
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    dx = (ax + aw / 2) - (bx + bw / 2)
+    dy = (ay + ah / 2) - (by + bh / 2)
+    scale = max((aw + ah + bw + bh) / 4, 1)
+    return (dx * dx + dy * dy) ** 0.5 / scale
+
+class Track:
+    """
+    A face followed across frames, with its cached identity.
+    """
+    def __init__(self, track_id, box, frame_index):
+        self.track_id = track_id
+        self.box = box
+        self.label = None
+        self.name = None
+        self.confidence = None
+        self.unknown_id = None  # Unknown face identity matched while unrecognized
+        self.hits = 1
+        self.missed = 0
+        self.first_seen = frame_index
+        self.last_recognized = None
+
+    @property
+    def recognized(self):
+        return self.label is not None
+
+class FaceTracker:
+    """
+    Associates face detections across frames by IoU, falling back to centroid
+    distance, so each person keeps a stable track ID. Recognition results
+    are cached on the track and only refreshed when they go stale.
+    """
+    def __init__(self, threshold=50, iou_threshold=IOU_THRESHOLD,
+                 centroid_threshold=CENTROID_THRESHOLD, max_missed=MAX_MISSED_FRAMES,
+                 recognition_interval=RECOGNITION_INTERVAL):
+        self.threshold = threshold
+        self.iou_threshold = iou_threshold
+        self.centroid_threshold = centroid_threshold
+        self.max_missed = max_missed
+        self.recognition_interval = recognition_interval
+        self.uncertain_interval = UNCERTAIN_INTERVAL
+        self.tracks = []
+        self.frame_index = 0
+        self._ids = itertools.count(1)
+
+    def update(self, boxes):
+        """
+        Matches this frame's detections to existing tracks and returns the
+        tracks seen in this frame.
+        """
+        self.frame_index += 1
+        boxes = [tuple(int(v) for v in box) for box in boxes]
+
+        # Greedy association, best overlap first
+        pairs = []
+        for ti, track in enumerate(self.tracks):
+            for bi, box in enumerate(boxes):
+                overlap = iou(track.box, box)
+                if overlap >= self.iou_threshold:
+                    pairs.append((overlap, ti, bi))
+        pairs.sort(reverse=True)
+        matched_tracks, matched_boxes, assignment = set(), set(), {}
+        for _, ti, bi in pairs:
+            if ti in matched_tracks or bi in matched_boxes:
+                continue
+            matched_tracks.add(ti)
+            matched_boxes.add(bi)
+            assignment[bi] = ti
+
+        # Fall back to centroid distance for fast movers
+        pairs = []
+        for ti, track in enumerate(self.tracks):
+            if ti in matched_tracks:
+                continue
+            for bi, box in enumerate(boxes):
+                if bi in matched_boxes:
+                    continue
+                distance = centroid_distance(track.box, box)
+                if distance <= self.centroid_threshold:
+                    pairs.append((distance, ti, bi))
+        pairs.sort()
+        for _, ti, bi in pairs:
+            if ti in matched_tracks or bi in matched_boxes:
+                continue
+            matched_tracks.add(ti)
+            matched_boxes.add(bi)
+            assignment[bi] = ti
+
+        current = []
+        for bi, box in enumerate(boxes):
+            if bi in assignment:
+                track = self.tracks[assignment[bi]]
+                track.box = box
+                track.hits += 1
+                track.missed = 0
+            else:
+                track = Track(next(self._ids), box, self.frame_index)
+                self.tracks.append(track)
+            current.append(track)
+
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched_tracks and track.first_seen != self.frame_index:
+                track.missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+        return current
+
+    def age(self):
+        """
+        Advances a frame on which detection did not run. Faces seen in the
+        last detected frame are assumed to still be there; tracks that were
+        already missing keep ageing and are dropped as usual.
+        """
+        self.frame_index += 1
+        for track in self.tracks:
+            if track.missed:
+                track.missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+    def needs_recognition(self, track):
+        """
+        Returns True if the track is new or its cached identity is stale.
+        Borderline identities are refreshed more often than confident ones.
+        """
+        if track.last_recognized is None:
+            return True
+        age = self.frame_index - track.last_recognized
+        if abs(track.confidence - self.threshold) < UNCERTAIN_MARGIN:
+            return age >= self.uncertain_interval
+        return age >= self.recognition_interval
+
+    def set_identity(self, track, label, confidence, name=None):
+        track.label = label
+        track.name = name
+        track.confidence = confidence
+        track.last_recognized = self.frame_index
+
+    def expire_identities(self):
+        """
+        Marks every cached identity as stale, e.g. after the model changed.
+        Tracks keep their last identity until they are recognized again.
+        """
+        for track in self.tracks:
+            track.last_recognized = None
@@ -1,41 +1,202 @@
+import argparse
 import cv2
+import hashlib
+import json
 import numpy as np
 import os
+import time
+import dataset_cache
+from dataset_cache import load_images
+from face_detector import detector_settings, load_capture_settings
+from face_utils import peak_memory_mb, preprocessing_settings
+from model_store import save_model
 
-def train_model():
-    # Set base directory to IDS folder on the desktop
-    base_dir = os.path.join(os.path.expanduser("~/Desktop"), "IDS")
-    base_dataset_path = os.path.join(base_dir, "datasets/")
-    model_path = os.path.join(base_dir, "face_model.yml")
+# Set base directory to IDS folder on the desktop
+BASE_DIR = os.path.join(os.path.expanduser("~/Desktop"), "IDS")
+DATASET_PATH = os.path.join(BASE_DIR, "datasets")
+MODEL_PATH = os.path.join(BASE_DIR, "face_model.yml")
+LABEL_MAPPING_PATH = os.path.join(BASE_DIR, "label_mapping.json")
+MANIFEST_PATH = os.path.join(BASE_DIR, "training_manifest.json")
+
+# Function to hash a dataset file
+def file_digest(path):
+    """
+    Returns the SHA-1 of a file's contents.
+    """
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Function to write JSON without leaving a half-written file behind
+def write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(data, file, indent=2)
+    os.replace(tmp_path, path)
+
+def load_manifest(path=MANIFEST_PATH):
+    """
+    Loads the record of trained files and user labels.
+    """
+    if not os.path.exists(path):
+        return {"labels": {}, "files": {}}
+    with open(path, "r") as file:
+        return json.load(file)
+
+def assign_labels(user_names, labels):
+    """
+    Keeps the label ID of every known user and gives new users the next
+    free IDs, so IDs never depend on directory listing order.
+    """
+    labels = dict(labels)
+    next_label = max(labels.values(), default=-1) + 1
+    for user_name in sorted(user_names):
+        if user_name not in labels:
+            labels[user_name] = next_label
+            next_label += 1
+    return labels
+
+def scan_dataset(dataset_path, manifest):
+    """
+    Returns {relative path: {mtime, size, sha1, user}} for every file in the
+    dataset. Files whose mtime and size match the manifest reuse its hash.
+    """
+    known = manifest["files"]
+    entries = {}
+    for user_name in sorted(os.listdir(dataset_path)):
+        user_folder = os.path.join(dataset_path, user_name)
+        if not os.path.isdir(user_folder):
+            continue
+        for filename in sorted(os.listdir(user_folder)):
+            rel_path = f"{user_name}/{filename}"
+            stat = os.stat(os.path.join(user_folder, filename))
+            entry = {"mtime": stat.st_mtime, "size": stat.st_size, "user": user_name}
+            old = known.get(rel_path)
+            if old and old["mtime"] == entry["mtime"] and old["size"] == entry["size"]:
+                entry["sha1"] = old["sha1"]
+            else:
+                entry["sha1"] = file_digest(os.path.join(user_folder, filename))
+            entries[rel_path] = entry
+    return entries
+
+# Function to get faces from the packed cache
+def load_from_cache(base_dataset_path, rel_paths, labels, entries, workers=None):
+    """
+    Refreshes the dataset cache and returns the requested faces from it.
+    A full set is returned as the memory-mapped array itself.
+    """
+    if dataset_cache.is_fresh(entries):
+        faces, label_array, paths = dataset_cache.load_cache()
+        # Label IDs may have been assigned since the cache was written
+        label_array = np.array([labels[entries[p]["user"]] for p in paths], dtype=np.int32)
+    else:
+        faces, label_array, paths = dataset_cache.update_cache(base_dataset_path, entries, labels,
+                                                               workers=workers)
+    if len(rel_paths) == len(entries):
+        return faces, label_array, paths
+    row = {rel_path: i for i, rel_path in enumerate(paths)}
+    rows = [row[rel_path] for rel_path in rel_paths if rel_path in row]
+    return faces[rows], label_array[rows], [paths[i] for i in rows]
+
+def train_model(full=False, workers=None, use_cache=True):
+    """
+    Trains the LBPH model. Only images added since the last run are fed to
+    recognizer.update(); a full retrain happens when requested, when no
+    model exists yet, when trained images were removed or modified, or when
+    the face normalization settings changed. Faces are read from the
+    memory-mapped dataset cache, which only decodes files it has not seen.
+    """
+    base_dataset_path = DATASET_PATH
+    model_path = MODEL_PATH
 
     if not os.path.exists(base_dataset_path):
         raise FileNotFoundError(f"Dataset folder not found at {base_dataset_path}. Please create it and add user images.")
 
-    recognizer = cv2.face.LBPHFaceRecognizer_create()
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-
-    images, labels = [], []
-    label_dict = {}
-
-    for label, user_name in enumerate(os.listdir(base_dataset_path)):
-        user_folder = os.path.join(base_dataset_path, user_name)
-        print(f"Processing folder: {user_folder}")  # Debugging
-        for filename in os.listdir(user_folder):
-            img_path = os.path.join(user_folder, filename)
-            print(f"Found file: {img_path}")  # Debugging
-            img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-            if img is not None:
-                images.append(img)
-                labels.append(label)
-        label_dict[label] = user_name
-
-    if not images:
+    manifest = load_manifest()
+    entries = scan_dataset(base_dataset_path, manifest)
+
+    # Enrollment crops should come from the detector that detection will use
+    for user_name, settings in sorted(load_capture_settings(base_dataset_path).items()):
+        if settings != detector_settings():
+            print(f"Warning: {user_name} was enrolled with detector {settings}, "
+                  f"but the configured detector is {detector_settings()}.")
+    labels = assign_labels({entry["user"] for entry in entries.values()}, manifest["labels"])
+
+    trained = manifest["files"]
+    removed = [p for p in trained if p not in entries]
+    modified = [p for p in trained if p in entries and entries[p]["sha1"] != trained[p]["sha1"]]
+    new = [p for p in entries if p not in trained]
+
+    settings_changed = bool(trained) and manifest.get("preprocessing") != preprocessing_settings()
+
+    if full or not os.path.exists(model_path) or removed or modified or settings_changed:
+        if settings_changed:
+            print("Face normalization settings changed since last training. Retraining from scratch.")
+        elif removed or modified:
+            print(f"{len(removed)} image(s) removed and {len(modified)} modified since last training. Retraining from scratch.")
+        to_train = list(entries)
+        incremental = False
+    elif not new:
+        print(f"Model is up to date ({len(trained)} images). Nothing to train.")
+        return
+    else:
+        to_train = new
+        incremental = True
+
+    load_start = time.perf_counter()
+    if use_cache and preprocessing_settings()["face_size"]:
+        images, image_labels, loaded = load_from_cache(base_dataset_path, to_train, labels, entries, workers)
+    else:
+        images, image_labels, loaded = load_images(base_dataset_path, to_train, labels, entries, workers)
+    load_time = time.perf_counter() - load_start
+    if not len(images) and not incremental:
         raise ValueError(f"No images found in dataset folder: {base_dataset_path}. Ensure that each user folder contains image files.")
 
-    # Train and save model
-    recognizer.train(images, np.array(labels))
-    recognizer.save(model_path)
+    # Train and save model. list() of the packed array gives views, not copies.
+    train_start = time.perf_counter()
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    if incremental:
+        recognizer.read(model_path)
+        if len(images):
+            recognizer.update(list(images), image_labels)
+        print(f"Incrementally trained on {len(images)} new image(s).")
+    else:
+        recognizer.train(list(images), image_labels)
+        print(f"Trained on {len(images)} image(s).")
+    train_time = time.perf_counter() - train_start
+
+    # Labels first: IDs are stable, so new names are harmless to a detector still on the old model
+    label_dict = {str(label): user_name for user_name, label in labels.items()}
+    write_json(LABEL_MAPPING_PATH, label_dict)
+    save_model(recognizer, model_path)
+
+    # Unreadable files are recorded too, so they are not retried until they change
+    files = {} if not incremental else dict(trained)
+    for rel_path in to_train:
+        files[rel_path] = entries[rel_path]
+    write_json(MANIFEST_PATH, {"labels": labels, "files": files, "preprocessing": preprocessing_settings(),
+                               "detector": detector_settings()})
+    if len(loaded) < len(to_train):
+        print(f"Skipped {len(to_train) - len(loaded)} unreadable file(s).")
     print(f"Model trained and saved to {model_path}. User mapping: {label_dict}")
 
+    peak = peak_memory_mb()
+    array_mb = images.nbytes / (1024 * 1024) if isinstance(images, np.ndarray) else None
+    print(f"Load time: {load_time:.2f}s | Train time: {train_time:.2f}s | "
+          f"Face array: {f'{array_mb:.1f} MB' if array_mb is not None else 'n/a (unpacked)'} | "
+          f"Peak memory: {f'{peak:.0f} MB' if peak is not None else 'n/a'}")
+
 if __name__ == "__main__":
-    train_model()
+    parser = argparse.ArgumentParser(description="Train the face recognition model.")
+    parser.add_argument("--full", action="store_true", help="Retrain from scratch instead of incrementally")
+    parser.add_argument("--workers", type=int, default=None, help="Image decoding threads (default: CPU count)")
+    parser.add_argument("--no-cache", action="store_true", help="Decode images directly instead of using the dataset cache")
+    parser.add_argument("--evaluate", action="store_true",
+                        help="Cross-validate afterwards and save a calibrated recognition threshold")
+    args = parser.parse_args()
+    train_model(full=args.full, workers=args.workers, use_cache=not args.no_cache)
+    if args.evaluate:
+        from evaluate_model import evaluate
+        evaluate(use_cache=not args.no_cache)
@@ -0,0 +1,417 @@
+import argparse
+import collections
+import heapq
+import json
+import os
+import threading
+import time
+from multiprocessing.managers import BaseManager
+import cv2
+import numpy as np
+from metrics import REGISTRY, STAGE_SECONDS
+from recognition import lbp_codes, spatial_histograms
+
+# Base directories
+BASE_DIR = os.path.join(os.path.expanduser("~/Desktop"), "IDS")
+UNKNOWN_FACES_DIR = os.path.join(BASE_DIR, "logs", "unknown_faces")
+
+# Unknown face index configuration
+UNKNOWN_INDEX = os.getenv("IDS_UNKNOWN_INDEX", "1") == "1"
+UNKNOWN_MATCH_THRESHOLD = float(os.getenv("IDS_UNKNOWN_MATCH", "0.9"))    # Cosine similarity to join an identity
+UNKNOWN_MAX_IDENTITIES = int(os.getenv("IDS_UNKNOWN_MAX_IDENTITIES", "500"))
+UNKNOWN_MAX_AGE = float(os.getenv("IDS_UNKNOWN_MAX_AGE_DAYS", "7")) * 86400  # Forget identities unseen this long
+UNKNOWN_ALERT_COOLDOWN = float(os.getenv("IDS_UNKNOWN_ALERT_COOLDOWN", "600"))  # Seconds between alerts per identity
+UNKNOWN_EXEMPLARS = 5         # Descriptors kept per identity, covering different poses
+UNKNOWN_SIGHTINGS = 100       # Sightings kept per identity
+UNKNOWN_SAVE_INTERVAL = 30    # Seconds between saves while the index changes
+EXEMPLAR_NOVELTY = 0.97       # A descriptor closer than this to an exemplar adds nothing new
+
+# Descriptor: uniform LBP histograms on a coarse grid, Hellinger-normalized
+DESCRIPTOR_SIZE = 64
+DESCRIPTOR_GRID = 4
+
+# Recorded by the callers of match_batch(): a shared index runs in a process that exports no metrics
+UNKNOWN_SIGHTINGS_METRIC = REGISTRY.counter("ids_unknown_sightings", "Unknown faces matched to an identity.",
+                                            ("result",))
+UNKNOWN_IDENTITIES_METRIC = REGISTRY.gauge("ids_unknown_identities", "Identities in the unknown face index.")
+MATCH_SECONDS = STAGE_SECONDS.labels("unknown_match")
+
+def uniform_patterns(neighbors=8):
+    """
+    Maps each LBP code to its uniform pattern bin (at most two bit
+    transitions around the circle); all other codes share the last bin.
+    Returns (table, number of bins).
+    """
+    table = np.empty(2 ** neighbors, dtype=np.int64)
+    bins = 0
+    for code in range(2 ** neighbors):
+        transitions = sum(((code >> i) & 1) != ((code >> ((i + 1) % neighbors)) & 1) for i in range(neighbors))
+        if transitions <= 2:
+            table[code] = bins
+            bins += 1
+        else:
+            table[code] = -1
+    table[table < 0] = bins
+    return table, bins + 1
+
+UNIFORM_TABLE, UNIFORM_BINS = uniform_patterns()
+DESCRIPTOR_DIM = DESCRIPTOR_GRID * DESCRIPTOR_GRID * UNIFORM_BINS
+
+def face_descriptors(faces):
+    """
+    Returns one unit-length descriptor row per grayscale face. Similar
+    faces have a dot product close to 1.
+    """
+    stack = np.stack([cv2.resize(face, (DESCRIPTOR_SIZE, DESCRIPTOR_SIZE), interpolation=cv2.INTER_AREA)
+                      for face in faces])
+    codes = UNIFORM_TABLE[lbp_codes(stack)]
+    histograms = np.sqrt(spatial_histograms(codes, DESCRIPTOR_GRID, DESCRIPTOR_GRID, UNIFORM_BINS))
+    norms = np.linalg.norm(histograms, axis=1, keepdims=True)
+    return histograms / np.maximum(norms, 1e-12)
+
+class UnknownIdentity:
+    """
+    One unrecognized person: when they were seen and the descriptor rows
+    that represent them.
+    """
+    def __init__(self, identity_id, first_seen):
+        self.identity_id = identity_id
+        self.first_seen = first_seen
+        self.last_seen = first_seen
+        self.sighting_count = 0
+        self.sightings = collections.deque(maxlen=UNKNOWN_SIGHTINGS)
+        self.rows = []  # Oldest exemplar first
+
+    def to_dict(self):
+        return {"id": self.identity_id, "first_seen": self.first_seen, "last_seen": self.last_seen,
+                "sighting_count": self.sighting_count, "sightings": list(self.sightings), "rows": self.rows}
+
+    @classmethod
+    def from_dict(cls, data):
+        identity = cls(data["id"], data["first_seen"])
+        identity.last_seen = data["last_seen"]
+        identity.sighting_count = data["sighting_count"]
+        identity.sightings.extend(data["sightings"])
+        identity.rows = list(data["rows"])
+        return identity
+
+class UnknownFaceIndex:
+    """
+    Groups unrecognized faces into "unknown #N" identities so one stranger
+    seen over and over is one person, not a new intruder per track.
+
+    Descriptors live in one preallocated matrix, a few exemplars per
+    identity; a query is a single matrix-vector product over the rows in
+    use. Identities unseen for max_age are dropped, and when the index is
+    full the least recently seen one makes room. The index is saved to
+    UNKNOWN_FACES_DIR/<name>.npz on a background thread while it changes,
+    and its metadata can be read without loading the descriptors. With
+    directory=None the index is kept in memory only and never saved.
+    """
+    def __init__(self, name="detector", directory=UNKNOWN_FACES_DIR, threshold=UNKNOWN_MATCH_THRESHOLD,
+                 max_identities=UNKNOWN_MAX_IDENTITIES, max_age=UNKNOWN_MAX_AGE, exemplars=UNKNOWN_EXEMPLARS):
+        self.name = name
+        self.path = os.path.join(directory, f"{name}.npz") if directory is not None else None
+        self.threshold = threshold
+        self.max_identities = max_identities
+        self.max_age = max_age
+        self.exemplars = exemplars
+        capacity = max_identities * exemplars
+        self.vectors = np.zeros((capacity, DESCRIPTOR_DIM), dtype=np.float32)
+        self.owners = np.full(capacity, -1, dtype=np.int64)
+        self._free = list(range(capacity))  # Min-heap, so rows in use stay packed at the front
+        self.rows_used = 0                  # Rows past this are all free
+        self.identities = collections.OrderedDict()  # Least recently seen first
+        self.next_id = 1
+        self.dirty = False
+        self.alert_expiry = {}  # Identity key -> time its alert cooldown ends
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._saver = None
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, identity_id):
+        """
+        Returns the identity's reference across indexes, as stored with events.
+        """
+        return f"{self.name}:{identity_id}"
+
+    def match(self, descriptor, camera=None, track_id=None, ts=None):
+        """
+        Records a sighting of an unknown face: joins the closest identity if
+        it is similar enough, otherwise starts a new one. Returns
+        (identity key, similarity, True if the identity is new).
+        """
+        results, _ = self.match_batch([None], [descriptor], [track_id], camera, ts)
+        return results[0]
+
+    def update(self, key, descriptor, ts=None):
+        """
+        Adds a later look at an already matched face to its identity.
+        Returns False if the identity has been evicted since.
+        """
+        with self._lock:
+            return self._update(key, descriptor, time.time() if ts is None else ts)
+
+    def match_batch(self, keys, descriptors, track_ids, camera=None, ts=None):
+        """
+        Records the unknown faces of one frame in one call, which is one
+        round-trip when the index is shared between processes. A face whose
+        track already has an identity key is added to that identity, and
+        is matched like match() if it has been evicted since. Returns a
+        (key, similarity, new) tuple per face, or None where an identity
+        was only updated, and the number of identities.
+        """
+        ts = time.time() if ts is None else ts
+        results = []
+        with self._lock:
+            self._expire(ts)
+            for key, descriptor, track_id in zip(keys, descriptors, track_ids):
+                if key is not None and self._update(key, descriptor, ts):
+                    results.append(None)
+                else:
+                    results.append(self._match(descriptor, camera, track_id, ts))
+            return results, len(self.identities)
+
+    def _match(self, descriptor, camera, track_id, ts):
+        identity, similarity = self._search(descriptor)
+        new = identity is None
+        if new:
+            if len(self.identities) >= self.max_identities:
+                self._remove(next(iter(self.identities)))
+            identity = UnknownIdentity(self.next_id, ts)
+            self.identities[identity.identity_id] = identity
+            self.next_id += 1
+        self._touch(identity, descriptor, ts, add_exemplar=new or similarity < EXEMPLAR_NOVELTY)
+        identity.sighting_count += 1
+        identity.sightings.append({"ts": ts, "camera": camera, "track_id": track_id})
+        return self.key(identity.identity_id), similarity, new
+
+    def _update(self, key, descriptor, ts):
+        identity = self.identities.get(int(key.rsplit(":", 1)[1]))
+        if identity is None:
+            return False
+        similarity = float((self.vectors[identity.rows] @ descriptor).max())
+        self._touch(identity, descriptor, ts, add_exemplar=similarity < EXEMPLAR_NOVELTY)
+        return True
+
+    def should_alert(self, key, cooldown=UNKNOWN_ALERT_COOLDOWN):
+        """
+        Starts an alert cooldown for an identity unless one is running.
+        Returns (True if the alert may be raised, time the cooldown ends).
+        Processes sharing the index share the cooldowns.
+        """
+        now = time.time()
+        with self._lock:
+            expiry = self.alert_expiry.get(key, 0.0)
+            if now < expiry:
+                return False, expiry
+            for expired in [k for k, t in self.alert_expiry.items() if now >= t]:
+                del self.alert_expiry[expired]
+            self.alert_expiry[key] = now + cooldown
+            return True, now + cooldown
+
+    def _search(self, descriptor):
+        if not self.identities:
+            return None, 0.0
+        similarities = self.vectors[:self.rows_used] @ descriptor
+        row = int(np.argmax(similarities))
+        similarity = float(similarities[row])
+        owner = int(self.owners[row])
+        if owner < 0 or similarity < self.threshold:
+            return None, similarity
+        return self.identities[owner], similarity
+
+    def _touch(self, identity, descriptor, ts, add_exemplar):
+        identity.last_seen = ts
+        self.identities.move_to_end(identity.identity_id)
+        if add_exemplar:
+            if len(identity.rows) < self.exemplars:
+                row = heapq.heappop(self._free)
+                self.rows_used = max(self.rows_used, row + 1)
+            else:
+                row = identity.rows.pop(0)
+            self.vectors[row] = descriptor
+            self.owners[row] = identity.identity_id
+            identity.rows.append(row)
+        self.dirty = True
+
+    def _remove(self, identity_id):
+        identity = self.identities.pop(identity_id)
+        for row in identity.rows:
+            self.vectors[row] = 0
+            self.owners[row] = -1
+            heapq.heappush(self._free, row)
+        while self.rows_used and self.owners[self.rows_used - 1] < 0:
+            self.rows_used -= 1
+        self.dirty = True
+
+    def _expire(self, now):
+        while self.identities:
+            identity = next(iter(self.identities.values()))
+            if now - identity.last_seen < self.max_age:
+                break
+            self._remove(identity.identity_id)
+
+    def summary(self):
+        with self._lock:
+            return [identity_summary(self.name, identity.to_dict()) for identity in self.identities.values()]
+
+    # Persistence
+    def save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            metadata = {
+                "name": self.name,
+                "next_id": self.next_id,
+                "dim": DESCRIPTOR_DIM,
+                "saved_at": time.time(),
+                "identities": [identity.to_dict() for identity in self.identities.values()],
+            }
+            vectors = self.vectors[:self.rows_used].copy()
+            self.dirty = False
+        tmp_path = self.path + ".part.npz"
+        np.savez(tmp_path, vectors=vectors, metadata=np.array(json.dumps(metadata)))
+        os.replace(tmp_path, self.path)
+
+    def load(self):
+        """
+        Restores a saved index. An index saved with another descriptor
+        layout is ignored.
+        """
+        if self.path is None or not os.path.exists(self.path):
+            return self
+        with np.load(self.path) as data:
+            metadata = json.loads(str(data["metadata"]))
+            if metadata["dim"] != DESCRIPTOR_DIM:
+                print(f"Ignoring {self.path}: saved with a different descriptor.")
+                return self
+            vectors = data["vectors"]
+        with self._lock:
+            # Keep the most recently seen identities that fit
+            for data in metadata["identities"][-self.max_identities:]:
+                identity = UnknownIdentity.from_dict(data)
+                rows = []
+                for row in identity.rows[-self.exemplars:]:
+                    new_row = heapq.heappop(self._free)
+                    self.vectors[new_row] = vectors[row]
+                    self.owners[new_row] = identity.identity_id
+                    self.rows_used = max(self.rows_used, new_row + 1)
+                    rows.append(new_row)
+                identity.rows = rows
+                self.identities[identity.identity_id] = identity
+            self.next_id = metadata["next_id"]
+            self._expire(time.time())
+            UNKNOWN_IDENTITIES_METRIC.set(len(self.identities))
+        return self
+
+    def start(self, interval=UNKNOWN_SAVE_INTERVAL):
+        """
+        Saves the index every interval while it has changes.
+        """
+        if self.path is None:
+            return self
+        def run():
+            while not self._stop.wait(interval):
+                if self.dirty:
+                    try:
+                        self.save()
+                    except OSError as e:
+                        print(f"Could not save {self.path}: {e}")
+        self._saver = threading.Thread(target=run, name="unknown-index-saver", daemon=True)
+        self._saver.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._saver is not None:
+            self._saver.join(timeout=2)
+        if self.dirty:
+            self.save()
+
+def identity_label(key):
+    """
+    Returns the display name of an identity key, e.g. "Unknown #3".
+    """
+    return f"Unknown #{key.rsplit(':', 1)[1]}"
+
+def identity_summary(index_name, data):
+    key = f"{index_name}:{data['id']}"
+    return {
+        "key": key,
+        "label": identity_label(key),
+        "index": index_name,
+        "first_seen": data["first_seen"],
+        "last_seen": data["last_seen"],
+        "sighting_count": data["sighting_count"],
+        "cameras": sorted({str(s["camera"]) for s in data["sightings"] if s["camera"] is not None}),
+        "sightings": data["sightings"],
+    }
+
+def load_identities(directory=UNKNOWN_FACES_DIR):
+    """
+    Reads the identities of every saved index, most recently seen first,
+    without loading descriptors. Used by the log server.
+    """
+    identities = []
+    if not os.path.isdir(directory):
+        return identities
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".npz") or filename.endswith(".part.npz"):
+            continue
+        try:
+            with np.load(os.path.join(directory, filename)) as data:
+                metadata = json.loads(str(data["metadata"]))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Skipping unreadable unknown face index {filename}: {e}")
+            continue
+        identities.extend(identity_summary(metadata["name"], data) for data in metadata["identities"])
+    identities.sort(key=lambda identity: identity["last_seen"], reverse=True)
+    return identities
+
+# Process-wide index
+_index = None
+_index_lock = threading.Lock()
+
+def get_unknown_index(name="detector"):
+    """
+    Returns this process's index, loading it and starting the saver on
+    first use. Each process keeps its own file, named after it.
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = UnknownFaceIndex(name).load().start()
+        return _index
+
+def shutdown_unknown_index():
+    global _index
+    with _index_lock:
+        if _index is not None:
+            _index.stop()
+            _index = None
+
+# Index shared between processes
+class UnknownIndexManager(BaseManager):
+    """
+    Runs one index in a process of its own and hands out proxies to it, so
+    worker processes share identities instead of keeping one index each.
+    """
+
+UnknownIndexManager.register("get_unknown_index", callable=get_unknown_index,
+                             exposed=("key", "match", "update", "match_batch", "should_alert", "summary",
+                                      "stop"))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List the identities in the unknown face indexes.")
+    parser.add_argument("--key", help="Show every kept sighting of one identity (name:id)")
+    args = parser.parse_args()
+    identities = load_identities()
+    if args.key:
+        identities = [identity for identity in identities if identity["key"] == args.key]
+    else:
+        for identity in identities:
+            identity.pop("sightings")
+    print(json.dumps(identities, indent=2))
@@ -0,0 +1,19 @@
+import os
+import sys
+import tempfile
+import time
+
+# The scripts import each other by module name and keep their files under
+# ~/Desktop/IDS, so HOME points at a scratch directory before any is imported
+os.environ["HOME"] = tempfile.mkdtemp(prefix="ids-tests-")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+def wait_for(condition, timeout=5.0):
+    """
+    Polls condition() until it is true or the timeout expires, and returns
+    its last value.
+    """
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
@@ -0,0 +1,96 @@
+import collections
+import time
+import cv2
+import numpy as np
+
+# Simulated camera defaults
+SIMULATED_SIZE = (640, 480)
+SIMULATED_FPS = 30
+SIMULATED_BUFFER = 4         # Frames a V4L2-style driver queues while nobody reads
+
+class SimulatedCamera:
+    """
+    A stand-in for cv2.VideoCapture that behaves like a live camera: a
+    frame is captured every 1/fps seconds whether or not anyone reads, and
+    the driver queues up to `buffer` of them, dropping new frames while the
+    queue is full. Frames come from `images` in turn, or a moving test
+    pattern, and carry their frame number in the first pixels so a
+    consumer can look up their true capture time in capture_times.
+    `fail_every` simulates the camera being unplugged after that many
+    frames.
+    """
+    def __init__(self, images=None, size=SIMULATED_SIZE, fps=SIMULATED_FPS, buffer=SIMULATED_BUFFER, count=None,
+                 fail_every=None):
+        self.images = images
+        self.size = size
+        self.fps = fps
+        self.buffer = max(buffer, 1)
+        self.count = count
+        self.fail_every = fail_every
+        self.capture_times = {}
+        self._start = time.monotonic()
+        self._next_capture = 0
+        self._queue = collections.deque()
+        self._current = None
+        self._grabbed = 0
+        self._opened = True
+
+    def isOpened(self):
+        return self._opened
+
+    def set(self, prop, value):
+        return False  # Like most backends, the driver queue length is fixed
+
+    def get(self, prop):
+        return float(self.fps) if prop == cv2.CAP_PROP_FPS else 0.0
+
+    def _capture_until(self, now):
+        while self._start + self._next_capture / self.fps <= now:
+            if self.count is not None and self._next_capture >= self.count:
+                return
+            if len(self._queue) < self.buffer:
+                self._queue.append(self._next_capture)
+            self.capture_times[self._next_capture] = self._start + self._next_capture / self.fps
+            self._next_capture += 1
+
+    def grab(self):
+        if not self._opened:
+            return False
+        if self.fail_every and self._grabbed and self._grabbed % self.fail_every == 0:
+            self._grabbed += 1
+            self._opened = False
+            return False
+        self._capture_until(time.monotonic())
+        if not self._queue:
+            if self.count is not None and self._next_capture >= self.count:
+                return False
+            time.sleep(max(self._start + self._next_capture / self.fps - time.monotonic(), 0))
+            self._capture_until(time.monotonic())
+        self._current = self._queue.popleft()
+        self._grabbed += 1
+        return True
+
+    def retrieve(self):
+        if self._current is None:
+            return False, None
+        if self.images:
+            frame = self.images[self._current % len(self.images)].copy()
+        else:
+            width, height = self.size
+            frame = np.full((height, width, 3), 64, dtype=np.uint8)
+            x = int(self._current * 8) % max(width - 80, 1)
+            cv2.rectangle(frame, (x, height // 2 - 40), (x + 80, height // 2 + 40), (200, 200, 200), -1)
+        frame[0, :8, 0] = np.frombuffer(np.int64(self._current).tobytes(), dtype=np.uint8)
+        return True, frame
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def release(self):
+        self._opened = False
+
+    @staticmethod
+    def frame_number(frame):
+        return int(np.frombuffer(frame[0, :8, 0].tobytes(), dtype=np.int64)[0])
@@ -0,0 +1,167 @@
+import json
+import os
+import socketserver
+import threading
+import pytest
+import alerts
+from alerts import AlertDispatcher, FakeWhatsAppTransport, SMTPTransport
+from conftest import wait_for
+
+# In-process SMTP stand-in
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply("220 stand-in ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 stand-in")
+            elif command.startswith("RCPT"):
+                self.reply("550 No such user" if server.refuse_recipients else "250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                line = self.rfile.readline()
+                while line not in (b".\r\n", b""):
+                    data.append(line)
+                    line = self.rfile.readline()
+                server.messages.append(b"".join(data))
+                self.reply("250 OK")
+                if server.drop_after_message:
+                    return  # Like a server that closes idle sessions
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:  # MAIL, RSET, NOOP
+                self.reply("250 OK")
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """
+    A minimal SMTP server that records the messages it accepts and counts
+    connections. It can refuse every recipient or drop the connection
+    after each message.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.connections = 0
+        self.messages = []
+        self.refuse_recipients = False
+        self.drop_after_message = False
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+class BlockingTransport:
+    """
+    A WhatsApp transport whose sends wait until released.
+    """
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = 0
+
+    def send(self, body, media_url=None):
+        self.calls += 1
+        self.release.wait(5)
+
+    def close(self):
+        self.release.set()
+
+@pytest.fixture
+def smtp_server():
+    server = SMTPStandIn()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def make_dispatcher(smtp_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(alerts, "EMAIL_SENDER", "ids@example.com")
+    monkeypatch.setattr(alerts, "EMAIL_RECEIVER", "owner@example.com")
+    dispatchers = []
+
+    def make(whatsapp_transport=None, retry_interval=0.1):
+        email = SMTPTransport(host="127.0.0.1", port=smtp_server.server_address[1], sender="ids@example.com",
+                              password="", starttls=False, timeout=5)
+        dispatcher = AlertDispatcher(email_transport=email,
+                                     whatsapp_transport=whatsapp_transport or FakeWhatsAppTransport(),
+                                     queue_dir=str(tmp_path / "alert_queue"), batch_window=0.05,
+                                     retry_interval=retry_interval).start()
+        dispatchers.append(dispatcher)
+        return dispatcher
+    yield make
+    for dispatcher in dispatchers:
+        dispatcher.stop()
+
+def test_smtp_session_is_reused_across_batches(smtp_server, make_dispatcher):
+    dispatcher = make_dispatcher()
+    dispatcher.submit("Intruder", "first")
+    assert wait_for(lambda: dispatcher.stats()["sent"] == 2)
+    dispatcher.submit("Intruder", "second")
+    assert wait_for(lambda: dispatcher.stats()["sent"] == 4)
+    assert len(smtp_server.messages) == 2
+    assert smtp_server.connections == 1
+    assert dispatcher.queued() == 0
+
+def test_alerts_within_the_window_share_one_message(smtp_server, make_dispatcher):
+    dispatcher = make_dispatcher()
+    for i in range(3):
+        dispatcher.submit("Intruder", f"detection {i}")
+    assert wait_for(lambda: dispatcher.stats()["sent"] == 2)
+    assert len(smtp_server.messages) == 1
+    assert b"3 detections" in smtp_server.messages[0]
+
+def test_dropped_connection_reconnects_and_sends_once(smtp_server, make_dispatcher):
+    smtp_server.drop_after_message = True
+    dispatcher = make_dispatcher()
+    dispatcher.submit("Intruder", "first")
+    assert wait_for(lambda: dispatcher.stats()["sent"] == 2)
+    dispatcher.submit("Intruder", "second")
+    assert wait_for(lambda: dispatcher.stats()["sent"] == 4)
+    assert len(smtp_server.messages) == 2
+    assert smtp_server.connections == 2
+    assert dispatcher.stats()["failed"] == 0
+
+def test_failed_channel_is_spooled_and_retried(smtp_server, make_dispatcher):
+    whatsapp = FakeWhatsAppTransport(fail=True)
+    dispatcher = make_dispatcher(whatsapp)
+    dispatcher.submit("Intruder", "spooled")
+    assert wait_for(lambda: dispatcher.stats()["failed"] >= 1)
+    assert wait_for(lambda: dispatcher.queued() == 1)
+    whatsapp.fail = False
+    assert wait_for(lambda: dispatcher.queued() == 0)
+    assert len(whatsapp.sent) == 1
+    # Only the failed channel is retried
+    assert len(smtp_server.messages) == 1
+
+def test_rejected_message_is_spooled_not_resent(smtp_server, make_dispatcher):
+    smtp_server.refuse_recipients = True
+    dispatcher = make_dispatcher(retry_interval=60)
+    dispatcher.submit("Intruder", "refused")
+    assert wait_for(lambda: dispatcher.queued() == 1)
+    assert smtp_server.connections == 1
+    assert smtp_server.messages == []
+    [filename] = os.listdir(dispatcher.queue_dir)
+    with open(os.path.join(dispatcher.queue_dir, filename)) as file:
+        record = json.load(file)
+    assert record["channels"] == ["email"]
+    assert record["attempts"] == 1
+
+def test_batch_in_flight_is_not_resubmitted(make_dispatcher):
+    whatsapp = BlockingTransport()
+    dispatcher = make_dispatcher(whatsapp)
+    dispatcher._spool([{"subject": "Intruder", "body": "slow", "time": "now"}], ["whatsapp"], 1)
+    assert wait_for(lambda: whatsapp.calls == 1)
+    # Several retry intervals pass while the delivery is still running
+    dispatcher.stop_event.wait(0.5)
+    assert whatsapp.calls == 1
+    whatsapp.release.set()
+    assert wait_for(lambda: dispatcher.queued() == 0)
+    assert whatsapp.calls == 1
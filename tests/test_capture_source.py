@@ -0,0 +1,81 @@
+import time
+import pytest
+import capture_source
+from capture_source import CameraSource
+from simulated_camera import SimulatedCamera
+
+SIZE = (64, 48)
+
+class UnpluggedCamera:
+    def isOpened(self):
+        return False
+
+    def release(self):
+        pass
+
+def open_source(camera, drain=True):
+    source = CameraSource("simulated", drain=drain, open_capture=lambda _: camera)
+    assert source.open()
+    return source
+
+def latency(camera, frame):
+    return time.monotonic() - camera.capture_times[SimulatedCamera.frame_number(frame)]
+
+@pytest.fixture
+def fast_retry(monkeypatch):
+    monkeypatch.setattr(capture_source, "RECONNECT_DELAY", 0.01)
+
+def test_frames_are_stamped_with_their_capture_time():
+    camera = SimulatedCamera(size=SIZE, fps=100)
+    source = open_source(camera)
+    stamps = []
+    for _ in range(10):
+        frame, ts = source.read()
+        captured = camera.capture_times[SimulatedCamera.frame_number(frame)]
+        assert captured <= ts < captured + 0.05
+        stamps.append(ts)
+    assert stamps == sorted(stamps)
+
+def test_drained_reads_skip_frames_buffered_during_a_stall():
+    stale, fresh = SimulatedCamera(size=SIZE, fps=50), SimulatedCamera(size=SIZE, fps=50)
+    plain, drained = open_source(stale, drain=False), open_source(fresh)
+    plain.read()
+    drained.read()
+    time.sleep(0.3)  # A slow frame; the driver queue fills meanwhile
+    stale_latency = latency(stale, plain.read()[0])
+    fresh_latency = latency(fresh, drained.read()[0])
+    assert stale_latency > 0.2
+    assert fresh_latency < stale_latency / 2
+    assert drained.drained >= stale.buffer - 1
+
+def test_lost_camera_is_reopened(fast_retry):
+    cameras = []
+
+    def open_capture(_):
+        cameras.append(SimulatedCamera(size=SIZE, fps=200, fail_every=3))
+        return cameras[-1]
+    source = CameraSource("simulated", drain=False, open_capture=open_capture)
+    assert source.open()
+    assert all(source.read() is not None for _ in range(3))
+    assert source.read() is None  # Unplugged
+    assert not source.connected
+    time.sleep(source.retry_in())
+    assert source.read() is not None
+    assert source.connected
+    assert source.reconnects == 1
+    assert len(cameras) == 2
+
+def test_failed_reconnects_back_off(fast_retry):
+    cameras = [SimulatedCamera(size=SIZE, fps=200, fail_every=1)]
+    source = CameraSource("simulated", drain=False,
+                          open_capture=lambda _: cameras.pop() if cameras else UnpluggedCamera())
+    assert source.open()
+    assert source.read() is not None
+    assert source.read() is None
+    delays = []
+    for _ in range(3):
+        time.sleep(source.retry_in())
+        assert source.read() is None
+        delays.append(source.retry_in())
+    assert delays[0] <= 0.02 < delays[1] <= 0.04 < delays[2] <= 0.08
+    assert source.reconnects == 0
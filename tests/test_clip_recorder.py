@@ -0,0 +1,35 @@
+import threading
+from clip_recorder import ClipRecorder
+
+FRAME_BYTES = 10_000
+BUDGET = 200_000
+
+def test_buffer_open_clip_and_pending_clips_share_one_budget(tmp_path):
+    release = threading.Event()
+    written = []
+    recorder = ClipRecorder(directory=str(tmp_path), pre_seconds=2, post_seconds=3, max_bytes=BUDGET, fps=0)
+    # A stalled disk: the writer holds on to the first clip until released
+    recorder.write_clip = lambda clip: release.wait(10) and written.append(clip) or str(tmp_path / "clip.avi")
+    try:
+        ts = 0
+        for _ in range(6):
+            recorder.trigger(ts=ts)
+            for _ in range(4):
+                ts += 1
+                recorder._append(ts, bytes(FRAME_BYTES))
+                assert recorder.held_bytes() <= BUDGET
+        recorder.trigger(ts=ts)
+        for _ in range(2):
+            ts += 1
+            recorder._append(ts, bytes(FRAME_BYTES))
+        stats = recorder.stats()
+        # All three are held at once, and still within the budget
+        assert stats["buffered_frames"] and stats["recording"] and stats["pending_clips"]
+        assert recorder.held_bytes() <= BUDGET
+        assert stats["clips_dropped"] >= 1
+    finally:
+        release.set()
+        recorder.stop()
+    assert len(written) + recorder.stats()["clips_dropped"] == 7
+    stats = recorder.stats()
+    assert stats["pending_clips"] == 0 and stats["held_mb"] == stats["buffered_mb"]
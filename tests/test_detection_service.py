@@ -0,0 +1,60 @@
+import threading
+from types import SimpleNamespace
+import pytest
+import detection_service
+from detection_service import DetectionService, ServiceError
+
+@pytest.fixture
+def service():
+    return DetectionService(live_stream=False)
+
+def test_unknown_arguments_are_rejected_before_the_command_runs(service):
+    with pytest.raises(ServiceError, match="Bad arguments for ping"):
+        service.handle({"command": "ping", "verbose": True})
+
+def test_type_errors_inside_a_command_are_not_reported_as_bad_arguments(service, monkeypatch):
+    def command_unknown(limit=50):
+        return len(limit)
+    monkeypatch.setattr(service, "command_unknown", command_unknown)
+    with pytest.raises(TypeError):
+        service.handle({"command": "unknown", "limit": 5})
+
+def test_valid_arguments_reach_the_command(service):
+    assert "pid" in service.handle({"command": "ping"})
+
+
+def test_cameras_are_opened_without_holding_the_service_lock(service, monkeypatch):
+    opened = threading.Event()
+    release = threading.Event()
+
+    class SlowRunner:
+        """
+        A runner whose camera takes a while to open.
+        """
+        def __init__(self, source, broadcaster=None):
+            opened.set()
+            release.wait(5)
+            self.name = str(source)
+            self.broadcaster = broadcaster
+            self.thread = threading.Thread(target=lambda: None)
+            self.state = "running"
+
+        def start(self):
+            pass
+
+        def status(self):
+            return {"source": self.name, "state": self.state}
+    monkeypatch.setattr(detection_service, "CameraRunner", SlowRunner)
+    monkeypatch.setattr(detection_service.detection, "get_model", lambda: SimpleNamespace())
+    starter = threading.Thread(target=service.handle, args=({"command": "start", "source": "slow"},))
+    starter.start()
+    assert opened.wait(5)
+    try:
+        assert not service.lock.locked()
+        with pytest.raises(ServiceError, match="already starting"):
+            service.handle({"command": "start", "source": "slow"})
+    finally:
+        release.set()
+        starter.join(5)
+    assert service.cameras["slow"].name == "slow"
+    assert not service.starting
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+import intruder_detection as detection
+from tracker import Track
+
+class StaticScene:
+    """
+    A motion gate that reports every frame as static.
+    """
+    def check(self, gray):
+        return None
+
+@pytest.fixture(autouse=True)
+def no_unknown_index(monkeypatch):
+    monkeypatch.setattr(detection, "UNKNOWN_INDEX", False)
+
+def make_stage(alerts):
+    stage = detection.DetectionStage(motion_gate=StaticScene(), detector=object(),
+                                     on_intruder=lambda face_id, track, frame: alerts.append(track.track_id))
+    stage.threshold = 50
+    return stage
+
+def add_track(stage, track_id, confidence, missed=0):
+    track = Track(track_id, (10, 10, 20, 20), 0)
+    track.confidence = confidence
+    track.missed = missed
+    stage.tracker.tracks.append(track)
+    return track
+
+def test_static_frames_alert_on_intruders_still_in_view():
+    alerts = []
+    stage = make_stage(alerts)
+    add_track(stage, 1, confidence=90)             # Intruder in view
+    add_track(stage, 2, confidence=10)             # Known user
+    add_track(stage, 3, confidence=90, missed=1)   # Intruder who has left
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    assert stage.begin(frame) is None
+    assert alerts == [1]
+
+def test_static_frames_age_out_tracks_that_left():
+    stage = make_stage([])
+    add_track(stage, 1, confidence=90)
+    add_track(stage, 2, confidence=90, missed=1)
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    for _ in range(stage.tracker.max_missed):
+        stage.begin(frame)
+    assert [track.track_id for track in stage.tracker.tracks] == [1]
@@ -0,0 +1,70 @@
+import os
+import cv2
+import numpy as np
+import pytest
+import face_capture
+import train_model
+
+FACE_BOX = (40, 40, 120, 120)
+
+class FixedFace:
+    """
+    A detector that finds one face in the same place in every frame.
+    """
+    def detect(self, gray, region=None):
+        return [FACE_BOX]
+
+def write_video(path, distinct, repeats=1, seed=0):
+    """
+    Writes `distinct` different frames of sharp noise, each repeated
+    `repeats` times, as a video file.
+    """
+    rng = np.random.default_rng(seed)
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 30, (200, 200))
+    for _ in range(distinct):
+        frame = cv2.resize(rng.integers(0, 256, (25, 25, 3), dtype=np.uint8), (200, 200),
+                           interpolation=cv2.INTER_NEAREST)
+        for _ in range(repeats):
+            writer.write(frame)
+    writer.release()
+    return str(path)
+
+def dataset_files(user_name):
+    return sorted(os.listdir(os.path.join(train_model.DATASET_PATH, user_name)))
+
+@pytest.fixture(autouse=True)
+def stub_detector(monkeypatch):
+    monkeypatch.setattr(face_capture, "create_detector", lambda: FixedFace())
+    monkeypatch.setattr(face_capture, "MIN_SAVE_INTERVAL", 0)
+
+def test_headless_capture_keeps_one_crop_per_distinct_frame(tmp_path):
+    video = write_video(tmp_path / "dupes.avi", distinct=4, repeats=3)
+    assert face_capture.capture_faces("dupes", source=video, headless=True, target=50) == 4
+    assert dataset_files("dupes") == ["0.jpg", "1.jpg", "2.jpg", "3.jpg"]
+
+def test_capture_stops_at_the_target(tmp_path):
+    video = write_video(tmp_path / "long.avi", distinct=20, seed=1)
+    assert face_capture.capture_faces("target", source=video, headless=True, target=5) == 5
+    assert len(dataset_files("target")) == 5
+
+def test_enrollment_then_incremental_training_updates_the_manifest(tmp_path, capsys):
+    face_capture.capture_faces("alice", source=write_video(tmp_path / "alice.avi", 6, seed=2), headless=True)
+    train_model.train_model()
+    manifest = train_model.load_manifest()
+    assert set(manifest["files"]) >= {f"alice/{name}" for name in dataset_files("alice")}
+    alice_label = manifest["labels"]["alice"]
+    capsys.readouterr()
+
+    # A new user and more images of a known one are trained incrementally
+    face_capture.capture_faces("bob", source=write_video(tmp_path / "bob.avi", 4, seed=3), headless=True)
+    face_capture.capture_faces("alice", source=write_video(tmp_path / "more.avi", 2, seed=4), headless=True)
+    train_model.train_model()
+    assert "Incrementally trained on 6 new image(s)." in capsys.readouterr().out
+    manifest = train_model.load_manifest()
+    assert dataset_files("alice") == [f"{i}.jpg" for i in range(8)]
+    assert {f"alice/{i}.jpg" for i in range(8)} | {f"bob/{i}.jpg" for i in range(4)} <= set(manifest["files"])
+    assert manifest["labels"]["alice"] == alice_label
+    assert manifest["labels"]["bob"] != alice_label
+
+    train_model.train_model()
+    assert "Model is up to date" in capsys.readouterr().out
@@ -0,0 +1,56 @@
+import os
+import pytest
+import event_store
+from event_store import EventStore
+
+@pytest.fixture
+def log_dirs(tmp_path, monkeypatch):
+    images, recordings = tmp_path / "intruder_images", tmp_path / "screen_recordings"
+    images.mkdir()
+    recordings.mkdir()
+    monkeypatch.setattr(event_store, "INTRUDER_IMAGES_DIR", str(images))
+    monkeypatch.setattr(event_store, "SCREEN_RECORDINGS_DIR", str(recordings))
+    return images, recordings
+
+def test_existing_files_are_imported_once(tmp_path, log_dirs):
+    images, recordings = log_dirs
+    for name in ("intruder_1.jpg", "intruder_2.jpg"):
+        (images / name).write_bytes(b"jpg")
+    (recordings / "clip.mp4").write_bytes(b"mp4")
+    store = EventStore(str(tmp_path / "events.db"))
+    assert store.is_empty()
+    assert store.import_existing() == {"image": 2, "recording": 1}
+    assert not store.is_empty()
+    assert store.import_existing() == {"image": 0, "recording": 0}
+    [first] = store.query("image", limit=1)
+    assert first["ts"] == os.path.getmtime(first["path"])
+
+def test_log_server_imports_only_into_an_empty_store(tmp_path, log_dirs, monkeypatch):
+    from log_server import server
+    images, _ = log_dirs
+    (images / "intruder_1.jpg").write_bytes(b"jpg")
+    store = EventStore(str(tmp_path / "events.db"))
+    monkeypatch.setattr(server, "get_event_store", lambda: store)
+    server.import_existing_logs()
+    assert len(store.query("image")) == 1
+
+    # Later files are added by the detector as it writes them, not by a rescan
+    (images / "intruder_2.jpg").write_bytes(b"jpg")
+    server.import_existing_logs()
+    assert len(store.query("image")) == 1
+
+def test_home_page_pages_recordings_with_their_own_cursor(tmp_path, monkeypatch):
+    from log_server import server
+    store = EventStore(str(tmp_path / "events.db"))
+    for i in range(5):
+        store.add_event("recording", f"/logs/clip_{i}.mp4", ts=1000 + i)
+    store.add_event("image", "/logs/intruder_0.jpg", ts=1000)
+    monkeypatch.setattr(server, "get_event_store", lambda: store)
+    client = server.app.test_client()
+
+    first = client.get("/?limit=2").get_data(as_text=True)
+    assert "clip_4.mp4" in first and "clip_3.mp4" in first and "clip_2.mp4" not in first
+    second = client.get("/?limit=2&recordings_before=1003.0:4").get_data(as_text=True)
+    assert "clip_2.mp4" in second and "clip_1.mp4" in second and "clip_4.mp4" not in second
+    assert "recordings_after=1002.0:3" in second and "recordings_before=1001.0:2" in second
+    assert "intruder_0.jpg" in second
@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+from load_controller import LEVELS, RECOVER_WINDOWS, LoadController
+
+BUDGET_MS = 100
+WINDOW = 5
+
+def make_stage():
+    return SimpleNamespace(detector=SimpleNamespace(scale=1.0),
+                           tracker=SimpleNamespace(recognition_interval=30, uncertain_interval=5),
+                           frames_seen=0)
+
+def feed(controller, seconds, windows):
+    """
+    Reports `windows` full windows of frames that each took `seconds`, and
+    returns the level after every window.
+    """
+    levels = []
+    for _ in range(windows):
+        for _ in range(WINDOW):
+            controller.observe(seconds)
+        levels.append(controller.level)
+    return levels
+
+def test_overload_degrades_one_level_per_window_down_to_the_last():
+    stage = make_stage()
+    controller = LoadController(BUDGET_MS, window=WINDOW, name="test-degrade").attach(stage)
+    assert feed(controller, 0.3, len(LEVELS) + 2) == [1, 2, 3, 4, 4, 4, 4]
+    last = LEVELS[-1]
+    assert stage.detector.scale == last["scale"]
+    assert stage.tracker.recognition_interval == 30 * last["recognition"]
+    assert stage.tracker.uncertain_interval == 5 * last["recognition"]
+
+def test_frames_within_budget_but_without_headroom_hold_the_level():
+    controller = LoadController(BUDGET_MS, window=WINDOW, name="test-hold").attach(make_stage())
+    feed(controller, 0.3, 2)
+    assert feed(controller, 0.08, 10) == [2] * 10
+
+def test_light_load_recovers_to_full_quality():
+    stage = make_stage()
+    controller = LoadController(BUDGET_MS, window=WINDOW, name="test-recover").attach(stage)
+    feed(controller, 0.3, 3)
+    levels = feed(controller, 0.01, 3 * RECOVER_WINDOWS)
+    assert levels[RECOVER_WINDOWS - 1::RECOVER_WINDOWS] == [2, 1, 0]
+    assert stage.detector.scale == 1.0
+    assert stage.tracker.recognition_interval == 30
+    assert stage.tracker.uncertain_interval == 5
+
+def test_failed_recovery_doubles_the_wait_before_the_next():
+    controller = LoadController(BUDGET_MS, window=WINDOW, name="test-backoff").attach(make_stage())
+    feed(controller, 0.3, 2)
+    feed(controller, 0.01, RECOVER_WINDOWS)
+    assert controller.level == 1
+    feed(controller, 0.3, 1)  # The recovery immediately overloads again
+    assert controller.level == 2
+    assert controller.recover_windows == 2 * RECOVER_WINDOWS
+    assert feed(controller, 0.01, 2 * RECOVER_WINDOWS)[-2:] == [2, 1]
+
+def test_stride_levels_skip_frames():
+    stage = make_stage()
+    controller = LoadController(BUDGET_MS, window=WINDOW, name="test-skip").attach(stage)
+    feed(controller, 0.3, 4)
+    stride = controller.settings["stride"]
+    assert stride > 1
+    skipped = 0
+    for frame in range(1, 4 * stride + 1):
+        stage.frames_seen = frame
+        skipped += controller.skip(stage)
+    assert skipped == 4 * (stride - 1)
+    assert controller.stats()["skipped"] == skipped
@@ -0,0 +1,33 @@
+import multiprocessing
+from multi_camera import SharedCooldown
+from unknown_index import UnknownIndexManager
+
+def alert_worker(worker_id, unknown_index, identity, sightings, results):
+    """
+    Stands in for a camera worker that sees the same stranger on every
+    frame, and reports how many alerts it raised.
+    """
+    cooldown = SharedCooldown(unknown_index)
+    raised = sum(cooldown.should_alert(f"cam{worker_id}:1", identity) for _ in range(sightings))
+    results.put((worker_id, raised))
+
+def test_an_identity_seen_by_two_workers_alerts_once():
+    context = multiprocessing.get_context("spawn")
+    manager = UnknownIndexManager(ctx=context)
+    manager.start()
+    try:
+        unknown_index = manager.get_unknown_index("cooldown-test")
+        results = context.Queue()
+        workers = [context.Process(target=alert_worker, args=(worker_id, unknown_index, "cooldown-test:1", 20,
+                                                              results))
+                   for worker_id in range(2)]
+        for worker in workers:
+            worker.start()
+        raised = dict(results.get(timeout=30) for _ in workers)
+        for worker in workers:
+            worker.join(timeout=10)
+        assert sorted(raised.values()) == [0, 1]
+        # Another stranger still gets an alert of their own
+        assert unknown_index.should_alert("cooldown-test:2")[0]
+    finally:
+        manager.shutdown()
@@ -0,0 +1,32 @@
+import http.client
+import threading
+import time
+import numpy as np
+from stream import FrameBroadcaster, StreamServer
+from conftest import wait_for
+
+def test_stream_ends_when_the_broadcaster_stops():
+    broadcaster = FrameBroadcaster(max_fps=0)
+    server = StreamServer(broadcaster, host="127.0.0.1", port=0)
+    server.start()
+    try:
+        connection = http.client.HTTPConnection(*server.httpd.server_address[:2], timeout=5)
+        connection.request("GET", "/stream.mjpg")
+        response = connection.getresponse()
+        assert response.status == 200
+        assert wait_for(lambda: broadcaster.viewers == 1)
+        broadcaster.publish(np.zeros((48, 64, 3), dtype=np.uint8))
+        assert b"Content-Type: image/jpeg" in response.read1(4096)
+
+        received = []
+        reader = threading.Thread(target=lambda: received.append(response.read()), daemon=True)
+        reader.start()
+        start = time.monotonic()
+        broadcaster.stop()
+        reader.join(timeout=3)
+        # The response ends promptly instead of the handler spinning on the stopped broadcaster
+        assert not reader.is_alive()
+        assert time.monotonic() - start < 3
+        assert wait_for(lambda: broadcaster.viewers == 0)
+    finally:
+        server.stop()
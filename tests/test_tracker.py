@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+import numpy as np
+import intruder_detection as detection
+from tracker import RECOGNITION_INTERVAL, UNCERTAIN_INTERVAL, FaceTracker
+
+THRESHOLD = 50
+
+def run(tracker, frames, confidence):
+    """
+    Feeds two faces drifting across `frames` frames and returns how many
+    recognizer calls the tracker asked for.
+    """
+    calls = 0
+    for i in range(frames):
+        boxes = [(100 + i, 100, 80, 80), (300 - i, 120, 80, 80)]
+        for track in tracker.update(boxes):
+            if tracker.needs_recognition(track):
+                calls += 1
+                tracker.set_identity(track, 0, confidence, "user")
+    return calls
+
+def test_confident_faces_are_recognized_once_per_interval():
+    tracker = FaceTracker(threshold=THRESHOLD)
+    frames = 3 * RECOGNITION_INTERVAL
+    calls = run(tracker, frames, confidence=10)
+    assert calls == 2 * 3
+    assert calls < 2 * frames / 10
+    assert [track.track_id for track in tracker.tracks] == [1, 2]
+
+def test_borderline_faces_are_rechecked_more_often():
+    frames = 3 * RECOGNITION_INTERVAL
+    confident = run(FaceTracker(threshold=THRESHOLD), frames, confidence=10)
+    borderline = run(FaceTracker(threshold=THRESHOLD), frames, confidence=THRESHOLD - 1)
+    assert borderline == 2 * frames // UNCERTAIN_INTERVAL
+    assert confident < borderline < 2 * frames
+
+def test_a_new_face_is_recognized_at_once():
+    tracker = FaceTracker(threshold=THRESHOLD)
+    run(tracker, 5, confidence=10)
+    [newcomer] = [track for track in tracker.update([(100, 100, 80, 80), (300, 120, 80, 80), (500, 50, 80, 80)])
+                  if track.track_id == 3]
+    assert tracker.needs_recognition(newcomer)
+
+class DriftingFaces:
+    """
+    A detector that finds two faces moving a pixel per frame.
+    """
+    def __init__(self):
+        self.frame = 0
+
+    def detect(self, gray, region=None):
+        self.frame += 1
+        return [(100 + self.frame, 100, 80, 80), (300 - self.frame, 120, 80, 80)]
+
+def test_stage_calls_the_recognizer_far_less_than_once_per_face(monkeypatch):
+    predicted = []
+    engine = SimpleNamespace(predict_batch=lambda faces: predicted.append(len(faces)) or [(0, 10.0)] * len(faces))
+    model = SimpleNamespace(version=1, threshold=THRESHOLD, engine=engine, label_name=lambda label: "user")
+    monkeypatch.setattr(detection, "get_model", lambda: model)
+    monkeypatch.setattr(detection, "THRESHOLD_OVERRIDE", "")
+    monkeypatch.setattr(detection, "UNKNOWN_INDEX", False)
+    stage = detection.DetectionStage(detector=DriftingFaces(),
+                                     on_intruder=lambda *args: None, on_recognition=lambda *args: None)
+    frames = 3 * RECOGNITION_INTERVAL
+    for _ in range(frames):
+        stage.process(np.zeros((480, 640, 3), dtype=np.uint8))
+    assert stage.faces_seen == 2 * frames
+    assert stage.recognizer_calls == sum(predicted) == 2 * 3
+    assert len(predicted) == 3  # Both faces go to the recognizer in one batch
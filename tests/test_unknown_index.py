@@ -0,0 +1,36 @@
+import multiprocessing
+import numpy as np
+from unknown_index import DESCRIPTOR_DIM, UnknownFaceIndex, UnknownIndexManager
+
+def descriptor(seed):
+    vector = np.random.default_rng(seed).random(DESCRIPTOR_DIM).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+def test_processes_share_one_managed_index():
+    manager = UnknownIndexManager(ctx=multiprocessing.get_context("spawn"))
+    manager.start()
+    try:
+        first = manager.get_unknown_index("shared-test")
+        second = manager.get_unknown_index("shared-test")
+        key, _, new = first.match(descriptor(1), camera="a", track_id=1)
+        assert new
+        # The same stranger seen through another proxy joins the identity
+        same_key, _, new = second.match(descriptor(1), camera="b", track_id=7)
+        assert (same_key, new) == (key, False)
+        assert second.match(descriptor(2), camera="b", track_id=8)[0] != key
+        cameras = {identity["key"]: identity["cameras"] for identity in first.summary()}
+        assert cameras[key] == ["a", "b"]
+        first.stop()
+    finally:
+        manager.shutdown()
+
+def test_a_frame_of_faces_is_matched_in_one_batch():
+    index = UnknownFaceIndex("batch-test", directory=None)
+    known, _, _ = index.match(descriptor(1))
+    results, identities = index.match_batch([known, None, "batch-test:99"],
+                                            np.stack([descriptor(1), descriptor(2), descriptor(3)]), [1, 2, 3],
+                                            camera="a")
+    assert results[0] is None  # Added to the track's identity
+    assert results[1][2] and results[2][2]  # New strangers, including one whose identity was evicted
+    assert identities == 3
+    assert index.identities[1].sighting_count == 1